@@ -0,0 +1,129 @@
+"""
+Benchmark queries to the pepperd controller under lock contention.
+
+A background thread repeatedly holds the usercode lock, as the mount
+action does whilst it spawns usercode, and adds and removes drives.
+Meanwhile, the status and drive queries served over D-Bus are timed.
+
+The benchmark is run twice: with each query taking the usercode lock
+first, as all queries did when the controller had a single lock, and
+with the queries reading the current state, as they do now.
+
+    python benchmarks/controller_contention.py --queries 2000 --hold-ms 5
+"""
+
+import argparse
+import statistics
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from time import perf_counter, sleep
+from typing import Callable, ContextManager, Dict, List
+
+from pepper2.common.drive_types import NoActionDriveType
+from pepper2.daemon.dbus.controller import Controller
+from pepper2.daemon.dbus.drive import Drive
+
+# The number of drives to register before the queries start.
+DRIVES = 8
+
+
+class Registration:
+    """A registration with a bus that does nothing."""
+
+    def unregister(self) -> None:
+        """Remove the object from the bus."""
+
+
+class Bus:
+    """A bus that objects can be registered on without publishing them."""
+
+    def register_object(self, path: str, obj: object, node_info: object) -> Registration:
+        """Register an object on the bus."""
+        return Registration()
+
+
+def _drive(index: int) -> Drive:
+    return Drive(
+        uuid=f"drive-{index}",
+        mount_path=Path(f"/media/drive-{index}"),
+        drive_type=NoActionDriveType,
+    )
+
+
+def contend(controller: Controller, hold_ms: float, stop: threading.Event) -> None:
+    """Hold the usercode lock, and change the drives, until stopped."""
+    index = DRIVES
+    while not stop.is_set():
+        with controller.usercode_lock:
+            sleep(hold_ms / 1000)
+        controller.drive_group[f"drive-{index}"] = _drive(index)
+        del controller.drive_group[f"drive-{index}"]
+        index += 1
+
+
+def time_queries(
+        controller: Controller,
+        queries: int,
+        lock: Callable[[], ContextManager[object]],
+) -> Dict[str, List[float]]:
+    """Time each query, in milliseconds."""
+    operations: Dict[str, Callable[[], object]] = {
+        "daemon_status": lambda: controller.daemon_status,
+        "get_drive_list": controller.get_drive_list,
+        "get_drives": controller.get_drives,
+        "get_state_changes": lambda: controller.get_state_changes(0),
+    }
+
+    timings: Dict[str, List[float]] = {name: [] for name in operations}
+    for _ in range(queries):
+        for name, operation in operations.items():
+            start = perf_counter()
+            with lock():
+                operation()
+            timings[name].append((perf_counter() - start) * 1000)
+    return timings
+
+
+def run(queries: int, hold_ms: float, *, single_lock: bool) -> Dict[str, List[float]]:
+    """Run the benchmark with a new controller."""
+    controller = Controller(loop=None, bus=Bus())  # type: ignore
+    for index in range(DRIVES):
+        controller.drive_group[f"drive-{index}"] = _drive(index)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=contend, args=(controller, hold_ms, stop))
+    thread.start()
+    try:
+        return time_queries(
+            controller,
+            queries,
+            (lambda: controller.usercode_lock) if single_lock else ExitStack,
+        )
+    finally:
+        stop.set()
+        thread.join()
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--hold-ms", type=float, default=5.0)
+    options = parser.parse_args()
+
+    for single_lock in (True, False):
+        print("single lock:" if single_lock else "copy-on-write:")
+        timings = run(options.queries, options.hold_ms, single_lock=single_lock)
+        for name, values in timings.items():
+            values.sort()
+            print(
+                f"\t{name:20} "
+                f"median {statistics.median(values):7.3f} ms  "
+                f"p99 {values[int(len(values) * 0.99)]:7.3f} ms  "
+                f"max {values[-1]:7.3f} ms",
+            )
+
+
+if __name__ == "__main__":
+    main()
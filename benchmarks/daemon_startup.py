@@ -0,0 +1,134 @@
+"""
+Benchmark the startup time of pepperd.
+
+Reports the median time to import the daemon, and the slowest imports.
+Unless ``--imports-only`` is given, it then starts pepperd, listening for
+its sd_notify messages, and reports when each phase of startup began,
+when systemd was told that it was ready and when it finished starting.
+
+The full benchmark needs the system bus and UDisks, so it must be run
+on a controller, as root, with the pepperd service stopped.
+
+    python benchmarks/daemon_startup.py --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+from signal import SIGTERM
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+DAEMON_MODULE = "pepper2.daemon.daemon"
+
+# How long to wait for pepperd to finish starting, in seconds.
+START_TIMEOUT = 60.0
+
+# How often to check that pepperd is still running, in seconds.
+POLL_INTERVAL = 0.1
+
+
+def time_import(runs: int) -> float:
+    """Get the median time to import the daemon, in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {DAEMON_MODULE}"], check=True)
+        timings.append((perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def slowest_imports(count: int) -> List[Tuple[int, str]]:
+    """Get the slowest top level imports of the daemon, in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {DAEMON_MODULE}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("   "):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def time_phases() -> List[Tuple[float, str]]:
+    """
+    Start pepperd and time its notifications.
+
+    :returns: the time of each notification since pepperd was started,
+        in milliseconds.
+    """
+    events: List[Tuple[float, str]] = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "notify")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(path)
+            sock.settimeout(POLL_INTERVAL)
+
+            env: Dict[str, str] = dict(os.environ, NOTIFY_SOCKET=path)
+            start = perf_counter()
+            daemon = subprocess.Popen(
+                [sys.executable, "-m", DAEMON_MODULE],
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                while True:
+                    try:
+                        message = sock.recv(4096).decode()
+                    except socket.timeout:
+                        elapsed = (perf_counter() - start) * 1000
+                        if daemon.poll() is not None:
+                            events.append((elapsed, f"Exited ({daemon.returncode})"))
+                            break
+                        if elapsed > START_TIMEOUT * 1000:
+                            events.append((elapsed, "Timed out"))
+                            break
+                        continue
+
+                    elapsed = (perf_counter() - start) * 1000
+                    for line in message.splitlines():
+                        if line.startswith(("STATUS=", "READY=", "STOPPING=")):
+                            events.append((elapsed, line))
+                    if "STATUS=Ready" in message or "STOPPING=1" in message:
+                        break
+            finally:
+                daemon.send_signal(SIGTERM)
+                daemon.wait()
+    return events
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--imports", type=int, default=5)
+    parser.add_argument("--imports-only", action="store_true")
+    options = parser.parse_args()
+
+    print(f"import {DAEMON_MODULE}: {time_import(options.runs):.1f} ms")
+    for cumulative, name in slowest_imports(options.imports):
+        print(f"\t{cumulative / 1000:8.1f} ms  {name}")
+
+    if options.imports_only:
+        return
+
+    for run in range(options.runs):
+        print(f"pepperd run {run + 1}:")
+        for elapsed, event in time_phases():
+            print(f"\t{elapsed:8.1f} ms  {event}")
+
+
+if __name__ == "__main__":
+    main()
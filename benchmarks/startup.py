@@ -0,0 +1,86 @@
+"""
+Benchmark the startup time of pepperctl.
+
+Runs pepperctl commands in new interpreters and reports the median wall
+clock time of each, and the slowest imports of each command. Exits with
+a non-zero status if a command is slower than ``--max-ms``.
+
+    python benchmarks/startup.py --runs 20 --max-ms 300
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+from typing import List, Tuple
+
+COMMANDS = [
+    ["--help"],
+    ["status", "--fast"],
+    ["status"],
+]
+
+
+def _pepperctl(args: List[str]) -> List[str]:
+    return [sys.executable, "-m", "pepper2.cli.app"] + args
+
+
+def time_command(args: List[str], runs: int) -> float:
+    """Get the median time to run a command, in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run(
+            _pepperctl(args),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append((perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def slowest_imports(args: List[str], count: int) -> List[Tuple[int, str]]:
+    """Get the slowest top level imports of a command, in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + _pepperctl(args)[1:],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("   "):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--imports", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    options = parser.parse_args()
+
+    too_slow = False
+    for args in COMMANDS:
+        median = time_command(args, options.runs)
+        print(f"pepperctl {' '.join(args)}: {median:.1f} ms")
+        for cumulative, name in slowest_imports(args, options.imports):
+            print(f"\t{cumulative / 1000:8.1f} ms  {name}")
+
+        if options.max_ms is not None and median > options.max_ms:
+            too_slow = True
+
+    if too_slow:
+        print(f"Some commands took longer than {options.max_ms} ms.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
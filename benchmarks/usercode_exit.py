@@ -0,0 +1,117 @@
+"""
+Benchmark how quickly pepperd reports that usercode has exited.
+
+Runs usercode that prints the time and exits, under the driver that
+pepperd uses, and reports the time from the exit of the usercode until
+the daemon status is updated. The part of that time from the exit being
+observed on the event loop, which pepperd records itself, is reported
+too.
+
+The usercode is run with ``python3``, in a temporary directory.
+
+    python benchmarks/usercode_exit.py --runs 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+from pathlib import Path
+from time import monotonic
+from typing import List, Optional, Tuple
+
+from pepper2.common.drive_types import UserCodeDriveType
+from pepper2.common.glib_asyncio import GLibEventLoop
+from pepper2.daemon.dbus.controller import Controller
+from pepper2.daemon.dbus.drive import Drive
+from pepper2.daemon.usercode_driver import CodeStatus, PythonUnixProcessDriver
+from pepper2.daemon.usercode_driver.unix_process import OutputLogger
+
+USERCODE = """\
+import os, time
+print(time.monotonic(), flush=True)
+os._exit(0)
+"""
+
+# How long to wait for the usercode to exit, in seconds.
+RUN_TIMEOUT = 10.0
+
+
+class Bus:
+    """A bus that objects can be registered on without publishing them."""
+
+    def register_object(self, path: str, obj: object, node_info: object) -> None:
+        """Register an object on the bus."""
+
+
+class TimedController(Controller):
+    """A controller that records when the usercode is reported to have exited."""
+
+    exit_reported: Optional[float] = None
+
+    def inform_code_status(self, code_status: CodeStatus) -> None:
+        """Record when the status changes to finished."""
+        super().inform_code_status(code_status)
+        if code_status is CodeStatus.FINISHED:
+            self.exit_reported = monotonic()
+
+
+async def time_exit(
+        loop: asyncio.AbstractEventLoop,
+        directory: Path,
+) -> Tuple[float, float]:
+    """
+    Run the usercode, and get the time taken to report its exit, in ms.
+
+    :returns: the time from the exit, and from the exit being observed.
+    """
+    controller = TimedController(loop, Bus())  # type: ignore
+    drive = Drive(uuid="benchmark", mount_path=directory, drive_type=UserCodeDriveType)
+    driver = PythonUnixProcessDriver(drive, controller)
+    await loop.run_in_executor(None, driver.start_execution)
+
+    deadline = monotonic() + RUN_TIMEOUT
+    while controller.exit_reported is None and monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    if controller.exit_reported is None:
+        raise RuntimeError("The usercode did not exit.")
+
+    # The exit time is the first line that the usercode logged.
+    await asyncio.sleep(0.1)
+    log = directory.joinpath("log.txt").read_text().splitlines()
+    exited = float(log[1])
+    handled = controller.usercode_exit_stats.last_latency_ms
+    return (controller.exit_reported - exited) * 1000, handled
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    options = parser.parse_args()
+
+    # Do not log the output of the usercode to the journal.
+    OutputLogger._log_line_to_systemd = lambda *_: None  # type: ignore
+
+    loop = GLibEventLoop()
+    asyncio.set_event_loop(loop)
+    timings: List[float] = []
+    handled: List[float] = []
+    with tempfile.TemporaryDirectory() as directory:
+        Path(directory).joinpath("main.py").write_text(USERCODE)
+        for _ in range(options.runs):
+            timing, handling = loop.run_until_complete(time_exit(loop, Path(directory)))
+            timings.append(timing)
+            handled.append(handling)
+
+    for name, values in (("exit", timings), ("exit observed", handled)):
+        values.sort()
+        print(
+            f"{name + ' to status update:':32} "
+            f"median {statistics.median(values):.3f} ms  "
+            f"max {values[-1]:.3f} ms",
+        )
+
+
+if __name__ == "__main__":
+    main()
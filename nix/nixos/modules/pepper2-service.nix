@@ -18,6 +18,19 @@ in {
       description = "pepper2 daemon";
       wantedBy = [ "multi-user.target" ];
       script = "${pepper2}/bin/pepperd --verbose";
+      # pepperd reports its progress and readiness with sd_notify.
+      serviceConfig.Type = "notify";
+      # Leave usercode running when pepperd restarts, so that the next
+      # instance can adopt it. pepperd stops the usercode itself when it
+      # is stopped, and keeps its output in the file descriptor store.
+      serviceConfig.KillMode = "process";
+      serviceConfig.FileDescriptorStoreMax = 1;
+      serviceConfig.Restart = "on-failure";
+      # pepperd publishes a status file in /run/pepper2, and keeps the
+      # snapshot that the next instance carries on from there, so it is
+      # not removed when pepperd restarts.
+      serviceConfig.RuntimeDirectory = "pepper2";
+      serviceConfig.RuntimeDirectoryPreserve = "restart";
     };
     services.dbus.packages = [ pepper2 ];
   };
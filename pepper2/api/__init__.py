@@ -1,9 +1,63 @@
-"""API specific code."""
+"""
+API specific code.
 
-from .api import Pepper2
-from .error import Pepper2Exception
+The submodules are imported when their names are first used, so that
+programs only import the dependencies of the parts of the API that they
+use. For example, reading the status file does not need D-Bus at all.
+"""
+
+import sys
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# The submodule that defines each name.
+_SUBMODULES = {
+    "AsyncPepper2": "async_api",
+    "DaemonState": "state",
+    "DriveAddedEvent": "event",
+    "DriveRemovedEvent": "event",
+    "Event": "event",
+    "Pepper2": "api",
+    "Pepper2Exception": "error",
+    "ProxyPool": "pool",
+    "StatusChangedEvent": "event",
+    "get_default_pool": "pool",
+    "read_status_file": "state",
+}
+
+if TYPE_CHECKING or sys.version_info < (3, 7):
+    # Module __getattr__ is not supported before Python 3.7.
+    from .api import Pepper2
+    from .async_api import AsyncPepper2
+    from .error import Pepper2Exception
+    from .event import (
+        DriveAddedEvent,
+        DriveRemovedEvent,
+        Event,
+        StatusChangedEvent,
+    )
+    from .pool import ProxyPool, get_default_pool
+    from .state import DaemonState, read_status_file
+else:
+    def __getattr__(name: str) -> object:
+        """Import the submodule that defines a name."""
+        if name not in _SUBMODULES:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+        value = getattr(import_module(f"{__name__}.{_SUBMODULES[name]}"), name)
+        globals()[name] = value
+        return value
 
 __all__ = [
+    "AsyncPepper2",
+    "DaemonState",
+    "DriveAddedEvent",
+    "DriveRemovedEvent",
+    "Event",
     "Pepper2",
     "Pepper2Exception",
+    "ProxyPool",
+    "StatusChangedEvent",
+    "get_default_pool",
+    "read_status_file",
 ]
@@ -1,47 +1,212 @@
 """Classes to interact with the pepper2 API."""
 
-from typing import TYPE_CHECKING, Dict
+from collections import deque
+from math import ceil
+from time import monotonic
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
 
 from gi.repository import GLib
-from pydbus import SystemBus
+from pydbus.subscription import Subscription
 
 from pepper2.api.error import Pepper2Exception
+from pepper2.api.event import Event, StatusChangedEvent, event_from_signal
+from pepper2.api.pool import ProxyPool, dispatch_pending, get_default_pool
+from pepper2.api.state import DaemonState
 from pepper2.common.daemon_status import DaemonStatus
+from pepper2.common.state_fields import StateFields
+from pepper2.common.status_file import StatusFileError, StatusFileReader
 from pepper2.daemon.dbus.drive import Drive
 
 if TYPE_CHECKING:
     from pepper2.daemon.dbus.controller import Controller
 
 
+CONTROLLER_INTERFACE = "uk.org.j5.pepper2.Controller"
+
+# (interface, changed properties, invalidated properties)
+PropertiesChangedParams = Tuple[str, Dict[str, str], List[str]]
+
+
 class Pepper2:
-    """Class to interact with pepper2 daemon."""
+    """
+    Class to interact with pepper2 daemon.
+
+    If ``cache`` is enabled, properties of the daemon are cached in
+    memory and kept up to date by the change signals that the daemon
+    emits. The cache is cleared if the daemon leaves the bus.
+
+    If ``status_file`` is enabled, the state of the daemon is read from
+    the status file that it publishes, rather than over D-Bus. This is
+    only possible on the same machine as the daemon, and falls back to
+    D-Bus if the file is unavailable.
+
+    The connection and proxies are shared with other instances through
+    ``pool``, which defaults to a pool shared by the whole process.
+    """
 
     def __init__(
         self,
         *,
         dbus_path: str = "uk.org.j5.pepper2",
+        cache: bool = False,
+        status_file: bool = False,
+        pool: Optional[ProxyPool] = None,
     ) -> None:
         self._dbus_path = dbus_path
+        self._status_file = StatusFileReader() if status_file else None
+        self._pool = get_default_pool() if pool is None else pool
+        self._cache_enabled = cache
+        self._cache: Dict[str, str] = {}
+        self._subscriptions: List[Subscription] = []
 
         self._connect()
 
+        if self._cache_enabled:
+            self._subscribe()
+
     def _connect(self) -> None:
         """Connect to DBus."""
         try:
-            self._bus = SystemBus()
+            self._bus = self._pool.bus
         except GLib.Error as e:
             raise Pepper2Exception("Unable to connect to system bus.") from e
 
         try:
-            self._controller: Controller = self._bus.get(self._dbus_path)
+            self._pool.get(self._dbus_path)
         except GLib.Error as e:
             raise Pepper2Exception("Unable to find daemon on bus.") from e
 
+    @property
+    def _controller(self) -> 'Controller':
+        """Get the proxy for the controller."""
+        return cast('Controller', self._pool.get(self._dbus_path))
+
+    def _subscribe(self) -> None:
+        """Subscribe to the signals used to keep the cache fresh."""
+        self._subscriptions = [
+            self._bus.subscribe(
+                sender=self._dbus_path,
+                iface="org.freedesktop.DBus.Properties",
+                signal="PropertiesChanged",
+                arg0=CONTROLLER_INTERFACE,
+                signal_fired=self._properties_changed,
+            ),
+            self._bus.subscribe(
+                sender="org.freedesktop.DBus",
+                iface="org.freedesktop.DBus",
+                signal="NameOwnerChanged",
+                arg0=self._dbus_path,
+                signal_fired=self._name_owner_changed,
+            ),
+        ]
+
+    def close(self) -> None:
+        """Stop listening for signals and clear the cache."""
+        for subscription in self._subscriptions:
+            subscription.unsubscribe()
+        self._subscriptions = []
+        self._cache.clear()
+
+    def _properties_changed(
+            self,
+            _: str,
+            __: str,
+            ___: str,
+            ____: str,
+            params: PropertiesChangedParams,
+    ) -> None:
+        """Update the cache when properties of the daemon change."""
+        _, changed, invalidated = params
+        self._cache.update(changed)
+        for name in invalidated:
+            self._cache.pop(name, None)
+
+    def _name_owner_changed(
+            self,
+            _: str,
+            __: str,
+            ___: str,
+            ____: str,
+            params: Tuple[str, str, str],
+    ) -> None:
+        """Clear the cache when the daemon restarts or leaves the bus."""
+        self._cache.clear()
+
+    @staticmethod
+    def _wait_for_signal(deadline: Optional[float]) -> bool:
+        """
+        Block until a signal has been handled, or the deadline has passed.
+
+        :returns: False if the deadline has passed.
+        """
+        context = GLib.MainContext.default()
+        if deadline is None:
+            context.iteration(True)
+            return True
+
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return False
+
+        fired = False
+
+        def wake() -> bool:
+            nonlocal fired
+            fired = True
+            return False  # Do not repeat.
+
+        source_id = GLib.timeout_add(ceil(remaining * 1000), wake)
+        context.iteration(True)
+        if not fired:
+            GLib.source_remove(source_id)
+        return True
+
+    def _read_status_file(self) -> Optional[Tuple[int, StateFields]]:
+        """Read the state from the status file, if enabled and available."""
+        if self._status_file is None:
+            return None
+
+        try:
+            return self._status_file.read()
+        except StatusFileError:
+            return None
+
+    def _get_property(self, name: str) -> str:
+        """Get a property of the daemon, using the cache if enabled."""
+        status_file_state = self._read_status_file()
+        if status_file_state is not None:
+            _, fields = status_file_state
+            return str(fields[name])
+
+        if not self._cache_enabled:
+            value: str = getattr(self._controller, name)
+            return value
+
+        dispatch_pending()
+        if name in self._cache:
+            return self._cache[name]
+
+        value = getattr(self._controller, name)
+
+        # Apply any changes that were emitted before our read was answered,
+        # and keep them rather than the older value that we read.
+        dispatch_pending()
+        return self._cache.setdefault(name, value)
+
     @property
     def daemon_version(self) -> str:
         """Get the daemon version."""
         try:
-            return self._controller.version
+            return self._get_property("version")
         except GLib.Error as e:
             raise Pepper2Exception("Error fetching version from daemon.") from e
 
@@ -49,7 +214,7 @@ class Pepper2:
     def daemon_status(self) -> DaemonStatus:
         """Get the daemon status."""
         try:
-            status_string = self._controller.daemon_status
+            status_string = self._get_property("daemon_status")
         except GLib.Error as e:
             raise Pepper2Exception("Error fetching status from daemon.") from e
 
@@ -65,19 +230,151 @@ class Pepper2:
         """
         Get information about detected drives.
 
-        This method could definitely be made more efficient.
+        All of the drives are fetched from the daemon in a single call.
         """
+        status_file_state = self._read_status_file()
+        if status_file_state is not None:
+            return DaemonState.from_fields(*status_file_state).drives
+
         try:
-            drive_list = self._controller.get_drive_list()
+            drive_structs = self._controller.get_drives()
         except GLib.Error as e:
             raise Pepper2Exception("Error fetching drive list from daemon.") from e
 
-        return {uuid: self.get_drive(uuid) for uuid in drive_list}
+        drives = [Drive.from_struct(struct) for struct in drive_structs]
+        return {drive.uuid: drive for drive in drives}
+
+    @property
+    def state(self) -> DaemonState:
+        """
+        Get a consistent snapshot of the entire state of the daemon.
+
+        The snapshot is fetched from the daemon in a single call.
+        """
+        status_file_state = self._read_status_file()
+        if status_file_state is not None:
+            return DaemonState.from_fields(*status_file_state)
+
+        try:
+            generation, fields = self._controller.get_state()
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching state from daemon.") from e
+
+        # pydbus unpacks the variants sent by the daemon.
+        return DaemonState.from_fields(generation, cast(StateFields, fields))
+
+    def update_state(self, state: DaemonState) -> DaemonState:
+        """
+        Update a snapshot of the state of the daemon.
+
+        Only the fields that have changed since the snapshot was taken
+        are sent by the daemon.
+
+        :returns: the same snapshot if it is current, otherwise a new snapshot.
+        """
+        try:
+            generation, changes = self._controller.get_state_changes(
+                state.generation,
+            )
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching state from daemon.") from e
+
+        # pydbus unpacks the variants sent by the daemon.
+        return state.with_changes(generation, cast(StateFields, changes))
+
+    def watch(
+            self,
+            *,
+            timeout: Optional[float] = None,
+            initial_status: bool = False,
+    ) -> Generator[Event, None, None]:
+        """
+        Watch for events from the daemon.
+
+        Events are yielded as the daemon emits them, blocking whilst
+        waiting for the next event. The iterator finishes once ``timeout``
+        seconds have passed.
+
+        :param initial_status: first yield an event with the current status.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        events: Deque[Event] = deque()
+
+        def signal_received(
+                _: str,
+                __: str,
+                ___: str,
+                signal_name: str,
+                params: Tuple[object, ...],
+        ) -> None:
+            event = event_from_signal(signal_name, params)
+            if event is not None:
+                events.append(event)
+
+        subscriptions = [
+            self._bus.subscribe(
+                sender=self._dbus_path,
+                iface=CONTROLLER_INTERFACE,
+                signal="drive_added",
+                signal_fired=signal_received,
+            ),
+            self._bus.subscribe(
+                sender=self._dbus_path,
+                iface=CONTROLLER_INTERFACE,
+                signal="drive_removed",
+                signal_fired=signal_received,
+            ),
+            self._bus.subscribe(
+                sender=self._dbus_path,
+                iface="org.freedesktop.DBus.Properties",
+                signal="PropertiesChanged",
+                arg0=CONTROLLER_INTERFACE,
+                signal_fired=signal_received,
+            ),
+        ]
+
+        try:
+            if initial_status:
+                yield StatusChangedEvent(self.daemon_status)
+
+            while True:
+                while len(events) == 0:
+                    if not self._wait_for_signal(deadline):
+                        return
+                yield events.popleft()
+        finally:
+            for subscription in subscriptions:
+                subscription.unsubscribe()
+
+    def wait_for_status(
+            self,
+            *statuses: DaemonStatus,
+            timeout: Optional[float] = None,
+    ) -> DaemonStatus:
+        """
+        Wait until the daemon has one of the given statuses.
+
+        :returns: the status of the daemon.
+        :raises TimeoutError: the daemon did not reach the status in time.
+        """
+        events = self.watch(timeout=timeout, initial_status=True)
+        try:
+            for event in events:
+                if isinstance(event, StatusChangedEvent) \
+                        and event.daemon_status in statuses:
+                    return event.daemon_status
+        finally:
+            events.close()
+
+        raise TimeoutError("Timed out waiting for the daemon status.")
 
     def get_drive(self, uuid: str) -> Drive:
         """Get a drive."""
         bus_id = uuid.replace('-', '_')
-        return Drive.from_proxy(self._bus.get("uk.org.j5.pepper2", bus_id))
+        try:
+            return Drive.from_proxy(self._pool.get(self._dbus_path, bus_id))
+        except GLib.Error as e:
+            raise Pepper2Exception(f"Error fetching drive {uuid} from daemon.") from e
 
     def kill_usercode(self) -> None:
         """Kill the currently running usercode."""
@@ -96,10 +393,12 @@ class Pepper2:
 
     def start_usercode(self) -> None:
         """Start any dead usercode."""
-        if self.daemon_status in [DaemonStatus.CODE_RUNNING, DaemonStatus.CODE_STARTING]:
+        daemon_status = self.daemon_status
+
+        if daemon_status in [DaemonStatus.CODE_RUNNING, DaemonStatus.CODE_STARTING]:
             raise ValueError("Usercode is already running.")
 
-        if self.daemon_status in [DaemonStatus.READY, DaemonStatus.STARTING]:
+        if daemon_status in [DaemonStatus.READY, DaemonStatus.STARTING]:
             raise ValueError("There are no viable usercode drives available.")
 
         try:
@@ -120,7 +419,7 @@ class Pepper2:
         :returns: the executing drive.
         """
         try:
-            uuid = self._controller.usercode_drive
+            uuid = self._get_property("usercode_drive")
         except GLib.Error as e:
             raise Pepper2Exception("Error fetching drive list from daemon.") from e
 
@@ -133,7 +432,7 @@ class Pepper2:
     def usercode_driver_name(self) -> str:
         """Get the usercode driver name."""
         try:
-            name = self._controller.usercode_driver_name
+            name = self._get_property("usercode_driver_name")
         except GLib.Error as e:
             raise Pepper2Exception("Error fetching drive list from daemon.") from e
 
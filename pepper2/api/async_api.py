@@ -0,0 +1,333 @@
+"""Classes to interact with the pepper2 API from asyncio."""
+
+import asyncio
+from typing import AsyncGenerator, Dict, List, Optional, Tuple, cast
+
+from gi.repository import Gio, GLib
+from pydbus.auto_names import auto_object_path
+
+from pepper2.api.error import Pepper2Exception
+from pepper2.api.event import Event, StatusChangedEvent, event_from_signal
+from pepper2.api.state import DaemonState
+from pepper2.common.daemon_status import DaemonStatus
+from pepper2.common.glib_asyncio import (
+    AsyncReadyCallback,
+    run_glib_async,
+    run_in_glib_thread,
+)
+from pepper2.common.state_fields import StateFields
+from pepper2.daemon.dbus.drive import Drive, DriveStruct
+
+CONTROLLER_INTERFACE = "uk.org.j5.pepper2.Controller"
+
+
+async def _get_system_bus() -> Gio.DBusConnection:
+    """Get a connection to the system bus, without blocking."""
+    def start(cancellable: Gio.Cancellable, callback: AsyncReadyCallback) -> None:
+        Gio.bus_get(Gio.BusType.SYSTEM, cancellable, callback, None)
+
+    def finish(_: object, result: Gio.AsyncResult) -> Gio.DBusConnection:
+        return Gio.bus_get_finish(result)
+
+    return await run_glib_async(start, finish)
+
+
+class AsyncPepper2:
+    """
+    Class to interact with pepper2 daemon from asyncio.
+
+    Calls to the daemon do not block the event loop, and several calls
+    can be in flight at once. Instances should be created with
+    :meth:`AsyncPepper2.connect`.
+    """
+
+    def __init__(
+        self,
+        connection: Gio.DBusConnection,
+        *,
+        dbus_path: str = "uk.org.j5.pepper2",
+    ) -> None:
+        self._connection = connection
+        self._dbus_path = dbus_path
+        self._object_path = auto_object_path(dbus_path)
+
+    @classmethod
+    async def connect(
+        cls,
+        *,
+        dbus_path: str = "uk.org.j5.pepper2",
+    ) -> 'AsyncPepper2':
+        """Connect to DBus."""
+        try:
+            connection = await _get_system_bus()
+        except GLib.Error as e:
+            raise Pepper2Exception("Unable to connect to system bus.") from e
+
+        pepper2 = cls(connection, dbus_path=dbus_path)
+
+        try:
+            await pepper2._call("org.freedesktop.DBus.Peer", "Ping")
+        except GLib.Error as e:
+            raise Pepper2Exception("Unable to find daemon on bus.") from e
+
+        return pepper2
+
+    async def _call(
+            self,
+            interface: str,
+            method: str,
+            parameters: Optional[GLib.Variant] = None,
+    ) -> Tuple[object, ...]:
+        """Call a method on the daemon."""
+        def start(cancellable: Gio.Cancellable, callback: AsyncReadyCallback) -> None:
+            self._connection.call(
+                self._dbus_path,
+                self._object_path,
+                interface,
+                method,
+                parameters,
+                None,
+                Gio.DBusCallFlags.NONE,
+                -1,
+                cancellable,
+                callback,
+                None,
+            )
+
+        def finish(_: object, result: Gio.AsyncResult) -> Tuple[object, ...]:
+            reply = self._connection.call_finish(result)
+            return cast(Tuple[object, ...], reply.unpack())
+
+        return await run_glib_async(start, finish)
+
+    async def _call_controller(self, method: str) -> Tuple[object, ...]:
+        """Call a method on the controller."""
+        return await self._call(CONTROLLER_INTERFACE, method)
+
+    async def _get_property(self, name: str) -> str:
+        """Get a property of the controller."""
+        value, = await self._call(
+            "org.freedesktop.DBus.Properties",
+            "Get",
+            GLib.Variant("(ss)", (CONTROLLER_INTERFACE, name)),
+        )
+        return cast(str, value)
+
+    async def get_daemon_version(self) -> str:
+        """Get the daemon version."""
+        try:
+            return await self._get_property("version")
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching version from daemon.") from e
+
+    async def get_daemon_status(self) -> DaemonStatus:
+        """Get the daemon status."""
+        try:
+            status_string = await self._get_property("daemon_status")
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching status from daemon.") from e
+
+        try:
+            return DaemonStatus(status_string)
+        except ValueError:
+            raise Pepper2Exception(
+                f"Received unknown status string from daemon: {status_string}",
+            )
+
+    async def get_drives(self) -> Dict[str, Drive]:
+        """Get information about detected drives."""
+        try:
+            drive_structs, = await self._call_controller("get_drives")
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching drive list from daemon.") from e
+
+        drives = [
+            Drive.from_struct(struct)
+            for struct in cast(List[DriveStruct], drive_structs)
+        ]
+        return {drive.uuid: drive for drive in drives}
+
+    async def get_state(self) -> DaemonState:
+        """Get a consistent snapshot of the entire state of the daemon."""
+        try:
+            generation, fields = await self._call_controller("get_state")
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching state from daemon.") from e
+
+        return DaemonState.from_fields(
+            cast(int, generation),
+            cast(StateFields, fields),
+        )
+
+    async def update_state(self, state: DaemonState) -> DaemonState:
+        """
+        Update a snapshot of the state of the daemon.
+
+        :returns: the same snapshot if it is current, otherwise a new snapshot.
+        """
+        try:
+            generation, changes = await self._call(
+                CONTROLLER_INTERFACE,
+                "get_state_changes",
+                GLib.Variant("(t)", (state.generation,)),
+            )
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching state from daemon.") from e
+
+        return state.with_changes(cast(int, generation), cast(StateFields, changes))
+
+    async def kill_usercode(self) -> None:
+        """Kill the currently running usercode."""
+        if await self.get_daemon_status() is not DaemonStatus.CODE_RUNNING:
+            raise ValueError("No usercode is running.")
+
+        try:
+            result, = await self._call_controller("kill_usercode")
+        except GLib.Error as e:
+            raise Pepper2Exception(
+                "Error when sending kill usercode command.",
+            ) from e
+
+        if not result:
+            raise Pepper2Exception("Unable to kill usercode.")
+
+    async def start_usercode(self) -> None:
+        """Start any dead usercode."""
+        daemon_status = await self.get_daemon_status()
+
+        if daemon_status in [DaemonStatus.CODE_RUNNING, DaemonStatus.CODE_STARTING]:
+            raise ValueError("Usercode is already running.")
+
+        if daemon_status in [DaemonStatus.READY, DaemonStatus.STARTING]:
+            raise ValueError("There are no viable usercode drives available.")
+
+        try:
+            result, = await self._call_controller("start_usercode")
+        except GLib.Error as e:
+            raise Pepper2Exception(
+                "Error when sending start usercode command.",
+            ) from e
+
+        if not result:
+            raise Pepper2Exception("Unable to start usercode.")
+
+    async def get_usercode_drive(self) -> Drive:
+        """
+        Get the drive of the executing usercode.
+
+        :returns: the executing drive.
+        """
+        drive = (await self.get_state()).usercode_drive
+        if drive is None:
+            raise ValueError("No usercode is currently executing")
+        return drive
+
+    async def get_usercode_driver_name(self) -> str:
+        """Get the usercode driver name."""
+        try:
+            name = await self._get_property("usercode_driver_name")
+        except GLib.Error as e:
+            raise Pepper2Exception("Error fetching drive list from daemon.") from e
+
+        if name == "":
+            raise ValueError("No usercode is currently executing")
+        else:
+            return name
+
+    async def watch(
+            self,
+            *,
+            timeout: Optional[float] = None,
+            initial_status: bool = False,
+    ) -> AsyncGenerator[Event, None]:
+        """
+        Watch for events from the daemon.
+
+        Events are yielded as the daemon emits them. The iterator
+        finishes once ``timeout`` seconds have passed.
+
+        :param initial_status: first yield an event with the current status.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        queue: 'asyncio.Queue[Event]' = asyncio.Queue()
+
+        def signal_received(
+                _: Gio.DBusConnection,
+                __: str,
+                ___: str,
+                ____: str,
+                signal_name: str,
+                parameters: GLib.Variant,
+        ) -> None:
+            params = cast(Tuple[object, ...], parameters.unpack())
+            event = event_from_signal(signal_name, params)
+            if event is not None:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        def subscribe() -> List[int]:
+            # Signal callbacks are called on the thread that subscribed.
+            return [
+                self._connection.signal_subscribe(
+                    self._dbus_path,
+                    interface,
+                    member,
+                    self._object_path,
+                    arg0,
+                    Gio.DBusSignalFlags.NONE,
+                    signal_received,
+                )
+                for interface, member, arg0 in [
+                    (CONTROLLER_INTERFACE, "drive_added", None),
+                    (CONTROLLER_INTERFACE, "drive_removed", None),
+                    (
+                        "org.freedesktop.DBus.Properties",
+                        "PropertiesChanged",
+                        CONTROLLER_INTERFACE,
+                    ),
+                ]
+            ]
+
+        subscription_ids = await run_in_glib_thread(subscribe)
+
+        try:
+            if initial_status:
+                yield StatusChangedEvent(await self.get_daemon_status())
+
+            while True:
+                if deadline is None:
+                    yield await queue.get()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        return
+                    try:
+                        event = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        return
+                    yield event
+        finally:
+            for subscription_id in subscription_ids:
+                self._connection.signal_unsubscribe(subscription_id)
+
+    async def wait_for_status(
+            self,
+            *statuses: DaemonStatus,
+            timeout: Optional[float] = None,
+    ) -> DaemonStatus:
+        """
+        Wait until the daemon has one of the given statuses.
+
+        :returns: the status of the daemon.
+        :raises TimeoutError: the daemon did not reach the status in time.
+        """
+        events = self.watch(timeout=timeout, initial_status=True)
+        try:
+            async for event in events:
+                if isinstance(event, StatusChangedEvent) \
+                        and event.daemon_status in statuses:
+                    return event.daemon_status
+        finally:
+            await events.aclose()
+
+        raise TimeoutError("Timed out waiting for the daemon status.")
@@ -0,0 +1,66 @@
+"""Events emitted by the daemon."""
+
+from typing import Dict, NamedTuple, Optional, Tuple, Union, cast
+
+from pepper2.common.daemon_status import DaemonStatus
+from pepper2.daemon.dbus.drive import Drive, DriveStruct
+
+
+class DriveAddedEvent(NamedTuple):
+    """A drive was registered by the daemon."""
+
+    drive: Drive
+
+    def __str__(self) -> str:
+        return (
+            f"Drive added ({self.drive.drive_type.name}): "
+            f"{self.drive.uuid} {self.drive.mount_path}"
+        )
+
+
+class DriveRemovedEvent(NamedTuple):
+    """A drive was removed from the daemon."""
+
+    drive: Drive
+
+    def __str__(self) -> str:
+        return (
+            f"Drive removed ({self.drive.drive_type.name}): "
+            f"{self.drive.uuid} {self.drive.mount_path}"
+        )
+
+
+class StatusChangedEvent(NamedTuple):
+    """The status of the daemon changed."""
+
+    daemon_status: DaemonStatus
+
+    def __str__(self) -> str:
+        return f"Status changed: {self.daemon_status.name}"
+
+
+Event = Union[DriveAddedEvent, DriveRemovedEvent, StatusChangedEvent]
+
+
+def event_from_signal(signal_name: str, params: Tuple[object, ...]) -> Optional[Event]:
+    """
+    Construct an event from a signal emitted by the daemon.
+
+    :returns: the event, or None if the signal is not of interest.
+    """
+    if signal_name == "drive_added":
+        return DriveAddedEvent(Drive.from_struct(cast(DriveStruct, params[0])))
+
+    if signal_name == "drive_removed":
+        return DriveRemovedEvent(Drive.from_struct(cast(DriveStruct, params[0])))
+
+    if signal_name == "PropertiesChanged":
+        changed = cast(Dict[str, str], params[1])
+        if "daemon_status" in changed:
+            try:
+                return StatusChangedEvent(DaemonStatus(changed["daemon_status"]))
+            except ValueError:
+                # Ignore statuses that this version does not know about.
+                pass
+
+    return None
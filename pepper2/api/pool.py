@@ -0,0 +1,100 @@
+"""A shared bus connection and proxy cache for API clients."""
+
+from threading import RLock
+from typing import Dict, Optional, Tuple
+
+from gi.repository import GLib
+from pydbus import SystemBus
+from pydbus.bus import Bus
+from pydbus.subscription import Subscription
+
+
+def dispatch_pending() -> None:
+    """
+    Handle any signals that have been received, without blocking.
+
+    Nothing is handled if another thread is running the main loop, as
+    that thread will handle the signals instead.
+    """
+    context = GLib.MainContext.default()
+    while context.pending() and context.iteration(False):
+        pass
+
+
+class ProxyPool:
+    """
+    A cache of the connection to the system bus and proxies on it.
+
+    Creating a proxy requires introspecting the remote object, so proxies
+    are reused for as long as their bus name keeps the same owner. The
+    proxies for a bus name are discarded when its owner changes, for
+    example when the daemon restarts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._bus: Optional[Bus] = None
+        self._proxies: Dict[Tuple[str, Optional[str]], object] = {}
+        self._subscriptions: Dict[str, Subscription] = {}
+
+    @property
+    def bus(self) -> Bus:
+        """Get the connection to the system bus."""
+        with self._lock:
+            if self._bus is None:
+                self._bus = SystemBus()
+            return self._bus
+
+    def get(self, bus_name: str, object_path: Optional[str] = None) -> object:
+        """Get a proxy for an object on the bus."""
+        # Discard proxies whose owners have changed before looking.
+        dispatch_pending()
+
+        with self._lock:
+            key = (bus_name, object_path)
+            if key not in self._proxies:
+                if bus_name not in self._subscriptions:
+                    self._subscriptions[bus_name] = self.bus.subscribe(
+                        sender="org.freedesktop.DBus",
+                        iface="org.freedesktop.DBus",
+                        signal="NameOwnerChanged",
+                        arg0=bus_name,
+                        signal_fired=self._name_owner_changed,
+                    )
+                self._proxies[key] = self.bus.get(bus_name, object_path)
+            return self._proxies[key]
+
+    def invalidate(self, bus_name: str) -> None:
+        """Discard all proxies for a bus name."""
+        with self._lock:
+            for key in [key for key in self._proxies if key[0] == bus_name]:
+                del self._proxies[key]
+
+    def close(self) -> None:
+        """Discard the connection and all proxies."""
+        with self._lock:
+            for subscription in self._subscriptions.values():
+                subscription.unsubscribe()
+            self._subscriptions.clear()
+            self._proxies.clear()
+            self._bus = None
+
+    def _name_owner_changed(
+            self,
+            _: str,
+            __: str,
+            ___: str,
+            ____: str,
+            params: Tuple[str, str, str],
+    ) -> None:
+        """Discard the proxies for a bus name when its owner changes."""
+        bus_name, _, _ = params
+        self.invalidate(bus_name)
+
+
+_default_pool = ProxyPool()
+
+
+def get_default_pool() -> ProxyPool:
+    """Get the pool that is shared by clients in this process."""
+    return _default_pool
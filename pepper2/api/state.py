@@ -0,0 +1,105 @@
+"""Snapshot of the state of the daemon."""
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, cast
+
+from pepper2.api.error import Pepper2Exception
+from pepper2.common.daemon_status import DaemonStatus
+from pepper2.common.state_fields import StateFields
+from pepper2.common.status_file import (
+    DEFAULT_STATUS_FILE_PATH,
+    StatusFileError,
+    StatusFileReader,
+)
+from pepper2.daemon.dbus.drive import Drive, DriveStruct
+
+
+class DaemonState(NamedTuple):
+    """
+    A consistent snapshot of the state of the daemon.
+
+    The generation increases every time that the state of the daemon
+    changes, and can be used to fetch only the changes since this snapshot.
+    """
+
+    generation: int
+    daemon_status: DaemonStatus
+    version: str
+    usercode_drive_uuid: Optional[str]
+    usercode_driver_name: Optional[str]
+    drives: Dict[str, Drive]
+    last_exit_code: Optional[int]
+
+    @classmethod
+    def from_fields(cls, generation: int, fields: StateFields) -> 'DaemonState':
+        """Construct the state from the full set of fields sent over DBus."""
+        empty = cls(
+            generation=generation,
+            daemon_status=DaemonStatus.STARTING,
+            version="",
+            usercode_drive_uuid=None,
+            usercode_driver_name=None,
+            drives={},
+            last_exit_code=None,
+        )
+        return empty.with_changes(generation, fields)
+
+    def with_changes(self, generation: int, changes: StateFields) -> 'DaemonState':
+        """
+        Apply changed fields sent over DBus to the state.
+
+        :returns: the same state if nothing has changed, otherwise a new state.
+        """
+        if generation == self.generation and len(changes) == 0:
+            return self
+
+        state = self._replace(generation=generation)
+
+        if "daemon_status" in changes:
+            status_string = str(changes["daemon_status"])
+            try:
+                state = state._replace(daemon_status=DaemonStatus(status_string))
+            except ValueError:
+                raise Pepper2Exception(
+                    f"Received unknown status string from daemon: {status_string}",
+                )
+        if "version" in changes:
+            state = state._replace(version=str(changes["version"]))
+        if "usercode_drive" in changes:
+            state = state._replace(
+                usercode_drive_uuid=str(changes["usercode_drive"]) or None,
+            )
+        if "usercode_driver_name" in changes:
+            state = state._replace(
+                usercode_driver_name=str(changes["usercode_driver_name"]) or None,
+            )
+        if "drives" in changes:
+            drive_structs = cast(List[DriveStruct], changes["drives"])
+            drives = [Drive.from_struct(struct) for struct in drive_structs]
+            state = state._replace(drives={drive.uuid: drive for drive in drives})
+        if "last_exit_code" in changes:
+            state = state._replace(last_exit_code=cast(int, changes["last_exit_code"]))
+
+        return state
+
+    @property
+    def usercode_drive(self) -> Optional[Drive]:
+        """The drive of the executing usercode, if any."""
+        if self.usercode_drive_uuid is None:
+            return None
+        return self.drives.get(self.usercode_drive_uuid)
+
+
+def read_status_file(path: Path = DEFAULT_STATUS_FILE_PATH) -> DaemonState:
+    """
+    Read the state of the daemon from its status file.
+
+    This does not use D-Bus, and is much faster than fetching the state
+    from the daemon. It is only available on the machine running the daemon.
+    """
+    try:
+        generation, fields = StatusFileReader(path).read()
+    except StatusFileError as e:
+        raise Pepper2Exception(f"Unable to read status file: {e}") from e
+
+    return DaemonState.from_fields(generation, fields)
@@ -1 +1,6 @@
-"""Pepperctl CLI."""
+"""
+Pepperctl CLI.
+
+Commands import the parts of the API that they use when they are run,
+rather than when pepperctl starts, so that pepperctl starts quickly.
+"""
@@ -3,7 +3,9 @@
 import click
 
 from .daemon_status import daemon_status
+from .shell import shell
 from .usercode import usercode
+from .watch import watch
 
 
 @click.group('pepperctl')
@@ -13,7 +15,9 @@ def main() -> None:
 
 
 main.add_command(daemon_status)
+main.add_command(shell)
 main.add_command(usercode)
+main.add_command(watch)
 
 if __name__ == "__main__":
     main()
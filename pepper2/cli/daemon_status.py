@@ -1,22 +1,39 @@
 """Pepperctl status command."""
 
+import sys
+
 import click
 
-from pepper2.api import Pepper2, Pepper2Exception
+from pepper2.api.error import Pepper2Exception
+from pepper2.cli.output import echo_error, echo_json, state_to_json
 
 
 @click.command("status")
-def daemon_status() -> None:
+@click.option(
+    "--fast",
+    is_flag=True,
+    help="Read the status file published by the daemon, instead of using D-Bus.",
+)
+@click.option("--json", "use_json", is_flag=True, help="Output as JSON.")
+def daemon_status(*, fast: bool, use_json: bool) -> None:
     """Get the status of pepper2."""
     try:
-        pepper2 = Pepper2()
+        if fast:
+            from pepper2.api import read_status_file
+            state = read_status_file()
+        else:
+            from pepper2.api import Pepper2
+            state = Pepper2().state
     except Pepper2Exception as e:
-        click.secho(str(e), err=True, fg="red")
-        exit(1)
+        echo_error(str(e), use_json=use_json)
+        sys.exit(1)
+
+    if use_json:
+        echo_json(state_to_json(state))
+        return
 
-    print(f"Pepper2 - Robot Management Daemon v{pepper2.daemon_version}")
-    print(f"\tDaemon Status: {pepper2.daemon_status.name}")
-    drives = pepper2.drives
-    print(f"\t{len(drives)} drives currently registered.")
-    for drive in drives.values():
+    print(f"Pepper2 - Robot Management Daemon v{state.version}")
+    print(f"\tDaemon Status: {state.daemon_status.name}")
+    print(f"\t{len(state.drives)} drives currently registered.")
+    for drive in state.drives.values():
         print(f"\t\t{drive.drive_type.name}: {drive.mount_path}")
@@ -0,0 +1,64 @@
+"""Machine-readable output for pepperctl commands."""
+
+import json
+from typing import TYPE_CHECKING, Dict
+
+import click
+
+if TYPE_CHECKING:
+    from pepper2.api import DaemonState
+    from pepper2.daemon.dbus.drive import Drive
+
+JSONObject = Dict[str, object]
+
+
+def drive_to_json(drive: 'Drive') -> JSONObject:
+    """Convert a drive to a JSON object."""
+    return {
+        "uuid": drive.uuid,
+        "mount_path": str(drive.mount_path),
+        "drive_type": drive.drive_type.name,
+    }
+
+
+def usercode_to_json(state: 'DaemonState') -> JSONObject:
+    """Convert the usercode part of a state to a JSON object."""
+    drive = state.usercode_drive
+    return {
+        "daemon_status": state.daemon_status.name,
+        "driver_name": state.usercode_driver_name,
+        "drive": None if drive is None else drive_to_json(drive),
+        "last_exit_code": state.last_exit_code,
+    }
+
+
+def state_to_json(state: 'DaemonState') -> JSONObject:
+    """Convert a state to a JSON object."""
+    return {
+        "generation": state.generation,
+        "version": state.version,
+        "daemon_status": state.daemon_status.name,
+        "drives": [drive_to_json(drive) for drive in state.drives.values()],
+        "usercode": usercode_to_json(state),
+    }
+
+
+def echo_json(data: JSONObject) -> None:
+    """Print a JSON object on a single line."""
+    click.echo(json.dumps(data, sort_keys=True))
+
+
+def echo_success(message: str, *, use_json: bool) -> None:
+    """Report that a command succeeded."""
+    if use_json:
+        echo_json({"success": True, "error": None})
+    else:
+        click.secho(message, fg="green")
+
+
+def echo_error(message: str, *, use_json: bool) -> None:
+    """Report that a command failed."""
+    if use_json:
+        echo_json({"success": False, "error": message})
+    else:
+        click.secho(message, err=True, fg="red")
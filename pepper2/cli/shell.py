@@ -0,0 +1,102 @@
+"""Pepperctl shell command."""
+
+import shlex
+import sys
+from typing import List, Optional
+
+import click
+
+from pepper2.api.error import Pepper2Exception
+
+PROMPT = "pepperctl> "
+
+
+def _read_line(*, interactive: bool) -> Optional[str]:
+    """
+    Read a command line from standard input.
+
+    :returns: the line, or None at the end of the input.
+    """
+    if interactive:
+        try:
+            return input(PROMPT)
+        except EOFError:
+            print()
+            return None
+
+    line = sys.stdin.readline()
+    return None if line == "" else line
+
+
+def _run_command(command: click.Command, args: List[str]) -> int:
+    """
+    Run a pepperctl command in this process.
+
+    :returns: the exit code of the command.
+    """
+    if not args:
+        return 0
+
+    if args[0] == "shell":
+        click.secho("Unable to run a shell within a shell.", err=True, fg="red")
+        return 2
+
+    try:
+        result = command.main(args, prog_name="pepperctl", standalone_mode=False)
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        return 1
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    except Pepper2Exception as e:
+        click.secho(str(e), err=True, fg="red")
+        return 1
+    except Exception as e:
+        click.secho(f"Unexpected error running {args[0]}: {e!r}", err=True, fg="red")
+        return 1
+    return result if isinstance(result, int) else 0
+
+
+@click.command("shell")
+@click.option(
+    "-k",
+    "--keep-going",
+    is_flag=True,
+    help="Carry on after a command fails, rather than stopping.",
+)
+@click.pass_context
+def shell(ctx: click.Context, *, keep_going: bool) -> None:
+    """
+    Run many commands over a single connection to pepper2.
+
+    Commands are read from standard input, one per line, without the
+    leading pepperctl. Comments and blank lines are ignored.
+    """
+    root = ctx.find_root().command
+    interactive = sys.stdin.isatty()
+    exit_code = 0
+
+    while True:
+        line = _read_line(interactive=interactive)
+        if line is None:
+            break
+
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            click.secho(f"Unable to parse command: {e}", err=True, fg="red")
+            code = 2
+        else:
+            code = _run_command(root, args)
+
+        sys.stdout.flush()
+        if code != 0:
+            exit_code = code
+            if not (interactive or keep_going):
+                break
+
+    sys.exit(exit_code)
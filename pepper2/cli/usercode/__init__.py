@@ -5,6 +5,7 @@ import click
 from .kill import kill
 from .start import start
 from .usercode_status import usercode_status
+from .wait import wait
 
 
 @click.group()
@@ -16,3 +17,4 @@ def usercode() -> None:
 usercode.add_command(kill)
 usercode.add_command(start)
 usercode.add_command(usercode_status)
+usercode.add_command(wait)
@@ -1,25 +1,34 @@
 """Kill usercode command."""
 
+import sys
+
 import click
 
-from pepper2.api import Pepper2, Pepper2Exception
+from pepper2.api.error import Pepper2Exception
+from pepper2.cli.output import echo_error, echo_success
 
 
 @click.command("kill")
-def kill() -> None:
+@click.option("--json", "use_json", is_flag=True, help="Output as JSON.")
+def kill(*, use_json: bool) -> None:
     """Kill running usercode."""
+    from pepper2.api import Pepper2
+
     try:
         pepper2 = Pepper2()
     except Pepper2Exception as e:
-        click.secho(str(e), err=True, fg="red")
-        exit(1)
+        echo_error(str(e), use_json=use_json)
+        sys.exit(1)
 
     try:
         pepper2.kill_usercode()
-        click.secho("Usercode killed successfully.", fg="green")
     except ValueError:
-        click.secho(
+        echo_error(
             "Unable to kill usercode: No usercode running.",
-            err=True,
-            fg="red",
+            use_json=use_json,
         )
+        sys.exit(1)
+    except Pepper2Exception as e:
+        echo_error(f"Unable to kill usercode: {e}", use_json=use_json)
+        sys.exit(1)
+    echo_success("Usercode killed successfully.", use_json=use_json)
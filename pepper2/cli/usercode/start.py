@@ -1,25 +1,28 @@
 """Start usercode command."""
 
+import sys
+
 import click
 
-from pepper2.api import Pepper2, Pepper2Exception
+from pepper2.api.error import Pepper2Exception
+from pepper2.cli.output import echo_error, echo_success
 
 
 @click.command("start")
-def start() -> None:
+@click.option("--json", "use_json", is_flag=True, help="Output as JSON.")
+def start(*, use_json: bool) -> None:
     """Start dead usercode."""
+    from pepper2.api import Pepper2
+
     try:
         pepper2 = Pepper2()
     except Pepper2Exception as e:
-        click.secho(str(e), err=True, fg="red")
-        exit(1)
+        echo_error(str(e), use_json=use_json)
+        sys.exit(1)
 
     try:
         pepper2.start_usercode()
-        click.secho("Usercode started successfully.", fg="green")
-    except ValueError as e:
-        click.secho(
-            f"Unable to start usercode: {e}",
-            err=True,
-            fg="red",
-        )
+    except (ValueError, Pepper2Exception) as e:
+        echo_error(f"Unable to start usercode: {e}", use_json=use_json)
+        sys.exit(1)
+    echo_success("Usercode started successfully.", use_json=use_json)
@@ -1,29 +1,45 @@
 """Usercode status command."""
 
+import sys
+
 import click
 
-from pepper2.api import Pepper2, Pepper2Exception
+from pepper2.api.error import Pepper2Exception
+from pepper2.cli.output import echo_error, echo_json, usercode_to_json
 
 
 @click.command("status")
-def usercode_status() -> None:
+@click.option(
+    "--fast",
+    is_flag=True,
+    help="Read the status file published by the daemon, instead of using D-Bus.",
+)
+@click.option("--json", "use_json", is_flag=True, help="Output as JSON.")
+def usercode_status(*, fast: bool, use_json: bool) -> None:
     """Get the status of running usercode."""
     try:
-        pepper2 = Pepper2()
+        if fast:
+            from pepper2.api import read_status_file
+            state = read_status_file()
+        else:
+            from pepper2.api import Pepper2
+            state = Pepper2().state
     except Pepper2Exception as e:
-        click.secho(str(e), err=True, fg="red")
-        exit(1)
+        echo_error(str(e), use_json=use_json)
+        sys.exit(1)
+
+    if use_json:
+        echo_json(usercode_to_json(state))
+        return
 
     print("Pepper2 Usercode Status")
-    print(f"\tDaemon Status: {pepper2.daemon_status.name}")
-    try:
-        driver_name = pepper2.usercode_driver_name
-        drive = pepper2.usercode_drive
-        print(f"\tExecution Driver: {driver_name}")
+    print(f"\tDaemon Status: {state.daemon_status.name}")
+    drive = state.usercode_drive
+    if state.usercode_driver_name is not None and drive is not None:
+        print(f"\tExecution Driver: {state.usercode_driver_name}")
         print(f"\tDrive UUID: {drive.uuid}")
         print(f"\tMount Path: {drive.mount_path}")
-    except Pepper2Exception as e:
-        click.secho(str(e), err=True, fg="red")
-        exit(1)
-    except ValueError:
+    else:
         print("\tNo usercode running.")
+    if state.last_exit_code is not None:
+        print(f"\tLast Exit Code: {state.last_exit_code}")
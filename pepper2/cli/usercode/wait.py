@@ -0,0 +1,50 @@
+"""Wait for usercode command."""
+
+import sys
+from typing import Optional, Tuple
+
+import click
+
+from pepper2.api.error import Pepper2Exception
+from pepper2.common.daemon_status import DaemonStatus
+
+
+@click.command("wait")
+@click.argument(
+    "statuses",
+    nargs=-1,
+    required=True,
+    type=click.Choice(
+        [daemon_status.name for daemon_status in DaemonStatus],
+        case_sensitive=False,
+    ),
+)
+@click.option(
+    "-t",
+    "--timeout",
+    type=float,
+    default=None,
+    help="Give up after this many seconds.",
+)
+def wait(*, statuses: Tuple[str, ...], timeout: Optional[float]) -> None:
+    """Wait until the daemon reaches one of STATUSES."""
+    from pepper2.api import Pepper2
+
+    try:
+        pepper2 = Pepper2()
+        daemon_status = pepper2.wait_for_status(
+            *(DaemonStatus[name.upper()] for name in statuses),
+            timeout=timeout,
+        )
+    except Pepper2Exception as e:
+        click.secho(str(e), err=True, fg="red")
+        sys.exit(1)
+    except TimeoutError:
+        click.secho(
+            "Timed out waiting for the daemon status.",
+            err=True,
+            fg="red",
+        )
+        sys.exit(2)
+
+    print(f"Daemon Status: {daemon_status.name}")
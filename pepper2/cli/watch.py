@@ -0,0 +1,29 @@
+"""Pepperctl watch command."""
+
+import sys
+from typing import Optional
+
+import click
+
+from pepper2.api.error import Pepper2Exception
+
+
+@click.command("watch")
+@click.option(
+    "-t",
+    "--timeout",
+    type=float,
+    default=None,
+    help="Stop watching after this many seconds.",
+)
+def watch(*, timeout: Optional[float]) -> None:
+    """Print events from pepper2 as they happen."""
+    from pepper2.api import Pepper2
+
+    try:
+        pepper2 = Pepper2()
+        for event in pepper2.watch(timeout=timeout, initial_status=True):
+            print(event, flush=True)
+    except Pepper2Exception as e:
+        click.secho(str(e), err=True, fg="red")
+        sys.exit(1)
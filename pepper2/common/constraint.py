@@ -2,9 +2,148 @@
 USB Constraint.
 
 Defines a set of parameters that a USB / Folder can conform to.
+
+Constraints can be combined with ``&``, ``|`` and ``~``, and simplified
+so that cheap checks are made before expensive ones.
+
+Constraints can be compiled into a matcher, which matches a listing of
+the directory rather than reading the directory itself. A listing can
+be shared by many matchers, so that a drive is only read once, and only
+as far as the matchers need.
+
+Constraints that read directories stop as soon as the result is known,
+and constraints that walk the whole drive are bounded, so that drives
+with many files are checked quickly.
 """
+import os
+import re
+import stat
 from abc import ABCMeta, abstractmethod
+from fnmatch import translate
+from itertools import islice
 from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    cast,
+)
+
+
+class DirectoryListing:
+    """
+    The entries in a directory, read on demand with a single scan.
+
+    Entries are only read from the directory as far as they are needed,
+    and the entries read so far are kept, so that matchers that share a
+    listing do not read the directory again. Entries that are checked
+    for by name are looked up directly, without reading the directory.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._iterator = os.scandir(path)
+        self._complete = False
+        self._entries: List['os.DirEntry[str]'] = []
+        self._stats: Dict[str, Optional[os.stat_result]] = {}
+
+    @classmethod
+    def scan(cls, path: Path) -> 'DirectoryListing':
+        """
+        Start listing a directory.
+
+        The listing should be closed once it is no longer needed.
+
+        :raises OSError: if the path is not a readable directory.
+        """
+        return cls(path)
+
+    def stat(self, name: str) -> Optional[os.stat_result]:
+        """
+        Get the status of an entry in the directory, following symlinks.
+
+        :returns: the status, or None if there is no such entry.
+        """
+        if name not in self._stats:
+            try:
+                self._stats[name] = os.stat(self.path.joinpath(name))
+            except (OSError, ValueError):
+                self._stats[name] = None
+        return self._stats[name]
+
+    def count_up_to(self, limit: int) -> int:
+        """
+        Count the entries in the directory, up to a limit.
+
+        Only the first limit entries are read.
+        """
+        self._read_to(limit)
+        return min(len(self._entries), limit)
+
+    def close(self) -> None:
+        """Stop reading the directory."""
+        self._iterator.close()
+        self._complete = True
+
+    def _read_to(self, count: int) -> bool:
+        """
+        Read entries until count entries have been read.
+
+        :returns: whether the directory has at least count entries.
+        """
+        while len(self._entries) < count and not self._complete:
+            entry = next(self._iterator, None)
+            if entry is None:
+                self.close()
+            else:
+                self._entries.append(entry)
+        return len(self._entries) >= count
+
+    def __contains__(self, name: str) -> bool:
+        """Check if the directory contains an entry, following symlinks."""
+        return self.stat(name) is not None
+
+    def __iter__(self) -> Iterator['os.DirEntry[str]']:
+        """Iterate over the entries, reading more as they are needed."""
+        index = 0
+        while self._read_to(index + 1):
+            yield self._entries[index]
+            index += 1
+
+    def __enter__(self) -> 'DirectoryListing':
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"DirectoryListing(path={self.path}, read={len(self._entries)})"
+
+
+# A compiled constraint.
+Matcher = Callable[[DirectoryListing], bool]
+
+# The estimated cost of checking constraints, in filesystem operations.
+# Constraints that are not known are assumed to be expensive.
+UNKNOWN_COST = 100
+FILE_PRESENT_COST = 2
+NUMBER_OF_FILES_COST = 10
+TOTAL_SIZE_COST = 50
+
+# The number of entries to visit before giving up on a total size.
+DEFAULT_MAX_ENTRIES = 10000
+
+# The number of entries in the root directory whose names are included in
+# the fingerprint of a drive. Drives with more entries are only told apart
+# by their times beyond it.
+FINGERPRINT_MAX_ENTRIES = 1000
 
 
 class Constraint(metaclass=ABCMeta):
@@ -15,6 +154,65 @@ class Constraint(metaclass=ABCMeta):
         """Return true if path matches the constraint."""
         raise NotImplementedError  # pragma: nocover
 
+    def compile(self) -> Matcher:
+        """
+        Compile the constraint into a matcher for directory listings.
+
+        Constraints that cannot match a listing check the path instead.
+        """
+        return lambda listing: self.matches(listing.path)
+
+    def simplify(self) -> 'Constraint':
+        """
+        Get an equivalent constraint that is cheaper to check.
+
+        :returns: the simplified constraint, which may be this constraint.
+        """
+        return self
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return UNKNOWN_COST
+
+    def filenames(self) -> FrozenSet[str]:
+        """Get the names of the entries that the constraint checks for."""
+        return frozenset()
+
+    def cacheable(self) -> bool:
+        """
+        Check if the constraint only depends on the root directory.
+
+        The result of a cacheable constraint can be reused whilst the
+        fingerprint of a drive, which covers the first entries in the root
+        directory and the files that are checked for, is the same.
+        """
+        return False
+
+    def _identity(self) -> Hashable:
+        """
+        Get a value that is equal for equivalent constraints.
+
+        By default, a constraint is only equivalent to itself.
+        """
+        return id(self)
+
+    def __and__(self, other: 'Constraint') -> 'AndConstraint':
+        return AndConstraint(self, other)
+
+    def __or__(self, other: 'Constraint') -> 'OrConstraint':
+        return OrConstraint(self, other)
+
+    def __invert__(self) -> 'NotConstraint':
+        return NotConstraint(self)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Constraint):
+            return NotImplemented
+        return type(self) is type(other) and self._identity() == other._identity()
+
+    def __hash__(self) -> int:
+        return hash((type(self), self._identity()))
+
 
 class FilePresentConstraint(Constraint):
     """Ensure that a file is present."""
@@ -24,11 +222,29 @@ class FilePresentConstraint(Constraint):
 
     def matches(self, path: Path) -> bool:
         """Check if the path contains the file."""
-        return all([
-            path.exists(),
-            path.is_dir(),
-            path.joinpath(self.filename).exists(),
-        ])
+        return path.is_dir() and path.joinpath(self.filename).exists()
+
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        if "/" in self.filename:
+            return super().compile()
+        filename = self.filename
+        return lambda listing: filename in listing
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return FILE_PRESENT_COST
+
+    def filenames(self) -> FrozenSet[str]:
+        """Get the names of the entries that the constraint checks for."""
+        return frozenset([self.filename])
+
+    def cacheable(self) -> bool:
+        """Check if the constraint only depends on the root directory."""
+        return "/" not in self.filename
+
+    def _identity(self) -> Hashable:
+        return self.filename
 
     def __repr__(self) -> str:
         return f"FilePresentConstraint(filename={self.filename})"
@@ -41,53 +257,294 @@ class NumberOfFilesConstraint(Constraint):
         self.n = n
 
     def matches(self, path: Path) -> bool:
-        """Check that the path contains n files."""
-        if all([
-            path.exists(),
-            path.is_dir(),
-        ]):
-            return self.n == len(list(path.iterdir()))
+        """
+        Check that the path contains n files.
+
+        Only the first n + 1 entries are read.
+        """
+        if path.is_dir():
+            with os.scandir(path) as iterator:
+                return self.n == sum(1 for _ in islice(iterator, self.n + 1))
         else:
             return False
 
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        n = self.n
+        return lambda listing: listing.count_up_to(n + 1) == n
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return NUMBER_OF_FILES_COST
+
+    def cacheable(self) -> bool:
+        """
+        Check if the constraint only depends on the root directory.
+
+        The fingerprint only counts the first entries, so larger numbers
+        of files are not cacheable.
+        """
+        return self.n <= FINGERPRINT_MAX_ENTRIES
+
+    def _identity(self) -> Hashable:
+        return self.n
+
     def __repr__(self) -> str:
         return f"NumberOfFilesConstraint(n={self.n})"
 
 
-class OrConstraint(Constraint):
-    """Ensure that either of the constraints match."""
+class GlobPresentConstraint(Constraint):
+    """Ensure that an entry matching a shell-style pattern is present."""
 
-    def __init__(self, a: Constraint, b: Constraint) -> None:
-        self.a = a
-        self.b = b
+    def __init__(self, pattern: str) -> None:
+        self.pattern = pattern
+        self._regex = re.compile(translate(pattern))
 
     def matches(self, path: Path) -> bool:
-        """Check if either of the constraints match."""
-        return any([
-            self.a.matches(path),
-            self.b.matches(path),
-        ])
+        """
+        Check if the path contains an entry matching the pattern.
+
+        Entries are only read until one matches.
+        """
+        if path.is_dir():
+            with os.scandir(path) as iterator:
+                return any(self._regex.match(entry.name) for entry in iterator)
+        else:
+            return False
+
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        match = self._regex.match
+        return lambda listing: any(match(entry.name) for entry in listing)
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return NUMBER_OF_FILES_COST
+
+    def cacheable(self) -> bool:
+        """
+        Check if the constraint only depends on the root directory.
+
+        The entry that matches may be beyond those in the fingerprint,
+        so the constraint is not cacheable.
+        """
+        return False
+
+    def _identity(self) -> Hashable:
+        return self.pattern
 
     def __repr__(self) -> str:
-        return f"OrConstraint(a={self.a}, b={self.b})"
+        return f"GlobPresentConstraint(pattern={self.pattern})"
 
 
-class AndConstraint(Constraint):
-    """Ensure that both of the constraints match."""
+class FileSizeConstraint(Constraint):
+    """Ensure that a file is present, with a size within a range in bytes."""
 
-    def __init__(self, a: Constraint, b: Constraint) -> None:
-        self.a = a
-        self.b = b
+    def __init__(
+            self,
+            filename: str,
+            *,
+            min_size: int = 0,
+            max_size: Optional[int] = None,
+    ) -> None:
+        self.filename = filename
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def matches(self, path: Path) -> bool:
+        """Check if the path contains the file, with a size within the range."""
+        try:
+            return self._size_matches(os.stat(path.joinpath(self.filename)))
+        except (OSError, ValueError):
+            return False
+
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        if "/" in self.filename:
+            return super().compile()
+
+        def matcher(listing: DirectoryListing) -> bool:
+            file_stat = listing.stat(self.filename)
+            return file_stat is not None and self._size_matches(file_stat)
+
+        return matcher
+
+    def _size_matches(self, file_stat: os.stat_result) -> bool:
+        """Check that a file is a regular file, with a size within the range."""
+        return stat.S_ISREG(file_stat.st_mode) \
+            and self.min_size <= file_stat.st_size \
+            and (self.max_size is None or file_stat.st_size <= self.max_size)
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return FILE_PRESENT_COST
+
+    def filenames(self) -> FrozenSet[str]:
+        """Get the names of the entries that the constraint checks for."""
+        return frozenset([self.filename])
+
+    def cacheable(self) -> bool:
+        """Check if the constraint only depends on the root directory."""
+        return "/" not in self.filename
+
+    def _identity(self) -> Hashable:
+        return (self.filename, self.min_size, self.max_size)
+
+    def __repr__(self) -> str:
+        return (
+            f"FileSizeConstraint(filename={self.filename}, "
+            f"min_size={self.min_size}, max_size={self.max_size})"
+        )
+
+
+def _total_size_at_most(
+        entries: Iterable['os.DirEntry[str]'],
+        max_size: int,
+        max_entries: int,
+) -> bool:
+    """
+    Check that the files in a directory tree total at most max_size bytes.
+
+    The tree is walked until the size is exceeded, or max_entries entries
+    have been visited. Symlinks are not followed. A tree that cannot be
+    read is not known to be small enough.
+
+    :param entries: the entries in the root directory of the tree.
+    :returns: whether the size is known to be at most max_size.
+    """
+    total = 0
+    visited = 0
+    directories: List[str] = []
+
+    def visit(entries: Iterable['os.DirEntry[str]']) -> bool:
+        nonlocal total, visited
+        for entry in entries:
+            visited += 1
+            if visited > max_entries:
+                return False
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+                if total > max_size:
+                    return False
+        return True
+
+    try:
+        if not visit(entries):
+            return False
+        while directories:
+            with os.scandir(directories.pop()) as iterator:
+                if not visit(iterator):
+                    return False
+    except OSError:
+        return False
+    return True
+
+
+class TotalSizeConstraint(Constraint):
+    """
+    Ensure that the files on a drive total at most max_size bytes.
+
+    At most max_entries entries are visited, and a drive with more
+    entries does not match, so that large drives are not walked.
+    """
+
+    def __init__(self, max_size: int, *, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_size = max_size
+        self.max_entries = max_entries
 
     def matches(self, path: Path) -> bool:
-        """Check that both of the constraints match."""
-        return all([
-            self.a.matches(path),
-            self.b.matches(path),
-        ])
+        """Check that the files in the path total at most max_size bytes."""
+        if path.is_dir():
+            with os.scandir(path) as iterator:
+                return _total_size_at_most(iterator, self.max_size, self.max_entries)
+        else:
+            return False
+
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        max_size, max_entries = self.max_size, self.max_entries
+        return lambda listing: _total_size_at_most(
+            listing,
+            max_size,
+            max_entries,
+        )
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return TOTAL_SIZE_COST
+
+    def _identity(self) -> Hashable:
+        return (self.max_size, self.max_entries)
 
     def __repr__(self) -> str:
-        return f"AndConstraint(a={self.a}, b={self.b})"
+        return (
+            f"TotalSizeConstraint(max_size={self.max_size}, "
+            f"max_entries={self.max_entries})"
+        )
+
+
+class _CompoundConstraint(Constraint):
+    """A constraint that combines any number of constraints."""
+
+    # The constraint that the combination short-circuits on, and the
+    # constraint that has no effect on the combination.
+    _absorbing: Type[Constraint]
+    _identity_element: Type[Constraint]
+
+    def __init__(self, *constraints: Constraint) -> None:
+        self.constraints: Tuple[Constraint, ...] = constraints
+
+    def simplify(self) -> Constraint:
+        """
+        Get an equivalent constraint that is cheaper to check.
+
+        Nested combinations of the same kind are flattened, constant and
+        duplicate constraints are removed, and the remaining constraints
+        are ordered by their estimated cost.
+        """
+        constraints: List[Constraint] = []
+        for constraint in self._flatten(c.simplify() for c in self.constraints):
+            if isinstance(constraint, self._absorbing):
+                return constraint
+            if not isinstance(constraint, self._identity_element) \
+                    and constraint not in constraints:
+                constraints.append(constraint)
+
+        if len(constraints) == 0:
+            return self._identity_element()
+        if len(constraints) == 1:
+            return constraints[0]
+        constraints.sort(key=lambda constraint: constraint.estimated_cost())
+        return type(self)(*constraints)
+
+    def _flatten(self, constraints: Iterable[Constraint]) -> Iterable[Constraint]:
+        """Replace nested combinations of the same kind with their constraints."""
+        for constraint in constraints:
+            if type(constraint) is type(self):
+                yield from cast(_CompoundConstraint, constraint).constraints
+            else:
+                yield constraint
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking all of the constraints."""
+        return sum(constraint.estimated_cost() for constraint in self.constraints)
+
+    def filenames(self) -> FrozenSet[str]:
+        """Get the names of the entries that the constraints check for."""
+        return frozenset().union(*(c.filenames() for c in self.constraints))
+
+    def cacheable(self) -> bool:
+        """Check if the constraints only depend on the root directory."""
+        return all(constraint.cacheable() for constraint in self.constraints)
+
+    def _identity(self) -> Hashable:
+        return frozenset(self.constraints)
+
+    def __repr__(self) -> str:
+        constraints = ", ".join(repr(constraint) for constraint in self.constraints)
+        return f"{type(self).__name__}({constraints})"
 
 
 class NotConstraint(Constraint):
@@ -100,6 +557,37 @@ class NotConstraint(Constraint):
         """Check that the constraint does not match."""
         return not self.a.matches(path)
 
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        a = self.a.compile()
+        return lambda listing: not a(listing)
+
+    def simplify(self) -> Constraint:
+        """Get an equivalent constraint that is cheaper to check."""
+        a = self.a.simplify()
+        if isinstance(a, TrueConstraint):
+            return FalseConstraint()
+        if isinstance(a, FalseConstraint):
+            return TrueConstraint()
+        if isinstance(a, NotConstraint):
+            return a.a
+        return NotConstraint(a)
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return self.a.estimated_cost()
+
+    def filenames(self) -> FrozenSet[str]:
+        """Get the names of the entries that the constraint checks for."""
+        return self.a.filenames()
+
+    def cacheable(self) -> bool:
+        """Check if the constraint only depends on the root directory."""
+        return self.a.cacheable()
+
+    def _identity(self) -> Hashable:
+        return self.a
+
     def __repr__(self) -> str:
         return f"NotConstraint(a={self.a})"
 
@@ -111,6 +599,21 @@ class TrueConstraint(Constraint):
         """Always return true."""
         return True
 
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        return lambda _: True
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return 0
+
+    def cacheable(self) -> bool:
+        """Check if the constraint only depends on the root directory."""
+        return True
+
+    def _identity(self) -> Hashable:
+        return ()
+
     def __repr__(self) -> str:
         return "TrueConstraint()"
 
@@ -122,5 +625,52 @@ class FalseConstraint(Constraint):
         """Always return false."""
         return False
 
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        return lambda _: False
+
+    def estimated_cost(self) -> int:
+        """Estimate the cost of checking the constraint."""
+        return 0
+
+    def cacheable(self) -> bool:
+        """Check if the constraint only depends on the root directory."""
+        return True
+
+    def _identity(self) -> Hashable:
+        return ()
+
     def __repr__(self) -> str:
         return "FalseConstraint()"
+
+
+class OrConstraint(_CompoundConstraint):
+    """Ensure that any of the constraints match."""
+
+    _absorbing = TrueConstraint
+    _identity_element = FalseConstraint
+
+    def matches(self, path: Path) -> bool:
+        """Check if any of the constraints match, in order."""
+        return any(constraint.matches(path) for constraint in self.constraints)
+
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        matchers = tuple(constraint.compile() for constraint in self.constraints)
+        return lambda listing: any(matcher(listing) for matcher in matchers)
+
+
+class AndConstraint(_CompoundConstraint):
+    """Ensure that all of the constraints match."""
+
+    _absorbing = FalseConstraint
+    _identity_element = TrueConstraint
+
+    def matches(self, path: Path) -> bool:
+        """Check that all of the constraints match, in order."""
+        return all(constraint.matches(path) for constraint in self.constraints)
+
+    def compile(self) -> Matcher:
+        """Compile the constraint into a matcher for directory listings."""
+        matchers = tuple(constraint.compile() for constraint in self.constraints)
+        return lambda listing: all(matcher(listing) for matcher in matchers)
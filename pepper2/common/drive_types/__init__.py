@@ -2,6 +2,7 @@
 
 from typing import List, Type
 
+from .classifier import DriveClassifier
 from .drive_type import DriveType
 from .metadata import MetadataDriveType
 from .no_action import NoActionDriveType
@@ -17,6 +18,7 @@ DRIVE_TYPES: List[Type[DriveType]] = [
 
 __all__ = [
     'DRIVE_TYPES',
+    'DriveClassifier',
     'DriveType',
     'MetadataDriveType',
     'NoActionDriveType',
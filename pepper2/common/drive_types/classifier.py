@@ -0,0 +1,60 @@
+"""Drive Classifier."""
+
+from pathlib import Path
+from typing import FrozenSet, List, Sequence, Tuple, Type
+
+from pepper2.common.constraint import DirectoryListing, Matcher
+
+from .drive_type import DriveType
+
+
+class DriveClassifier:
+    """
+    Determine the type of drives.
+
+    The constraints of the drive types are simplified and compiled once,
+    and matched against a single listing of each drive, which is only
+    read as far as the drive types need.
+    """
+
+    def __init__(self, drive_types: Sequence[Type[DriveType]]) -> None:
+        self._matchers: List[Tuple[Type[DriveType], Matcher]] = []
+        filenames: FrozenSet[str] = frozenset()
+        cacheable = True
+        for drive_type in drive_types:
+            constraint = drive_type.constraint_matcher().simplify()
+            self._matchers.append((drive_type, constraint.compile()))
+            filenames |= constraint.filenames()
+            cacheable = cacheable and constraint.cacheable()
+
+        # The entries that any drive type checks for.
+        self.filenames = filenames
+
+        # Whether the drive type only depends on the root directory of the
+        # drive, so can be reused whilst its fingerprint is the same.
+        self.cacheable = cacheable
+
+    def classify(self, listing: DirectoryListing) -> Type[DriveType]:
+        """
+        Determine the drive type of a listing of a drive.
+
+        The drive types are matched in priority order.
+        """
+        for drive_type, matcher in self._matchers:
+            if matcher(listing):
+                return drive_type
+        raise RuntimeError("Unable to match drive.")
+
+    def present_files(self, listing: DirectoryListing) -> FrozenSet[str]:
+        """Get the entries that any drive type checks for that are in a listing."""
+        return frozenset(name for name in self.filenames if name in listing)
+
+    def classify_path(self, path: Path) -> Tuple[Type[DriveType], FrozenSet[str]]:
+        """
+        List a drive and determine its drive type.
+
+        :raises OSError: if the drive cannot be read.
+        :returns: the drive type, and the entries checked for that are present.
+        """
+        with DirectoryListing.scan(path) as listing:
+            return self.classify(listing), self.present_files(listing)
@@ -1,19 +1,15 @@
 """Usercode Drive Type."""
 
 import logging
+from concurrent.futures import TimeoutError
 from typing import TYPE_CHECKING, Mapping, Type
 
 from pepper2.common.constraint import (
     Constraint,
-    FalseConstraint,
     FilePresentConstraint,
     OrConstraint,
 )
 from pepper2.common.daemon_status import DaemonStatus
-from pepper2.daemon.usercode_driver import (
-    PythonUnixProcessDriver,
-    UserCodeDriver,
-)
 
 from .drive_type import DriveType
 from .no_action import NoActionDriveType
@@ -21,12 +17,28 @@ from .no_action import NoActionDriveType
 if TYPE_CHECKING:
     from pepper2.daemon.dbus.controller import Controller
     from pepper2.daemon.dbus.drive import Drive
+    from pepper2.daemon.snapshot import Adoption
+    from pepper2.daemon.usercode_driver import UserCodeDriver
 
 LOGGER = logging.getLogger(__name__)
 
-DRIVERS: Mapping[str, Type[UserCodeDriver]] = {
-    "main.py": PythonUnixProcessDriver,
-}
+# How much longer than the drivers allow to wait for usercode to stop,
+# in seconds.
+STOP_MARGIN = 1.0
+
+
+def get_drivers() -> Mapping[str, Type['UserCodeDriver']]:
+    """
+    Get the usercode drivers, keyed by the filename that they execute.
+
+    The drivers are only used by the daemon, so they are not imported
+    until they are needed.
+    """
+    from pepper2.daemon.usercode_driver import PythonUnixProcessDriver
+
+    return {
+        "main.py": PythonUnixProcessDriver,
+    }
 
 
 class UserCodeDriveType(DriveType):
@@ -37,21 +49,23 @@ class UserCodeDriveType(DriveType):
     @classmethod
     def constraint_matcher(cls) -> Constraint:
         """Get the constraints for a drive to match this type."""
-        constraint: Constraint = FalseConstraint()
-
-        for filename in DRIVERS.keys():
-            constraint = OrConstraint(constraint, FilePresentConstraint(filename))
-
-        return constraint
+        return OrConstraint(*(
+            FilePresentConstraint(filename) for filename in get_drivers().keys()
+        ))
 
     @classmethod
     def mount_action(cls, drive: 'Drive', daemon_controller: 'Controller') -> None:
         """Perform the mount action."""
-        with daemon_controller.data_lock:
+        with daemon_controller.usercode_lock:
+            usercode_driver = daemon_controller.usercode_driver
+            if usercode_driver is not None and usercode_driver.detached \
+                    and not usercode_driver.running:
+                # The code of a removed drive has exited since it was stopped.
+                daemon_controller.usercode_driver = None
+
             if daemon_controller.usercode_driver is None:
-                for filename in DRIVERS.keys():
-                    if drive.mount_path.joinpath(filename).exists():
-                        driver = DRIVERS[filename]
+                for filename, driver in get_drivers().items():
+                    if cls._has_file(drive, filename):
                         LOGGER.info(
                             f"Starting usercode process with {driver.__name__}.",
                         )
@@ -76,17 +90,67 @@ class UserCodeDriveType(DriveType):
                     f"Changing drive type of {drive.uuid} to NoActionDriveType",
                 )
                 drive.drive_type = NoActionDriveType
+                daemon_controller.inform_drive_changed(drive)
+
+    @staticmethod
+    def _has_file(drive: 'Drive', filename: str) -> bool:
+        """Check if a drive contains a file, using its known files if it has them."""
+        if drive.files is not None:
+            return filename in drive.files
+        return drive.mount_path.joinpath(filename).exists()
+
+    @classmethod
+    def adopt_action(
+            cls,
+            drive: 'Drive',
+            daemon_controller: 'Controller',
+            adoption: 'Adoption',
+    ) -> bool:
+        """
+        Take over usercode that was started by a previous instance of pepperd.
+
+        :returns: whether the usercode was adopted.
+        """
+        with daemon_controller.usercode_lock:
+            if daemon_controller.usercode_driver is not None:
+                return False
+
+            for driver in get_drivers().values():
+                if driver.__name__ == adoption.usercode.driver:
+                    usercode_driver = driver(drive, daemon_controller)
+                    if usercode_driver.adopt(adoption):
+                        daemon_controller.usercode_driver = usercode_driver
+                        return True
+        return False
 
     @classmethod
     def unmount_action(cls, drive: 'Drive', daemon_controller: 'Controller') -> None:
         """Perform the unmount/remove action."""
-        with daemon_controller.data_lock:
+        with daemon_controller.usercode_lock:
             if daemon_controller.usercode_driver is not None:
-                if drive == daemon_controller.usercode_driver.drive:
+                usercode_driver = daemon_controller.usercode_driver
+                if drive == usercode_driver.drive:
                     LOGGER.info("Stopping usercode process.")
-                    daemon_controller.usercode_driver.stop_execution()
-                    daemon_controller.usercode_driver = None
-                    daemon_controller.daemon_status = DaemonStatus.READY
+                    stopped = usercode_driver.stop_execution()
+                    timeout = daemon_controller.stop_timeout + \
+                        daemon_controller.kill_timeout + STOP_MARGIN
+                    try:
+                        # Wait, so that no other usercode starts before it stops.
+                        stopped.result(timeout=timeout)
+                    except TimeoutError:
+                        LOGGER.warning("Timed out waiting for usercode to stop.")
+
+                    if usercode_driver.running:
+                        # Keep the driver, so that no other usercode starts
+                        # until this code exits.
+                        LOGGER.warning(
+                            "Usercode did not stop after being killed. "
+                            "No usercode will be started until it exits.",
+                        )
+                        usercode_driver.detached = True
+                    else:
+                        daemon_controller.usercode_driver = None
+                        daemon_controller.daemon_status = DaemonStatus.READY
                 else:
                     LOGGER.info(
                         "No action taken as usercode process is"
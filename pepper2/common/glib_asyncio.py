@@ -0,0 +1,277 @@
+"""
+GLib and asyncio integration.
+
+Asynchronous GLib operations complete by calling a callback on the main
+context that was the thread default when they were started. We run a
+GLib main loop on its own context in a background thread, start
+operations on that thread and then hand their results back to asyncio.
+
+The daemon instead runs asyncio and GLib on the same thread, with an
+event loop that dispatches the default main context whilst it waits.
+"""
+
+import asyncio
+import selectors
+from math import ceil
+from threading import Lock, Thread
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from gi.repository import Gio, GLib
+
+if TYPE_CHECKING:
+    from _typeshed import FileDescriptorLike
+
+T = TypeVar("T")
+
+READ_CONDITIONS = GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR
+WRITE_CONDITIONS = GLib.IOCondition.OUT | GLib.IOCondition.HUP | GLib.IOCondition.ERR
+
+# Called by GLib with the source object, the result and the user data.
+AsyncReadyCallback = Callable[[object, Gio.AsyncResult, None], None]
+
+
+class GLibThread(Thread):
+    """A thread that runs a GLib main loop on its own main context."""
+
+    def __init__(self) -> None:
+        super().__init__(name="pepper2-glib", daemon=True)
+        self.context = GLib.MainContext.new()
+        self._loop = GLib.MainLoop.new(self.context, False)
+
+    def run(self) -> None:
+        """Run the main loop until it is stopped."""
+        self.context.push_thread_default()
+        try:
+            self._loop.run()
+        finally:
+            self.context.pop_thread_default()
+
+    def invoke(self, function: Callable[[], None]) -> None:
+        """Call a function on the GLib thread."""
+        def callback() -> bool:
+            function()
+            return False  # Do not repeat.
+
+        self.context.invoke_full(GLib.PRIORITY_DEFAULT, callback)
+
+    def stop(self) -> None:
+        """Stop the main loop."""
+        self._loop.quit()
+
+
+_glib_thread: Optional[GLibThread] = None
+_glib_thread_lock = Lock()
+
+
+def get_glib_thread() -> GLibThread:
+    """Get the GLib thread for this process, starting it if needed."""
+    global _glib_thread
+    with _glib_thread_lock:
+        if _glib_thread is None or not _glib_thread.is_alive():
+            _glib_thread = GLibThread()
+            _glib_thread.start()
+        return _glib_thread
+
+
+def _set_result(future: 'asyncio.Future[T]', result: T) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: 'asyncio.Future[T]', exception: BaseException) -> None:
+    if not future.done():
+        future.set_exception(exception)
+
+
+async def run_in_glib_thread(function: Callable[[], T]) -> T:
+    """Call a function on the GLib thread and wait for its result."""
+    loop = asyncio.get_event_loop()
+    future: 'asyncio.Future[T]' = loop.create_future()
+
+    def call() -> None:
+        try:
+            value = function()
+        except Exception as e:
+            loop.call_soon_threadsafe(_set_exception, future, e)
+        else:
+            loop.call_soon_threadsafe(_set_result, future, value)
+
+    get_glib_thread().invoke(call)
+    return await future
+
+
+async def run_glib_async(
+        start: Callable[[Gio.Cancellable, AsyncReadyCallback], None],
+        finish: Callable[[object, Gio.AsyncResult], T],
+) -> T:
+    """
+    Run an asynchronous GLib operation without blocking the event loop.
+
+    ``start`` is called on the GLib thread with a cancellable and a
+    callback to pass to the operation. ``finish`` is called on the GLib
+    thread with the source object and result, and its return value is
+    returned. If the awaiting task is cancelled, the operation is too.
+    """
+    loop = asyncio.get_event_loop()
+    future: 'asyncio.Future[T]' = loop.create_future()
+    cancellable = Gio.Cancellable()
+
+    def callback(source: object, result: Gio.AsyncResult, _: None) -> None:
+        try:
+            value = finish(source, result)
+        except Exception as e:
+            loop.call_soon_threadsafe(_set_exception, future, e)
+        else:
+            loop.call_soon_threadsafe(_set_result, future, value)
+
+    def cancel(future: 'asyncio.Future[T]') -> None:
+        if future.cancelled():
+            cancellable.cancel()
+
+    future.add_done_callback(cancel)
+    get_glib_thread().invoke(lambda: start(cancellable, callback))
+    return await future
+
+
+def _fileobj_to_fd(fileobj: 'FileDescriptorLike') -> int:
+    if isinstance(fileobj, int):
+        return fileobj
+    return fileobj.fileno()
+
+
+class GLibSelector(selectors.BaseSelector):
+    """
+    A selector that waits by iterating the default GLib main context.
+
+    Each file descriptor is watched by a GLib source, so whilst asyncio
+    waits for its file descriptors or timers, the main context dispatches
+    its other sources, such as D-Bus messages and GLib timeouts.
+    """
+
+    def __init__(self) -> None:
+        self._context = GLib.MainContext.default()
+        self._keys: Dict['FileDescriptorLike', selectors.SelectorKey] = {}
+        self._source_ids: Dict[int, int] = {}
+        self._ready: Dict[int, int] = {}
+
+    def register(
+            self,
+            fileobj: 'FileDescriptorLike',
+            events: int,
+            data: object = None,
+    ) -> selectors.SelectorKey:
+        """Start watching a file descriptor."""
+        fd = _fileobj_to_fd(fileobj)
+        if fd in self._keys:
+            raise KeyError(f"{fileobj!r} is already registered")
+
+        key = selectors.SelectorKey(fileobj, fd, events, data)
+        condition = GLib.IOCondition(0)
+        if events & selectors.EVENT_READ:
+            condition |= READ_CONDITIONS
+        if events & selectors.EVENT_WRITE:
+            condition |= WRITE_CONDITIONS
+
+        self._keys[fd] = key
+        self._source_ids[fd] = GLib.unix_fd_add_full(
+            GLib.PRIORITY_DEFAULT,
+            fd,
+            condition,
+            self._fd_ready,
+        )
+        return key
+
+    def unregister(self, fileobj: 'FileDescriptorLike') -> selectors.SelectorKey:
+        """Stop watching a file descriptor."""
+        fd = _fileobj_to_fd(fileobj)
+        try:
+            key = self._keys.pop(fd)
+        except KeyError:
+            raise KeyError(f"{fileobj!r} is not registered") from None
+
+        GLib.source_remove(self._source_ids.pop(fd))
+        self._ready.pop(fd, None)
+        return key
+
+    def select(
+            self,
+            timeout: Optional[float] = None,
+    ) -> List[Tuple[selectors.SelectorKey, int]]:
+        """
+        Dispatch the main context, waiting for up to ``timeout`` seconds.
+
+        :returns: the file descriptors that are ready, and their events.
+        """
+        timer_id: Optional[int] = None
+        if timeout is not None and timeout > 0:
+            def timed_out() -> bool:
+                nonlocal timer_id
+                timer_id = None
+                return False  # Do not repeat.
+
+            timer_id = GLib.timeout_add(ceil(timeout * 1000), timed_out)
+
+        try:
+            self._context.iteration(timeout is None or timeout > 0)
+        finally:
+            if timer_id is not None:
+                GLib.source_remove(timer_id)
+
+        ready = []
+        for fd, events in self._ready.items():
+            key = self._keys[fd]
+            if events & key.events:
+                ready.append((key, events & key.events))
+        self._ready.clear()
+        return ready
+
+    def get_key(self, fileobj: 'FileDescriptorLike') -> selectors.SelectorKey:
+        """Get the key of a registered file descriptor."""
+        try:
+            return self._keys[_fileobj_to_fd(fileobj)]
+        except KeyError:
+            raise KeyError(f"{fileobj!r} is not registered") from None
+
+    def get_map(self) -> Mapping['FileDescriptorLike', selectors.SelectorKey]:
+        """Get the registered file descriptors, by file descriptor."""
+        return MappingProxyType(self._keys)
+
+    def close(self) -> None:
+        """Stop watching all file descriptors."""
+        for source_id in self._source_ids.values():
+            GLib.source_remove(source_id)
+        self._source_ids.clear()
+        self._keys.clear()
+        self._ready.clear()
+
+    def _fd_ready(self, fd: int, condition: GLib.IOCondition) -> bool:
+        events = 0
+        if condition & READ_CONDITIONS:
+            events |= selectors.EVENT_READ
+        if condition & WRITE_CONDITIONS:
+            events |= selectors.EVENT_WRITE
+        self._ready[fd] = self._ready.get(fd, 0) | events
+        return True  # Keep watching.
+
+
+class GLibEventLoop(asyncio.SelectorEventLoop):
+    """
+    An asyncio event loop that dispatches the default GLib main context.
+
+    Callbacks from GLib, such as D-Bus method calls and signals, run on
+    the same thread as coroutines, so neither needs to lock against the
+    other, and neither runs whilst the other is running.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(GLibSelector())
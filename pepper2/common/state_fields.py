@@ -0,0 +1,17 @@
+"""Fields of the daemon state, as they are sent to clients."""
+
+from typing import Dict, List, Mapping, Union
+
+from pepper2.daemon.dbus.drive import DriveStruct
+
+StateFields = Dict[str, Union[str, int, List[DriveStruct]]]
+
+# The DBus signature of each field of the state.
+STATE_FIELD_SIGNATURES: Mapping[str, str] = {
+    "daemon_status": "s",
+    "version": "s",
+    "usercode_drive": "s",
+    "usercode_driver_name": "s",
+    "drives": "a(ssi)",
+    "last_exit_code": "i",
+}
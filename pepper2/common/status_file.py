@@ -0,0 +1,284 @@
+"""
+Status File.
+
+The daemon publishes its state to a small file with a fixed layout, so
+that local processes can read the state at a high rate without using
+D-Bus. The file is memory mapped by both the daemon and its readers.
+
+Updates are made in place and guarded by a sequence lock: the sequence
+number is odd whilst an update is in progress, and a reader retries if
+the sequence number changed whilst it was copying the file. A CRC of
+the payload catches any torn read that the sequence number misses.
+"""
+
+import logging
+import mmap
+import os
+from pathlib import Path
+from struct import Struct
+from time import monotonic, sleep
+from typing import List, Optional, Tuple, cast
+from zlib import crc32
+
+from pepper2.common.state_fields import StateFields
+from pepper2.daemon.dbus.drive import DriveStruct
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_STATUS_FILE_PATH = Path("/run/pepper2/status")
+
+MAGIC = b"PPR2"
+LAYOUT_VERSION = 1
+MAX_DRIVES = 32
+
+# magic, layout version, max drives, writer pid, sequence, payload crc
+HEADER = Struct("<4sHHIQI8x")
+SEQUENCE = Struct("<Q")
+SEQUENCE_OFFSET = 12
+CRC = Struct("<I")
+CRC_OFFSET = 20
+
+# generation, daemon status, version, usercode drive, usercode driver name,
+# has exit code, exit code, number of drives
+STATE = Struct("<Q32s32s64s64s?3xiI")
+
+# uuid, mount path, drive type index
+DRIVE = Struct("<64s256si")
+
+PAYLOAD_OFFSET = HEADER.size
+PAYLOAD_SIZE = STATE.size + DRIVE.size * MAX_DRIVES
+FILE_SIZE = PAYLOAD_OFFSET + PAYLOAD_SIZE
+
+# How long to keep retrying reads that are interrupted by writes.
+READ_TIMEOUT = 0.1
+
+
+class StatusFileError(Exception):
+    """The status file could not be read."""
+
+
+def _encode(value: str, size: int) -> bytes:
+    """Encode a string into a fixed size field."""
+    data = value.encode("utf-8")
+    if len(data) > size:
+        LOGGER.warning(f"Truncating value in status file: {value}")
+    return data[:size]
+
+
+def _decode(data: bytes) -> str:
+    """Decode a string from a fixed size field."""
+    return data.rstrip(b"\0").decode("utf-8", errors="replace")
+
+
+def encode_payload(generation: int, fields: StateFields) -> bytes:
+    """Encode the state into the payload of the status file."""
+    drives = cast(List[DriveStruct], fields.get("drives", []))
+    if len(drives) > MAX_DRIVES:
+        LOGGER.warning(
+            f"Only {MAX_DRIVES} of {len(drives)} drives fit in the status file.",
+        )
+        drives = drives[:MAX_DRIVES]
+
+    exit_code = fields.get("last_exit_code")
+
+    payload = bytearray(PAYLOAD_SIZE)
+    STATE.pack_into(
+        payload,
+        0,
+        generation,
+        _encode(str(fields.get("daemon_status", "")), 32),
+        _encode(str(fields.get("version", "")), 32),
+        _encode(str(fields.get("usercode_drive", "")), 64),
+        _encode(str(fields.get("usercode_driver_name", "")), 64),
+        isinstance(exit_code, int),
+        exit_code if isinstance(exit_code, int) else 0,
+        len(drives),
+    )
+    for i, (uuid, mount_path_str, drive_type_index) in enumerate(drives):
+        DRIVE.pack_into(
+            payload,
+            STATE.size + i * DRIVE.size,
+            _encode(uuid, 64),
+            _encode(mount_path_str, 256),
+            drive_type_index,
+        )
+    return bytes(payload)
+
+
+def decode_payload(payload: bytes) -> Tuple[int, StateFields]:
+    """Decode the payload of the status file into the state."""
+    (
+        generation,
+        daemon_status,
+        version,
+        usercode_drive,
+        usercode_driver_name,
+        has_exit_code,
+        exit_code,
+        drive_count,
+    ) = STATE.unpack_from(payload, 0)
+
+    drives: List[DriveStruct] = []
+    for i in range(min(drive_count, MAX_DRIVES)):
+        uuid, mount_path, drive_type_index = DRIVE.unpack_from(
+            payload,
+            STATE.size + i * DRIVE.size,
+        )
+        drives.append((_decode(uuid), _decode(mount_path), drive_type_index))
+
+    fields: StateFields = {
+        "daemon_status": _decode(daemon_status),
+        "version": _decode(version),
+        "usercode_drive": _decode(usercode_drive),
+        "usercode_driver_name": _decode(usercode_driver_name),
+        "drives": drives,
+    }
+    if has_exit_code:
+        fields["last_exit_code"] = exit_code
+
+    return generation, fields
+
+
+class StatusFileWriter:
+    """Publish the state of the daemon to the status file."""
+
+    def __init__(self, path: Path = DEFAULT_STATUS_FILE_PATH) -> None:
+        self.path = path
+        self._sequence = 0
+
+        # Create the file in full and then move it into place, so that
+        # readers never see a partially created file.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.tmp")
+        payload = bytes(PAYLOAD_SIZE)
+        with temp_path.open("wb") as f:
+            f.write(self._header(crc32(payload)) + payload)
+        temp_path.chmod(0o644)
+        os.replace(str(temp_path), str(path))
+
+        self._file = path.open("r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), FILE_SIZE)
+
+    def _header(self, payload_crc: int) -> bytes:
+        return HEADER.pack(
+            MAGIC,
+            LAYOUT_VERSION,
+            MAX_DRIVES,
+            os.getpid(),
+            self._sequence,
+            payload_crc,
+        )
+
+    def write(self, generation: int, fields: StateFields) -> None:
+        """Write the state to the status file."""
+        payload = encode_payload(generation, fields)
+
+        # An odd sequence number marks the file as being written.
+        self._sequence += 1
+        SEQUENCE.pack_into(self._mmap, SEQUENCE_OFFSET, self._sequence)
+        self._mmap[PAYLOAD_OFFSET:FILE_SIZE] = payload
+        CRC.pack_into(self._mmap, CRC_OFFSET, crc32(payload))
+        self._sequence += 1
+        SEQUENCE.pack_into(self._mmap, SEQUENCE_OFFSET, self._sequence)
+
+    def close(self) -> None:
+        """Remove the status file."""
+        self._mmap.close()
+        self._file.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class StatusFileReader:
+    """
+    Read the state of the daemon from the status file.
+
+    The file is mapped into memory once, and mapped again if the daemon
+    replaces it. Reads do not require any communication with the daemon.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STATUS_FILE_PATH) -> None:
+        self.path = path
+        self._inode: Optional[int] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def _map(self) -> mmap.mmap:
+        """Get the mapping of the current status file."""
+        try:
+            inode = os.stat(str(self.path)).st_ino
+        except OSError as e:
+            raise StatusFileError("The status file does not exist.") from e
+
+        if self._mmap is None or inode != self._inode:
+            self.close()
+            try:
+                with self.path.open("rb") as f:
+                    self._mmap = mmap.mmap(
+                        f.fileno(),
+                        FILE_SIZE,
+                        access=mmap.ACCESS_READ,
+                    )
+            except (OSError, ValueError) as e:
+                raise StatusFileError("Unable to map the status file.") from e
+            self._inode = inode
+
+        return self._mmap
+
+    def read(self) -> Tuple[int, StateFields]:
+        """
+        Read the state from the status file.
+
+        :returns: the generation and fields of the state.
+        """
+        mapping = self._map()
+        deadline = monotonic() + READ_TIMEOUT
+
+        while True:
+            sequence, = SEQUENCE.unpack_from(mapping, SEQUENCE_OFFSET)
+            data = mapping[0:FILE_SIZE]
+            consistent = all([
+                sequence % 2 == 0,  # A write is not in progress.
+                SEQUENCE.unpack_from(mapping, SEQUENCE_OFFSET)[0] == sequence,
+            ])
+
+            if consistent:
+                magic, layout_version, _, pid, _, payload_crc = HEADER.unpack_from(
+                    data,
+                )
+                if magic != MAGIC or layout_version != LAYOUT_VERSION:
+                    raise StatusFileError("The status file has an unknown layout.")
+
+                payload = data[PAYLOAD_OFFSET:]
+                if crc32(payload) == payload_crc:
+                    if not _process_exists(pid):
+                        raise StatusFileError("The daemon is no longer running.")
+                    return decode_payload(payload)
+
+            if monotonic() > deadline:
+                raise StatusFileError(
+                    "Unable to get a consistent read of the status file.",
+                )
+
+            # Let the writer finish.
+            sleep(0)
+
+    def close(self) -> None:
+        """Unmap the status file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._inode = None
+
+
+def _process_exists(pid: int) -> bool:
+    """Check if a process exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user.
+        return True
+    return True
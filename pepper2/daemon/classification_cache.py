@@ -0,0 +1,91 @@
+"""
+Classification Cache.
+
+The same drives are inserted over and over, so the drive type of recent
+drives is kept, and reused whilst the contents of the drive have the
+same fingerprint.
+"""
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, NamedTuple, Optional, Tuple, Type
+
+from pepper2.common.drive_types import DriveType
+from pepper2.daemon.fingerprint import DriveFingerprint
+
+LOGGER = logging.getLogger(__name__)
+
+# The number of drives to remember.
+DEFAULT_CACHE_SIZE = 32
+
+# (uuid, fingerprint contents)
+CacheKey = Tuple[str, Hashable]
+
+
+class ClassificationCacheStats(NamedTuple):
+    """Counters for a classification cache."""
+
+    size: int
+    hits: int
+    misses: int
+
+
+class ClassificationCache:
+    """
+    A bounded cache of drive types, keyed by drive UUID and fingerprint.
+
+    Only the contents of the fingerprint are compared, so a drive that
+    is inserted again as a different device is still found.
+
+    The least recently used drive is forgotten when the cache is full.
+    Drives are probed on worker threads, so the cache is thread-safe.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._lock = Lock()
+        self._entries: 'OrderedDict[CacheKey, Type[DriveType]]' = OrderedDict()
+
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self) -> ClassificationCacheStats:
+        """Get the counters for the cache."""
+        with self._lock:
+            return ClassificationCacheStats(
+                size=len(self._entries),
+                hits=self._hits,
+                misses=self._misses,
+            )
+
+    def get(self, uuid: str, fingerprint: DriveFingerprint) -> Optional[Type[DriveType]]:
+        """
+        Get the drive type of a drive.
+
+        :returns: the drive type, or None if the drive may have changed.
+        """
+        key = (uuid, fingerprint.contents)
+        with self._lock:
+            drive_type = self._entries.get(key)
+            if drive_type is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+        return drive_type
+
+    def put(
+            self,
+            uuid: str,
+            fingerprint: DriveFingerprint,
+            drive_type: Type[DriveType],
+    ) -> None:
+        """Remember the drive type of a drive, replacing any for the same drive."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == uuid]:
+                del self._entries[key]
+            self._entries[(uuid, fingerprint.contents)] = drive_type
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
@@ -1,8 +1,9 @@
 """Pepperd App."""
+import asyncio
 import logging
-from signal import SIGHUP, SIGINT, SIGTERM, Signals, signal
-from time import sleep
-from types import FrameType
+import os
+from signal import SIGHUP, SIGINT, SIGTERM, Signals
+from typing import Optional
 
 import click
 from gi.repository import GLib
@@ -11,20 +12,55 @@ from systemd.daemon import notify
 
 from pepper2 import __version__
 from pepper2.common.daemon_status import DaemonStatus
+from pepper2.common.glib_asyncio import GLibEventLoop
+from pepper2.common.status_file import StatusFileWriter
 from pepper2.daemon.dbus.controller import Controller
+from pepper2.daemon.drive_worker import MAX_PROBE_WORKERS
+from pepper2.daemon.fd_store import remove_fd, take_fds
+from pepper2.daemon.snapshot import (
+    USERCODE_OUTPUT_FD_NAME,
+    Adoption,
+    Snapshot,
+    SnapshotFile,
+    is_same_process,
+)
+from pepper2.daemon.startup import StartupProgress
+from pepper2.daemon.usercode_driver import STOP_TIMEOUT
 
 from .udisks_manager import UDisksManager
 
 LOGGER = logging.getLogger(__name__)
 
-loop = GLib.MainLoop()
-# We must use the system bus, as that is where udisks is
-bus = SystemBus()
-
 
 @click.command("pepperd")
 @click.option('-v', '--verbose', is_flag=True)
-def main(*, verbose: bool) -> None:
+@click.option(
+    '--probe-concurrency',
+    type=click.IntRange(min=1),
+    default=MAX_PROBE_WORKERS,
+    show_default=True,
+    help="The number of drives to probe at once.",
+)
+@click.option(
+    '--ready-after-scan',
+    is_flag=True,
+    help="Only notify systemd that pepperd is ready once the drives "
+         "present at startup have been registered.",
+)
+@click.option(
+    '--stop-timeout',
+    type=click.FloatRange(min=0),
+    default=STOP_TIMEOUT,
+    show_default=True,
+    help="How long usercode is given to exit before it is killed, in seconds.",
+)
+def main(
+        *,
+        verbose: bool,
+        probe_concurrency: int,
+        ready_after_scan: bool,
+        stop_timeout: float,
+) -> None:
     """Pepper2 Daemon."""
     if verbose:
         logging.basicConfig(
@@ -37,23 +73,67 @@ def main(*, verbose: bool) -> None:
             datefmt="%Y-%m-%d %H:%M:%S",
         )
 
-    pepperd = PepperDaemon()
+    pepperd = PepperDaemon(
+        probe_concurrency=probe_concurrency,
+        ready_after_scan=ready_after_scan,
+        stop_timeout=stop_timeout,
+    )
 
     try:
-        loop.run()
+        pepperd.loop.run_forever()
     except KeyboardInterrupt:
-        pepperd.stop()
+        pepperd.loop.run_until_complete(pepperd.stop())
 
 
 class PepperDaemon:
-    """The pepper2 daemon."""
+    """
+    The pepper2 daemon.
+
+    By default, systemd is notified that the daemon is ready as soon as
+    it is listening to UDisks, and drives present at startup are
+    registered afterwards. The daemon status stays at STARTING until
+    they have been.
+
+    When systemd restarts the daemon, or the daemon crashes, any running
+    usercode is left running and adopted by the next instance, using the
+    snapshot in /run. This needs ``KillMode=process`` in the unit, and
+    ``FileDescriptorStoreMax`` so that the output of the usercode is kept.
 
-    def __init__(self) -> None:
+    The daemon runs on an asyncio event loop that also dispatches GLib,
+    so D-Bus calls, UDisks signals, Unix signals, timers and the output
+    of the usercode are all handled on the main thread.
+    """
+
+    def __init__(
+            self,
+            *,
+            probe_concurrency: int = MAX_PROBE_WORKERS,
+            ready_after_scan: bool = False,
+            stop_timeout: float = STOP_TIMEOUT,
+    ) -> None:
         LOGGER.info(f"Starting v{__version__}.")
+        self.startup = StartupProgress()
+        self._ready_after_scan = ready_after_scan
+        self._stopping = False
+
+        # Take these before any usercode can inherit them.
+        fds = take_fds()
+
+        self.startup.phase("Connecting to D-Bus")
+        self.loop = GLibEventLoop()
+        asyncio.set_event_loop(self.loop)
+        # We must use the system bus, as that is where udisks is
+        bus = SystemBus()
+        self.bus = bus
 
-        self.controller = Controller(loop, bus)
-        self.udisks_manager = UDisksManager(bus, self.controller)
+        self.controller = Controller(self.loop, bus, stop_timeout=stop_timeout)
+        self.udisks_manager = UDisksManager(
+            bus,
+            self.controller,
+            probe_concurrency=probe_concurrency,
+        )
 
+        self.startup.phase("Publishing on D-Bus")
         try:
             # Publish our controller on the bus.
             self.controller_object = bus.publish("uk.org.j5.pepper2", self.controller)
@@ -65,43 +145,134 @@ class PepperDaemon:
             else:
                 raise
 
-        self.disk_signal_handler = bus.get(".UDisks2").InterfacesAdded.connect(
+        # Publish our state for readers that do not want to use the bus.
+        try:
+            self.controller.set_status_file(StatusFileWriter())
+        except OSError as e:
+            LOGGER.warning(f"Unable to create status file: {e}")
+
+        self.startup.phase("Subscribing to UDisks")
+        udisks = bus.get(".UDisks2")
+        self.disk_signal_handler = udisks.InterfacesAdded.connect(
             self.udisks_manager.disk_signal,
         )
+        self.disk_removed_signal_handler = udisks.InterfacesRemoved.connect(
+            self.udisks_manager.disk_removed_signal,
+        )
+        self.properties_signal_handler = bus.subscribe(
+            sender="org.freedesktop.UDisks2",
+            iface="org.freedesktop.DBus.Properties",
+            signal="PropertiesChanged",
+            signal_fired=self.udisks_manager.properties_signal,
+        )
 
         # Shutdown gracefully
-        signal(SIGHUP, self._signal_stop)
-        signal(SIGINT, self._signal_stop)
-        signal(SIGTERM, self._signal_stop)
+        for stop_signal in (SIGHUP, SIGINT, SIGTERM):
+            self.loop.add_signal_handler(stop_signal, self._signal_stop, stop_signal)
+
+        if not self._ready_after_scan:
+            # Drives that are inserted from now on will not be missed.
+            notify("READY=1")
 
-        self.udisks_manager.detect_initial_drives()
+        self.startup.phase("Detecting drives")
+        self.snapshot_file = SnapshotFile()
+        snapshot = self.snapshot_file.read()
+        output_fd = fds.pop(USERCODE_OUTPUT_FD_NAME, None)
+        for fd in fds.values():
+            os.close(fd)
 
+        self.udisks_manager.detect_initial_drives(
+            self._initial_drives_detected,
+            snapshot=snapshot,
+            adoption=self._get_adoption(snapshot, output_fd),
+        )
+
+    @staticmethod
+    def _get_adoption(
+            snapshot: Optional[Snapshot],
+            output_fd: Optional[int],
+    ) -> Optional[Adoption]:
+        """Find usercode from before a restart that is still running."""
+        usercode = None if snapshot is None else snapshot.usercode
+        if usercode is not None and is_same_process(usercode.pid, usercode.start_time):
+            LOGGER.info(f"Usercode is still running with pid {usercode.pid}.")
+            return Adoption(usercode, output_fd)
+
+        if output_fd is not None:
+            os.close(output_fd)
+            remove_fd(USERCODE_OUTPUT_FD_NAME)
+        return None
+
+    def _initial_drives_detected(self) -> None:
+        """
+        Finish starting once the initial drives are registered.
+
+        Called on the action thread, after the start actions of the drives.
+        """
         if self.controller.daemon_status is DaemonStatus.STARTING:
             # Only change the status if a usercode hasn't started.
             self.controller.daemon_status = DaemonStatus.READY
 
-        notify("READY=1")
-        LOGGER.info(f"Ready.")
+        # Only save the state once the previous state has been restored.
+        self.controller.set_snapshot_file(self.snapshot_file)
+
+        if self._ready_after_scan:
+            notify("READY=1")
+        self.startup.finish("Ready")
 
-    def stop(self) -> None:
+    async def stop(self) -> None:
         """Stop the daemon."""
+        if self._stopping:
+            return
+        self._stopping = True
+
         notify("STOPPING=1")
         LOGGER.info("Stopping.")
+        try:
+            restarting = self._is_restarting()
+
+            # Disconnect from D-Bus
+            self.disk_signal_handler.disconnect()
+            self.disk_removed_signal_handler.disconnect()
+            self.properties_signal_handler.unsubscribe()
+            self.controller_object.unpublish()
 
-        # Disconnect from D-Bus
-        self.disk_signal_handler.disconnect()
-        self.controller_object.unpublish
-        sleep(0.3)  # Wait, just in case usercode has only just started.
+            # Wait for any drive action, such as starting usercode, to finish.
+            await self.udisks_manager.stop()
 
-        if self.controller.usercode_driver is not None:
-            self.controller.usercode_driver.stop_execution()
+            if restarting:
+                # Keep the snapshot, so that the usercode is adopted.
+                LOGGER.info("Leaving any usercode running whilst restarting.")
+            else:
+                self.controller.set_snapshot_file(None)
+                driver = self.controller.usercode_driver
+                if driver is not None:
+                    await asyncio.wrap_future(driver.stop_execution())
+                self.snapshot_file.remove()
 
-        loop.quit()
+            if self.controller.status_file is not None:
+                self.controller.status_file.close()
+                self.controller.set_status_file(None)
+        finally:
+            self.loop.stop()
         LOGGER.info("Stopped.")
 
-    def _signal_stop(self, signal: Signals, __: FrameType) -> None:
+    def _is_restarting(self) -> bool:
+        """Check whether systemd is restarting the daemon."""
+        try:
+            systemd = self.bus.get(".systemd1")
+            unit = self.bus.get(".systemd1", systemd.GetUnitByPID(os.getpid()))
+            _, job_path = unit.Job
+            if job_path == "/":
+                return False
+            return bool(self.bus.get(".systemd1", job_path).JobType == "restart")
+        except GLib.Error:
+            # We are not running as a systemd service.
+            return False
+
+    def _signal_stop(self, signal: Signals) -> None:
         LOGGER.debug(f"Received {Signals(signal).name}")
-        self.stop()
+        asyncio.ensure_future(self.stop(), loop=self.loop)
 
 
 if __name__ == "__main__":
@@ -1,18 +1,30 @@
 """Pepperd Controller Service."""
+import asyncio
 import logging
+import time
+from pathlib import Path
 from threading import RLock
-from typing import List, Mapping, Optional
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
 
 from gi.repository import GLib
-from pkg_resources import resource_string
 from pydbus.bus import Bus
 from pydbus.generic import signal
 
 from pepper2 import __version__
 from pepper2.common.daemon_status import DaemonStatus
-from pepper2.daemon.dbus.drive import DriveGroup
+from pepper2.common.state_fields import STATE_FIELD_SIGNATURES, StateFields
+from pepper2.common.status_file import StatusFileWriter
+from pepper2.daemon.dbus.drive import Drive, DriveStruct
+from pepper2.daemon.dbus.introspection import IntrospectionXML
 from pepper2.daemon.publishable_group import PublishableGroup
-from pepper2.daemon.usercode_driver import CodeStatus, UserCodeDriver
+from pepper2.daemon.snapshot import DriveSnapshot, Snapshot, SnapshotFile
+from pepper2.daemon.usercode_driver import (
+    KILL_TIMEOUT,
+    STOP_TIMEOUT,
+    CodeStatus,
+    UserCodeDriver,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -24,41 +36,142 @@ CODE_DAEMON_STATUS_MAPPING: Mapping[CodeStatus, DaemonStatus] = {
     CodeStatus.CRASHED: DaemonStatus.CODE_CRASHED,
 }
 
+DriveGroup = PublishableGroup[Drive]
+
+# (generation, state fields)
+StateStruct = Tuple[int, Dict[str, GLib.Variant]]
+
+
+class UsercodeExitStats(NamedTuple):
+    """
+    Counters for the handling of usercode exits.
+
+    The latency is from the exit being observed on the event loop, to
+    the status of the usercode being updated, in milliseconds.
+    """
+
+    exits: int
+    last_latency_ms: float
+    max_latency_ms: float
+    total_latency_ms: float
+
+
+class ControllerState(NamedTuple):
+    """
+    The state of the controller.
+
+    The state is never modified, it is replaced whenever it changes, so
+    it can be read without a lock.
+    """
+
+    # The generation is incremented whenever the state changes. It starts
+    # from the time that the controller was created, so that generations
+    # from before a restart are older than any after it.
+    generation: int
+    field_generations: Mapping[str, int]
+    daemon_status: DaemonStatus
+    usercode_driver: Optional[UserCodeDriver]
+    last_exit_code: Optional[int]
+    drives: Mapping[str, Drive]
+
 
 class Controller:
-    """Pepper2 DBUS controller."""
+    """
+    Pepper2 DBUS controller.
+
+    Queries read the current state, and never wait for a lock. Changes
+    to the state are serialised by ``state_lock``, which is only held
+    whilst the state is replaced. Starting, stopping and changing the
+    usercode is serialised by ``usercode_lock``, which may be held for
+    a long time.
+    """
 
-    dbus = resource_string(__name__, "controller.xml").decode('utf-8')
+    dbus = IntrospectionXML(Path(__file__).with_name("controller.xml"))
 
     PropertiesChanged = signal()
+    drive_added = signal()
+    drive_removed = signal()
 
-    def __init__(self, loop: GLib.MainLoop, bus: Bus):
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            bus: Bus,
+            *,
+            stop_timeout: float = STOP_TIMEOUT,
+            kill_timeout: float = KILL_TIMEOUT,
+    ):
         self.loop = loop
         self.bus = bus
-        self.data_lock = RLock()
 
-        with self.data_lock:
-            self._daemon_status: DaemonStatus = DaemonStatus.STARTING
-            self.drive_group: DriveGroup = PublishableGroup(bus)
-            self.usercode_driver: Optional[UserCodeDriver] = None
+        # How long usercode is given to exit before it is killed, and how
+        # long to wait for it to exit after it is killed, in seconds.
+        self.stop_timeout = stop_timeout
+        self.kill_timeout = kill_timeout
+        self.status_file: Optional[StatusFileWriter] = None
+        self.snapshot_file: Optional[SnapshotFile] = None
+        self.state_lock = RLock()
+        self.usercode_lock = RLock()
+        self.usercode_exit_stats = UsercodeExitStats(0, 0.0, 0.0, 0.0)
+
+        epoch = time.time_ns()
+        self._state = ControllerState(
+            generation=epoch,
+            field_generations=MappingProxyType({
+                field: epoch for field in STATE_FIELD_SIGNATURES
+            }),
+            daemon_status=DaemonStatus.STARTING,
+            usercode_driver=None,
+            last_exit_code=None,
+            drives=MappingProxyType({}),
+        )
+        self.drive_group: DriveGroup = PublishableGroup(
+            bus,
+            on_insert=self._drive_inserted,
+            on_remove=self._drive_removed,
+        )
 
     @property
     def daemon_status(self) -> DaemonStatus:
         """Get the current daemon_status of the daemon."""
-        with self.data_lock:
-            return self._daemon_status
+        return self._state.daemon_status
 
     @daemon_status.setter
     def daemon_status(self, daemon_status: DaemonStatus) -> None:
         """Set the current daemon_status of the daemon."""
-        with self.data_lock:
-            self._daemon_status = daemon_status
+        with self.state_lock:
+            self._set_state(
+                self._state._replace(daemon_status=daemon_status),
+                "daemon_status",
+            )
             self.PropertiesChanged(
                 "uk.org.j5.pepper2.Controller",
                 {"daemon_status": daemon_status},
                 [],
             )
 
+    @property
+    def usercode_driver(self) -> Optional[UserCodeDriver]:
+        """Get the current usercode driver."""
+        return self._state.usercode_driver
+
+    @usercode_driver.setter
+    def usercode_driver(self, usercode_driver: Optional[UserCodeDriver]) -> None:
+        """Set the current usercode driver."""
+        with self.state_lock:
+            self._set_state(
+                self._state._replace(usercode_driver=usercode_driver),
+                "usercode_drive",
+                "usercode_driver_name",
+            )
+            self.PropertiesChanged(
+                "uk.org.j5.pepper2.Controller",
+                self._get_state_fields(
+                    self._state,
+                    ["usercode_drive", "usercode_driver_name"],
+                ),
+                [],
+            )
+
     @property
     def version(self) -> str:
         """Get the version of pepper2."""
@@ -73,10 +186,11 @@ class Controller:
         :returns: the uuid of the executing drive.
         """
         LOGGER.debug(f"Usercode drive uuid request over bus.")
-        if self.usercode_driver is None:
+        driver = self.usercode_driver
+        if driver is None:
             return ""
         else:
-            return self.usercode_driver.drive.uuid
+            return driver.drive.uuid
 
     @property
     def usercode_driver_name(self) -> str:
@@ -86,15 +200,65 @@ class Controller:
         :returns: the name of the driver
         """
         LOGGER.debug(f"Usercode Driver request over bus.")
-        if self.usercode_driver is None:
+        driver = self.usercode_driver
+        if driver is None:
             return ""
         else:
-            return self.usercode_driver.__class__.__name__
+            return driver.__class__.__name__
 
     def get_drive_list(self) -> List[str]:
         """Get a list of drives."""
         LOGGER.debug("Drive list request over bus.")
-        return list(self.drive_group._dict.keys())
+        return list(self._state.drives)
+
+    def get_drives(self) -> List[DriveStruct]:
+        """
+        Get information about all drives.
+
+        This allows clients to fetch every drive in a single call,
+        rather than fetching each drive object individually.
+
+        :returns: a list of (uuid, mount_path_str, drive_type_index).
+        """
+        LOGGER.debug("Drives request over bus.")
+        return [drive.to_struct() for drive in self._state.drives.values()]
+
+    def get_state(self) -> StateStruct:
+        """
+        Get the entire state of the daemon.
+
+        :returns: the current generation and a dictionary of all state fields.
+        """
+        LOGGER.debug("State request over bus.")
+        return self.get_state_changes(0)
+
+    def get_state_changes(self, generation: int) -> StateStruct:
+        """
+        Get the fields of the state that have changed since a generation.
+
+        If the generation is current, no fields are returned. If the
+        generation was read before the daemon was restarted, all fields
+        are returned, as generations start from the time that the daemon
+        started. A generation newer than the current generation can only
+        be from before a restart if the clock has gone back, so all fields
+        are returned for it too.
+
+        :returns: the current generation and a dictionary of changed fields.
+        """
+        LOGGER.debug(f"State changes since {generation} request over bus.")
+        current = self._state
+        if generation > current.generation:
+            generation = 0
+        changed = [
+            field
+            for field, field_generation in current.field_generations.items()
+            if field_generation > generation
+        ]
+        state = {
+            field: GLib.Variant(STATE_FIELD_SIGNATURES[field], value)
+            for field, value in self._get_state_fields(current, changed).items()
+        }
+        return current.generation, state
 
     def kill_usercode(self) -> bool:
         """
@@ -119,6 +283,7 @@ class Controller:
         """
         LOGGER.debug(f"Usercode start request over bus.")
         if self.usercode_driver is None or \
+                self.usercode_driver.detached or \
                 self.usercode_driver.status is CodeStatus.RUNNING:
             return False
         else:
@@ -136,3 +301,125 @@ class Controller:
             raise RuntimeError(
                 "Unknown UsercodeDriver status.",
             ) from e
+
+    def set_status_file(self, status_file: Optional[StatusFileWriter]) -> None:
+        """Publish the state to a status file from now on."""
+        with self.state_lock:
+            self.status_file = status_file
+            self._write_status_file()
+
+    def set_snapshot_file(self, snapshot_file: Optional[SnapshotFile]) -> None:
+        """Save a snapshot of the daemon whenever the state changes."""
+        with self.state_lock:
+            self.snapshot_file = snapshot_file
+            self._write_snapshot()
+
+    def inform_return_code(self, return_code: int) -> None:
+        """Inform daemon_controller of the return code of the usercode."""
+        with self.state_lock:
+            self._set_state(
+                self._state._replace(last_exit_code=return_code),
+                "last_exit_code",
+            )
+
+    def record_usercode_exit(self, latency_ms: float) -> None:
+        """Record how long it took to update the status after usercode exited."""
+        stats = self.usercode_exit_stats
+        self.usercode_exit_stats = UsercodeExitStats(
+            exits=stats.exits + 1,
+            last_latency_ms=latency_ms,
+            max_latency_ms=max(stats.max_latency_ms, latency_ms),
+            total_latency_ms=stats.total_latency_ms + latency_ms,
+        )
+
+    def inform_drive_changed(self, drive: Drive) -> None:
+        """Inform daemon_controller that a registered drive has changed."""
+        self._bump_generation("drives")
+
+    def _drive_inserted(self, uuid: str, drive: Drive) -> None:
+        """Handle a drive being added to the drive group."""
+        self._bump_generation("drives")
+        self.drive_added(drive.to_struct())
+
+    def _drive_removed(self, uuid: str, drive: Drive) -> None:
+        """Handle a drive being removed from the drive group."""
+        self._bump_generation("drives")
+        self.drive_removed(drive.to_struct())
+
+    def _get_state_fields(
+        self,
+        current: ControllerState,
+        fields: Iterable[str],
+    ) -> StateFields:
+        """Get the values of some fields of a state."""
+        state: StateFields = {}
+        driver = current.usercode_driver
+        for field in fields:
+            if field == "daemon_status":
+                state[field] = current.daemon_status.value
+            elif field == "version":
+                state[field] = __version__
+            elif field == "usercode_drive":
+                state[field] = "" if driver is None else driver.drive.uuid
+            elif field == "usercode_driver_name":
+                state[field] = "" if driver is None else driver.__class__.__name__
+            elif field == "drives":
+                state[field] = [
+                    drive.to_struct() for drive in current.drives.values()
+                ]
+            elif field == "last_exit_code" and current.last_exit_code is not None:
+                state[field] = current.last_exit_code
+        return state
+
+    def _bump_generation(self, *fields: str) -> None:
+        """Record that some fields of the state have changed."""
+        with self.state_lock:
+            self._set_state(self._state, *fields)
+
+    def _set_state(self, state: ControllerState, *fields: str) -> None:
+        """
+        Replace the state, recording which fields have changed.
+
+        The caller must hold the state lock.
+        """
+        generation = state.generation + 1
+        field_generations = dict(state.field_generations)
+        for field in fields:
+            field_generations[field] = generation
+
+        self._state = state._replace(
+            generation=generation,
+            field_generations=MappingProxyType(field_generations),
+            drives=self.drive_group.snapshot(),
+        )
+        self._write_status_file()
+        self._write_snapshot()
+
+    def _write_status_file(self) -> None:
+        """Publish the current state to the status file."""
+        if self.status_file is not None:
+            current = self._state
+            self.status_file.write(
+                current.generation,
+                self._get_state_fields(current, STATE_FIELD_SIGNATURES),
+            )
+
+    def _write_snapshot(self) -> None:
+        """Save a snapshot of the daemon, for use after a restart."""
+        if self.snapshot_file is not None:
+            current = self._state
+            driver = current.usercode_driver
+            self.snapshot_file.write(Snapshot(
+                boot_id=self.snapshot_file.boot_id,
+                drives=[
+                    DriveSnapshot(
+                        uuid=drive.uuid,
+                        mount_path=drive.mount_path,
+                        drive_type=drive.drive_type.name,
+                        fingerprint=drive.fingerprint,
+                    )
+                    for drive in current.drives.values()
+                    if drive.fingerprint is not None
+                ],
+                usercode=None if driver is None else driver.snapshot(),
+            ))
@@ -1,20 +1,22 @@
 """Classes to interact with drives."""
 
 from pathlib import Path
-from typing import Any, Type
-
-from pkg_resources import resource_string
+from typing import TYPE_CHECKING, Any, FrozenSet, Optional, Tuple, Type
 
 from pepper2.common.drive_types import DRIVE_TYPES, DriveType
-from pepper2.daemon.publishable_group import PublishableGroup
+from pepper2.daemon.dbus.introspection import IntrospectionXML
+
+if TYPE_CHECKING:
+    from pepper2.daemon.fingerprint import DriveFingerprint
 
-DriveGroup = PublishableGroup['Drive']
+# (uuid, mount_path_str, drive_type_index)
+DriveStruct = Tuple[str, str, int]
 
 
 class Drive:
     """An individual drive."""
 
-    dbus = resource_string(__name__, "drive.xml").decode('utf-8')
+    dbus = IntrospectionXML(Path(__file__).with_name("drive.xml"))
 
     def __init__(
             self,
@@ -22,11 +24,21 @@ class Drive:
             uuid: str,
             mount_path: Path,
             drive_type: Type[DriveType],
+            fingerprint: Optional['DriveFingerprint'] = None,
+            files: Optional[FrozenSet[str]] = None,
     ):
         self._uuid = uuid
         self._mount_path = mount_path
         self._drive_type = drive_type
 
+        # The fingerprint that the drive type was based on, in the daemon.
+        self.fingerprint = fingerprint
+
+        # The entries that drive types check for that were on the drive
+        # when its type was found, in the daemon. Drive actions can use
+        # them rather than reading the drive again.
+        self.files = files
+
     @classmethod
     def from_proxy(cls, proxy_object: Any) -> 'Drive':  # type: ignore
         """
@@ -43,6 +55,28 @@ class Drive:
             drive_type=DRIVE_TYPES[proxy_object.drive_type_index],
         )
 
+    @classmethod
+    def from_struct(cls, struct: DriveStruct) -> 'Drive':
+        """
+        Construct a drive object from a struct sent over DBus.
+
+        The struct is in the form produced by :meth:`Drive.to_struct`.
+        """
+        uuid, mount_path_str, drive_type_index = struct
+        return Drive(
+            uuid=uuid,
+            mount_path=Path(mount_path_str),
+            drive_type=DRIVE_TYPES[drive_type_index],
+        )
+
+    def to_struct(self) -> DriveStruct:
+        """
+        A struct representation of the drive.
+
+        For transmission over DBus.
+        """
+        return (self.uuid, self.mount_path_str, self.drive_type_index)
+
     @property
     def uuid(self) -> str:
         """The UUID of the drive."""
@@ -0,0 +1,22 @@
+"""Introspection data for D-Bus objects."""
+
+from pathlib import Path
+from typing import Optional
+
+
+class IntrospectionXML:
+    """
+    The introspection XML of a D-Bus object, read when it is first needed.
+
+    Clients construct objects that are published by the daemon without
+    ever publishing them, so they do not need to read the XML.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._xml: Optional[str] = None
+
+    def __get__(self, instance: object, owner: type) -> str:
+        if self._xml is None:
+            self._xml = self._path.read_text(encoding="utf-8")
+        return self._xml
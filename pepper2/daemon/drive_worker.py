@@ -0,0 +1,133 @@
+"""
+Drive Worker.
+
+Run blocking work for drives away from the event loop.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# The number of drives that can be probed at once.
+MAX_PROBE_WORKERS = 4
+
+# How long to wait for a drive to be probed, in seconds.
+PROBE_TIMEOUT = 10.0
+
+
+class DriveWorker:
+    """
+    Run blocking work for drives on worker threads.
+
+    Probing a drive reads from it, and new or failing drives can take a
+    long time to respond. Each probe is a task on the event loop, which
+    waits for the probe to run on a bounded pool of threads, so that the
+    event loop can continue to serve D-Bus.
+
+    Drive actions change the state of the controller, so they run in
+    the order that they were submitted on a single thread.
+
+    Apart from the actions themselves, all methods and callbacks run on
+    the event loop.
+    """
+
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            *,
+            max_probes: int = MAX_PROBE_WORKERS,
+            probe_timeout: float = PROBE_TIMEOUT,
+    ) -> None:
+        self._loop = loop
+        self._probe_timeout = probe_timeout
+        self._probe_executor = ThreadPoolExecutor(
+            max_workers=max_probes,
+            thread_name_prefix="pepper2-probe",
+        )
+        self._action_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="pepper2-action",
+        )
+        self._probes: Dict[str, 'asyncio.Future[None]'] = {}
+
+    def probe(
+            self,
+            key: str,
+            function: Callable[[], T],
+            on_result: Callable[[T], None],
+            on_failure: Callable[[str], None],
+    ) -> None:
+        """
+        Probe a drive on a worker thread.
+
+        ``on_result`` is called on the event loop with the result, or
+        ``on_failure`` with a reason if the probe fails or times out. No
+        callback is called if the probe is cancelled.
+
+        :param key: identifies the drive, replacing any probe in progress.
+        """
+        self.cancel(key)
+        task = asyncio.ensure_future(
+            self._probe(function, on_result, on_failure),
+            loop=self._loop,
+        )
+        self._probes[key] = task
+        task.add_done_callback(lambda _: self._probe_finished(key, task))
+
+    def cancel(self, key: str) -> None:
+        """Cancel any probe of a drive that is in progress."""
+        task = self._probes.pop(key, None)
+        if task is not None:
+            # A probe that has already started cannot be stopped, but its
+            # result will be ignored.
+            task.cancel()
+
+    def run_action(self, action: Callable[[], None]) -> None:
+        """Run a drive action on the action thread."""
+        def run() -> None:
+            try:
+                action()
+            except Exception:
+                LOGGER.exception("Drive action failed.")
+
+        self._action_executor.submit(run)
+
+    def shutdown(self) -> None:
+        """Cancel any probes and stop accepting work."""
+        for key in list(self._probes):
+            self.cancel(key)
+        self._probe_executor.shutdown(wait=False)
+        self._action_executor.shutdown(wait=False)
+
+    async def wait_for_actions(self) -> None:
+        """Wait for the actions that have been submitted to finish."""
+        await self._loop.run_in_executor(None, self._action_executor.shutdown)
+
+    async def _probe(
+            self,
+            function: Callable[[], T],
+            on_result: Callable[[T], None],
+            on_failure: Callable[[str], None],
+    ) -> None:
+        try:
+            result = await asyncio.wait_for(
+                self._loop.run_in_executor(self._probe_executor, function),
+                self._probe_timeout,
+            )
+        except asyncio.TimeoutError:
+            on_failure(f"Timed out after {self._probe_timeout} seconds.")
+        except asyncio.CancelledError:
+            raise  # Not an Exception from Python 3.8.
+        except Exception as e:
+            on_failure(str(e))
+        else:
+            on_result(result)
+
+    def _probe_finished(self, key: str, task: 'asyncio.Future[None]') -> None:
+        if self._probes.get(key) is task:
+            del self._probes[key]
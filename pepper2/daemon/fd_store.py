@@ -0,0 +1,55 @@
+"""
+File Descriptor Store.
+
+Keep file descriptors open whilst the daemon restarts, by storing them
+with systemd. The unit must set ``FileDescriptorStoreMax``.
+"""
+
+import logging
+import os
+from typing import Dict
+
+from systemd.daemon import notify
+
+LOGGER = logging.getLogger(__name__)
+
+# The first file descriptor passed by systemd.
+SD_LISTEN_FDS_START = 3
+
+
+def store_fd(name: str, fd: int) -> None:
+    """Store a file descriptor, replacing any with the same name."""
+    remove_fd(name)
+    notify(f"FDSTORE=1\nFDNAME={name}", fds=[fd])
+
+
+def remove_fd(name: str) -> None:
+    """Remove any file descriptors with a name from the store."""
+    notify(f"FDSTOREREMOVE=1\nFDNAME={name}")
+
+
+def take_fds() -> Dict[str, int]:
+    """
+    Take the file descriptors that systemd passed to the daemon.
+
+    :returns: the file descriptors, by name.
+    """
+    # The variables must not be inherited by the usercode.
+    pid, count, names = (
+        os.environ.pop(variable, "")
+        for variable in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES")
+    )
+    if pid != str(os.getpid()) or not count.isdigit():
+        return {}
+
+    fds: Dict[str, int] = {}
+    fd_names = names.split(":")
+    for i in range(int(count)):
+        fd = SD_LISTEN_FDS_START + i
+        os.set_inheritable(fd, False)
+        name = fd_names[i] if i < len(fd_names) else "unknown"
+        if name in fds:
+            os.close(fds[name])
+        fds[name] = fd
+    LOGGER.debug(f"Received file descriptors from systemd: {', '.join(fds)}")
+    return fds
@@ -0,0 +1,93 @@
+"""
+Drive Fingerprints.
+
+Detect whether a drive may have changed since it was classified.
+"""
+
+import os
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from zlib import crc32
+
+from pepper2.common.constraint import FINGERPRINT_MAX_ENTRIES, DirectoryListing
+
+
+class DriveFingerprint(NamedTuple):
+    """
+    A fingerprint of the root directory of a drive.
+
+    Drive types are matched against the entries in the root directory
+    of a drive, so a drive with the same fingerprint matches the same
+    drive type.
+    """
+
+    device: int
+    inode: int
+    mtime_ns: int
+    ctime_ns: int
+    entry_count: int  # At most FINGERPRINT_MAX_ENTRIES + 1.
+    entries: int  # A checksum of the names of the first entries.
+    files: int  # A checksum of the sizes and times of the files checked for.
+
+    @property
+    def contents(self) -> Tuple[int, int, int, int, int]:
+        """
+        Get the part of the fingerprint that describes the drive contents.
+
+        The device and inode numbers are left out, as they change when the
+        same drive is inserted again as a different block device.
+        """
+        return self.mtime_ns, self.ctime_ns, self.entry_count, self.entries, self.files
+
+
+def fingerprint_drive(
+        mount_path: Path,
+        listing: Optional[DirectoryListing] = None,
+        *,
+        stat: Optional[os.stat_result] = None,
+        filenames: Iterable[str] = (),
+) -> DriveFingerprint:
+    """
+    Get the fingerprint of a drive.
+
+    The names of the entries are included as well as the modification
+    time, as some filesystems only store times to the nearest 2 seconds.
+    Only the first FINGERPRINT_MAX_ENTRIES entries are read, so that
+    drives with many entries are fingerprinted quickly.
+
+    :param listing: the entries in the drive, if it has already been listed.
+    :param stat: the status of the drive, taken before it was listed.
+    :param filenames: the entries that drive types check for, whose sizes
+        and modification times are included.
+    :raises OSError: if the drive cannot be read.
+    """
+    if stat is None:
+        stat = os.stat(mount_path)
+    if listing is None:
+        with DirectoryListing.scan(mount_path) as listing:
+            return fingerprint_drive(
+                mount_path,
+                listing,
+                stat=stat,
+                filenames=filenames,
+            )
+
+    files: List[str] = []
+    for name in sorted(filenames):
+        file_stat = listing.stat(name)
+        if file_stat is not None:
+            files.append(f"{name}\0{file_stat.st_size}\0{file_stat.st_mtime_ns}")
+
+    # The entries are read in the order that the filesystem returns them,
+    # which is the same whilst the directory is not changed.
+    names = [entry.name for entry in islice(listing, FINGERPRINT_MAX_ENTRIES)]
+    return DriveFingerprint(
+        device=stat.st_dev,
+        inode=stat.st_ino,
+        mtime_ns=stat.st_mtime_ns,
+        ctime_ns=stat.st_ctime_ns,
+        entry_count=listing.count_up_to(FINGERPRINT_MAX_ENTRIES + 1),
+        entries=crc32(os.fsencode("\0".join(names))),
+        files=crc32(os.fsencode("\0".join(files))),
+    )
@@ -1,6 +1,23 @@
 """A group of objects that are published to DBus."""
 
-from typing import Any, Dict, Iterator, MutableMapping, NamedTuple, TypeVar
+from threading import RLock
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    ItemsView,
+    Iterator,
+    KeysView,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    TypeVar,
+    Union,
+    ValuesView,
+    overload,
+)
 
 from gi.repository import GLib
 from pydbus.auto_names import auto_bus_name, auto_object_path
@@ -8,6 +25,9 @@ from pydbus.bus import Bus
 from pydbus.registration import ObjectRegistration
 
 U = TypeVar("U")
+T = TypeVar("T")
+
+_MISSING = object()
 
 
 class PublishedObject(NamedTuple):
@@ -28,6 +48,14 @@ class PublishableGroup(MutableMapping[str, U]):
 
     Objects are published to DBus when they are inserted into the group.
     Objects are removed from the bus when they are deleted.
+
+    The optional ``on_insert`` and ``on_remove`` callbacks are called
+    with the key and object after an object is published or removed.
+
+    The group is copy-on-write: a change replaces the mapping of objects
+    rather than modifying it, so reads do not take a lock and are never
+    blocked by a change. Changes are serialised by a lock, which is held
+    whilst the callbacks are called.
     """
 
     def __init__(
@@ -35,44 +63,103 @@ class PublishableGroup(MutableMapping[str, U]):
             bus: Bus,
             *,
             base_path: str = "uk.org.j5.pepper2",
+            on_insert: Optional[Callable[[str, U], None]] = None,
+            on_remove: Optional[Callable[[str, U], None]] = None,
     ) -> None:
         self._bus = bus
         self._bus_path = auto_bus_name(base_path)
+        self._on_insert = on_insert
+        self._on_remove = on_remove
+        self._lock = RLock()
+
+        # Only changed whilst holding the lock, and never modified in place.
         self._dict: Dict[str, PublishedObject] = {}  # type: ignore
+        self._objects: Mapping[str, U] = MappingProxyType({})
+
+    def snapshot(self) -> Mapping[str, U]:
+        """Get the objects in the group, which will not change."""
+        return self._objects
 
     def __setitem__(self, k: str, v: U) -> None:
-        if k in self._dict.keys():
-            raise KeyError("Objects in PublishableGroup cannot be overridden.")
-        bus_path = auto_object_path(self._bus_path, k).replace('-', '_')
+        with self._lock:
+            if k in self._dict.keys():
+                raise KeyError("Objects in PublishableGroup cannot be overridden.")
+            bus_path = auto_object_path(self._bus_path, k).replace('-', '_')
 
-        try:
-            registration = self._bus.register_object(bus_path, v, None)
+            try:
+                registration = self._bus.register_object(bus_path, v, None)
 
-            published_object = PublishedObject(
-                bus_path=bus_path,
-                registration=registration,
-                object=v,
-            )
+                published_object = PublishedObject(
+                    bus_path=bus_path,
+                    registration=registration,
+                    object=v,
+                )
 
-            self._dict[k] = published_object
-        except GLib.Error as e:
-            raise ValueError("Unable to publish the object on DBus.") from e
+                self._replace({**self._dict, k: published_object})
+            except GLib.Error as e:
+                raise ValueError("Unable to publish the object on DBus.") from e
+
+            if self._on_insert is not None:
+                self._on_insert(k, v)
 
     def __delitem__(self, k: str) -> None:
-        published_object = self._dict.pop(k)
-        try:
-            published_object.registration.unregister()
-        except GLib.Error as e:
-            raise ValueError("Unable to remove the object from DBus.") from e
+        with self._lock:
+            published_object = self._dict[k]
+            self._replace({
+                key: value for key, value in self._dict.items() if key != k
+            })
+            try:
+                published_object.registration.unregister()
+            except GLib.Error as e:
+                raise ValueError("Unable to remove the object from DBus.") from e
+
+            if self._on_remove is not None:
+                self._on_remove(k, published_object.object)
+
+    @overload
+    def pop(self, k: str) -> U:
+        ...
+
+    @overload
+    def pop(self, k: str, default: Union[U, T]) -> Union[U, T]:
+        ...
+
+    def pop(self, k: str, default: object = _MISSING) -> object:
+        """Remove an object, and return it."""
+        with self._lock:
+            if k not in self._dict and default is not _MISSING:
+                return default
+            value = self[k]
+            del self[k]
+            return value
+
+    def _replace(self, published: Dict[str, PublishedObject]) -> None:  # type: ignore
+        """Replace the objects in the group."""
+        self._dict = published
+        self._objects = MappingProxyType({
+            key: value.object for key, value in published.items()
+        })
 
     def __getitem__(self, k: str) -> U:
-        return self._dict[k].object  # type: ignore
+        return self._objects[k]
 
     def __len__(self) -> int:
-        return len(self._dict)
+        return len(self._objects)
 
     def __iter__(self) -> Iterator[str]:
-        return iter(self._dict)
+        return iter(self._objects)
+
+    def keys(self) -> KeysView[str]:
+        """Get the keys of the objects, which will not change."""
+        return self._objects.keys()
+
+    def values(self) -> ValuesView[U]:
+        """Get the objects, which will not change."""
+        return self._objects.values()
+
+    def items(self) -> ItemsView[str, U]:
+        """Get the keys and objects, which will not change."""
+        return self._objects.items()
 
     def __repr__(self) -> str:
-        return repr({k: r.object for k, r in self._dict.items()})
+        return repr(dict(self._objects))
@@ -0,0 +1,185 @@
+"""
+Daemon Snapshot.
+
+The daemon keeps a snapshot of its state in /run, so that when it is
+restarted it can carry on where it left off. Drives whose fingerprint
+has not changed keep their drive type, and usercode that is still
+running is adopted rather than restarted.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from pepper2.daemon.fingerprint import DriveFingerprint
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = Path("/run/pepper2/snapshot.json")
+SNAPSHOT_VERSION = 2
+
+BOOT_ID_PATH = Path("/proc/sys/kernel/random/boot_id")
+
+# The name of the output of the usercode in the file descriptor store.
+USERCODE_OUTPUT_FD_NAME = "usercode-output"
+
+
+class DriveSnapshot(NamedTuple):
+    """A registered drive."""
+
+    uuid: str
+    mount_path: Path
+    drive_type: str  # The name of the drive type.
+    fingerprint: DriveFingerprint
+
+
+class UsercodeSnapshot(NamedTuple):
+    """A running usercode process."""
+
+    drive: str  # The UUID of the drive.
+    driver: str  # The class name of the driver.
+    pid: int
+    start_time: int  # In clock ticks since boot.
+
+
+class Snapshot(NamedTuple):
+    """The state of the daemon."""
+
+    boot_id: str
+    drives: List[DriveSnapshot]
+    usercode: Optional[UsercodeSnapshot]
+
+    def drive(self, uuid: str) -> Optional[DriveSnapshot]:
+        """Get a drive by UUID."""
+        for drive in self.drives:
+            if drive.uuid == uuid:
+                return drive
+        return None
+
+
+class Adoption(NamedTuple):
+    """A usercode process that may be adopted by the daemon."""
+
+    usercode: UsercodeSnapshot
+    output_fd: Optional[int]  # The read end of the output of the process.
+
+
+def get_boot_id() -> str:
+    """Get the ID of the current boot."""
+    try:
+        return BOOT_ID_PATH.read_text().strip()
+    except OSError:
+        return ""
+
+
+def process_start_time(pid: int) -> Optional[int]:
+    """
+    Get the start time of a process, to tell it apart from a reused PID.
+
+    :returns: the start time, or None if the process does not exist.
+    """
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+
+    # The name of the process is in brackets, and may contain spaces.
+    fields = stat[stat.rindex(")") + 2:].split()
+    if fields[0] == "Z":
+        return None  # The process has exited.
+    return int(fields[19])
+
+
+def is_same_process(pid: int, start_time: int) -> bool:
+    """Check that a process is still running."""
+    return process_start_time(pid) == start_time
+
+
+class SnapshotFile:
+    """A snapshot of the daemon, saved to a file."""
+
+    def __init__(self, path: Path = DEFAULT_SNAPSHOT_PATH) -> None:
+        self.path = path
+        self.boot_id = get_boot_id()
+
+    def write(self, snapshot: Snapshot) -> None:
+        """Save a snapshot, replacing the previous snapshot."""
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "boot_id": snapshot.boot_id,
+            "drives": [
+                {
+                    "uuid": drive.uuid,
+                    "mount_path": str(drive.mount_path),
+                    "drive_type": drive.drive_type,
+                    "fingerprint": list(drive.fingerprint),
+                }
+                for drive in snapshot.drives
+            ],
+            "usercode": (
+                None if snapshot.usercode is None
+                else snapshot.usercode._asdict()
+            ),
+        }
+
+        temporary_path = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            with temporary_path.open("w") as file:
+                json.dump(data, file, separators=(",", ":"))
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            LOGGER.warning(f"Unable to save snapshot: {e}")
+
+    def read(self) -> Optional[Snapshot]:
+        """
+        Load the snapshot.
+
+        :returns: the snapshot, or None if there is no valid snapshot.
+        """
+        try:
+            with self.path.open() as file:
+                data = json.load(file)
+
+            if data["version"] != SNAPSHOT_VERSION:
+                raise ValueError(f"unknown version {data['version']}")
+
+            usercode = data["usercode"]
+            snapshot = Snapshot(
+                boot_id=str(data["boot_id"]),
+                drives=[
+                    DriveSnapshot(
+                        uuid=str(drive["uuid"]),
+                        mount_path=Path(drive["mount_path"]),
+                        drive_type=str(drive["drive_type"]),
+                        fingerprint=DriveFingerprint(*drive["fingerprint"]),
+                    )
+                    for drive in data["drives"]
+                ],
+                usercode=None if usercode is None else UsercodeSnapshot(
+                    drive=str(usercode["drive"]),
+                    driver=str(usercode["driver"]),
+                    pid=int(usercode["pid"]),
+                    start_time=int(usercode["start_time"]),
+                ),
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            LOGGER.warning(f"Ignoring invalid snapshot: {e}")
+            return None
+
+        if snapshot.boot_id != self.boot_id:
+            LOGGER.info("Ignoring snapshot from a previous boot.")
+            return None
+        return snapshot
+
+    def remove(self) -> None:
+        """Remove the snapshot, so that the next start is a cold start."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            LOGGER.warning(f"Unable to remove snapshot: {e}")
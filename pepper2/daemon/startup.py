@@ -0,0 +1,56 @@
+"""
+Startup Progress.
+
+Report the progress of the daemon to systemd as it starts.
+"""
+
+import logging
+from time import monotonic
+from typing import List, Optional, Tuple
+
+from systemd.daemon import notify
+
+LOGGER = logging.getLogger(__name__)
+
+# How much longer systemd should wait as each phase starts, in seconds.
+PHASE_TIMEOUT = 30
+
+
+class StartupProgress:
+    """
+    Time the phases of startup, and report them to systemd.
+
+    As each phase starts, systemd is told what the daemon is doing and
+    the start timeout is extended, so that a slow controller is given
+    time to start, but a phase that hangs still fails the unit.
+    """
+
+    def __init__(self) -> None:
+        self.started = monotonic()
+        self.phases: List[Tuple[str, float]] = []
+        self._current: Optional[Tuple[str, float]] = None
+
+    def phase(self, status: str) -> None:
+        """Start the next phase of startup."""
+        self._end_phase()
+        self._current = (status, monotonic())
+        LOGGER.debug(f"{status}.")
+        notify(f"STATUS={status}\nEXTEND_TIMEOUT_USEC={PHASE_TIMEOUT * 1000000}")
+
+    def finish(self, status: str) -> None:
+        """Finish starting, and log the time taken by each phase."""
+        self._end_phase()
+        notify(f"STATUS={status}")
+
+        timings = ", ".join(
+            f"{status} {duration:.3f}s" for status, duration in self.phases
+        )
+        LOGGER.info(
+            f"Started in {monotonic() - self.started:.3f} seconds: {timings}",
+        )
+
+    def _end_phase(self) -> None:
+        if self._current is not None:
+            status, started = self._current
+            self.phases.append((status, monotonic() - started))
+            self._current = None
@@ -0,0 +1,139 @@
+"""
+UDisks Events.
+
+Queue and coalesce events from UDisks before they are handled.
+"""
+
+import logging
+from collections import OrderedDict
+from enum import Enum
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from gi.repository import GLib
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EventKind(str, Enum):
+    """The kind of a UDisks event, named after the job operation."""
+
+    MOUNT = "filesystem-mount"
+    CLEANUP = "cleanup"
+
+
+class UDisksEvent(NamedTuple):
+    """An event from UDisks that needs to be handled."""
+
+    kind: EventKind
+    job_path: str
+    objects: List[str]  # The object paths of the affected block devices.
+
+    @property
+    def key(self) -> 'EventKey':
+        """
+        The key that identifies duplicates of this event.
+
+        Events are identified by their kind and block device.
+        """
+        if len(self.objects) > 0:
+            return (self.kind, self.objects[0])
+        return (self.kind, None)
+
+
+# (kind, object path)
+EventKey = Tuple[EventKind, Optional[str]]
+
+
+class EventQueueStats(NamedTuple):
+    """Counters for an event queue."""
+
+    depth: int
+    max_depth: int
+    received: int
+    processed: int
+    coalesced: int  # Dropped as a duplicate of a queued event.
+    cancelled: int  # Mounts dropped as a cleanup removed their drive.
+
+
+class UDisksEventQueue:
+    """
+    A queue of UDisks events, handled in order on the main loop.
+
+    Events are queued as they are received and handled together once
+    the main loop is idle, so a burst of signals is handled in one go.
+    Whilst an event is queued:
+
+    - Another event with the same key replaces it, keeping its place.
+    - A cleanup of a block device cancels any mount of that device.
+
+    The work done for a burst is therefore proportional to the number of
+    distinct devices, rather than the number of signals.
+    """
+
+    def __init__(self, handler: Callable[[UDisksEvent], None]) -> None:
+        self._handler = handler
+        self._events: 'OrderedDict[EventKey, UDisksEvent]' = OrderedDict()
+        self._source_id: Optional[int] = None
+
+        self._max_depth = 0
+        self._received = 0
+        self._processed = 0
+        self._coalesced = 0
+        self._cancelled = 0
+        self._reported_drops = 0
+
+    @property
+    def stats(self) -> EventQueueStats:
+        """Get the counters for the queue."""
+        return EventQueueStats(
+            depth=len(self._events),
+            max_depth=self._max_depth,
+            received=self._received,
+            processed=self._processed,
+            coalesced=self._coalesced,
+            cancelled=self._cancelled,
+        )
+
+    def put(self, event: UDisksEvent) -> None:
+        """Queue an event to be handled."""
+        self._received += 1
+
+        if event.kind is EventKind.CLEANUP:
+            for object_path in event.objects:
+                if self._events.pop((EventKind.MOUNT, object_path), None) is not None:
+                    LOGGER.debug(f"Cancelled queued mount of {object_path}")
+                    self._cancelled += 1
+
+        if event.key in self._events:
+            LOGGER.debug(f"Coalesced {event.kind.name} event from {event.job_path}")
+            self._coalesced += 1
+        self._events[event.key] = event
+        self._max_depth = max(self._max_depth, len(self._events))
+
+        if self._source_id is None:
+            self._source_id = GLib.idle_add(self._drain)
+
+    def clear(self) -> None:
+        """Discard any queued events."""
+        self._events.clear()
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def _drain(self) -> bool:
+        """Handle all of the queued events."""
+        self._source_id = None
+
+        while self._events:
+            _, event = self._events.popitem(last=False)
+            self._processed += 1
+            try:
+                self._handler(event)
+            except Exception:
+                LOGGER.exception(f"Unable to handle event from {event.job_path}")
+
+        dropped = self._coalesced + self._cancelled - self._reported_drops
+        self._reported_drops += dropped
+        if dropped > 0:
+            LOGGER.info(f"Dropped {dropped} redundant UDisks events: {self.stats}")
+        return False  # Do not repeat.
@@ -4,162 +4,654 @@ Udisks2 Controller.
 Abstract and talk to UDisks.
 """
 import logging
+import os
+from functools import partial
 from pathlib import Path
-from time import sleep
-from typing import Dict, List, Type
+from time import monotonic
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    cast,
+)
 
+from gi.repository import GLib
 from pydbus.bus import Bus
 
-from pepper2.common.constraint import Constraint
-from pepper2.common.drive_types import DRIVE_TYPES
+from pepper2.common.constraint import DirectoryListing
+from pepper2.common.drive_types import (
+    DRIVE_TYPES,
+    DriveClassifier,
+    UserCodeDriveType,
+)
+from pepper2.daemon.classification_cache import (
+    DEFAULT_CACHE_SIZE,
+    ClassificationCache,
+)
 from pepper2.daemon.dbus.controller import Controller
 from pepper2.daemon.dbus.drive import Drive, DriveType
+from pepper2.daemon.drive_worker import MAX_PROBE_WORKERS, DriveWorker
+from pepper2.daemon.fingerprint import DriveFingerprint, fingerprint_drive
+from pepper2.daemon.snapshot import Adoption, DriveSnapshot, Snapshot
+from pepper2.daemon.udisks_events import (
+    EventKey,
+    EventKind,
+    UDisksEvent,
+    UDisksEventQueue,
+)
+from pepper2.daemon.udisks_mirror import (
+    BLOCK_INTERFACE,
+    FILESYSTEM_INTERFACE,
+    ObjectInterfaces,
+    PropertiesChangedParams,
+    UDisksMirror,
+    decode_path,
+)
+from pepper2.daemon.usercode_driver.unix_process import abandon_usercode
 
 LOGGER = logging.getLogger(__name__)
 
+JOB_INTERFACE = "org.freedesktop.UDisks2.Job"
+
+# Delays before each attempt to handle a job, in milliseconds.
+#
+# UDisks announces a job when it starts, so the mount or cleanup has
+# usually not happened yet. We also try to handle the job as soon as it
+# completes, but the completion signal can arrive before we subscribe.
+JOB_RETRY_DELAYS = (25, 50, 100, 200, 400, 800, 1600)
+
+# Called with whether this is the last attempt to handle the job.
+# Returns whether the job has been handled.
+JobHandler = Callable[[bool], bool]
+
+# (success, message)
+JobCompletedParams = Tuple[bool, str]
+
+# The drive type of a drive, the fingerprint that it was based on, and the
+# entries that drive types check for that are on the drive.
+Classification = Tuple[Type[DriveType], DriveFingerprint, FrozenSet[str]]
+
+
+class PendingJob:
+    """
+    A UDisks job that is waiting to be handled.
+
+    The job is handled when it completes, or on a timer with increasing
+    delays, without blocking the main loop.
+    """
+
+    def __init__(
+            self,
+            bus: Bus,
+            key: EventKey,
+            path: str,
+            handler: JobHandler,
+            on_finished: Callable[['PendingJob'], None],
+    ) -> None:
+        self.key = key
+        self.path = path
+        self._handler = handler
+        self._on_finished = on_finished
+        self._attempts = 0
+        self._finished = False
+        self._source_id: Optional[int] = GLib.timeout_add(
+            JOB_RETRY_DELAYS[0],
+            self._timeout,
+        )
+        self._subscription = bus.subscribe(
+            sender="org.freedesktop.UDisks2",
+            iface=JOB_INTERFACE,
+            signal="Completed",
+            object=path,
+            signal_fired=self._completed,
+        )
+
+    def attempt(self, *, final: bool = False) -> None:
+        """Attempt to handle the job now."""
+        if self._handler(final) or final:
+            self.cancel()
+
+    def _timeout(self) -> bool:
+        self._source_id = None
+        self._attempts += 1
+        self.attempt(final=self._attempts == len(JOB_RETRY_DELAYS))
+
+        if not self._finished:
+            self._source_id = GLib.timeout_add(
+                JOB_RETRY_DELAYS[self._attempts],
+                self._timeout,
+            )
+        return False  # Do not repeat.
+
+    def _completed(
+            self,
+            _: str,
+            __: str,
+            ___: str,
+            ____: str,
+            params: JobCompletedParams,
+    ) -> None:
+        success, message = params
+        if success:
+            LOGGER.debug(f"Job completed at {self.path}")
+            self.attempt(final=False)
+        else:
+            # Keep trying, in case another job has the same effect.
+            LOGGER.warning(f"UDisks job failed at {self.path}: {message}")
+
+    def cancel(self) -> None:
+        """Stop waiting to handle the job."""
+        if self._finished:
+            return
+        self._finished = True
+
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self._subscription.unsubscribe()
+        self._on_finished(self)
+
+
+class ProbedDrive(NamedTuple):
+    """A drive whose type is known, but is not yet registered."""
+
+    uuid: str
+    object_path: str
+    mount_path: Path
+    drive_type: Type[DriveType]
+    fingerprint: DriveFingerprint
+    files: FrozenSet[str]
+
+    def priority(self) -> Tuple[int, str, str]:
+        """The order in which to register drives found at startup."""
+        return (DRIVE_TYPES.index(self.drive_type), str(self.mount_path), self.uuid)
+
+
+class InitialScan:
+    """The drives found at startup, collected until all are probed."""
+
+    def __init__(self, uuids: Set[str], on_complete: Callable[[], None]) -> None:
+        self.remaining = uuids
+        self.on_complete = on_complete
+        self.found: List[ProbedDrive] = []
+        self.started = monotonic()
+
 
 class UDisksManager:
     """Talk to UDisks2 over D-Bus."""
 
-    def __init__(self, bus: Bus, controller: Controller):
+    def __init__(
+            self,
+            bus: Bus,
+            controller: Controller,
+            *,
+            probe_concurrency: int = MAX_PROBE_WORKERS,
+            classification_cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
         self.bus = bus
         self.controller = controller
+        self.mirror = UDisksMirror(bus)
+        self.worker = DriveWorker(controller.loop, max_probes=probe_concurrency)
+        self.classifier = DriveClassifier(DRIVE_TYPES)
+        self.classification_cache = ClassificationCache(classification_cache_size)
+        self.events = UDisksEventQueue(self._handle_event)
+        self._pending_jobs: Dict[EventKey, PendingJob] = {}
+
+        # The mount paths of drives that are being probed, by UUID.
+        self._probing: Dict[str, Path] = {}
+        self._initial_scan: Optional[InitialScan] = None
+
+        # The state from before a restart, whilst the initial scan runs.
+        self._snapshot: Optional[Snapshot] = None
+        self._adoption: Optional[Adoption] = None
+
+        # The UDisks block device of each drive that is being probed or is
+        # registered, so that removals can be resolved without checking
+        # the mount path of every drive.
+        self._drive_uuids: Dict[str, str] = {}  # By object path.
+        self._drive_objects: Dict[str, str] = {}  # By UUID.
 
     @staticmethod
     def bytes_to_path(data: List[int]) -> Path:
         """Convert a null terminated int array to a path."""
-        # Data is null terminated.
-        mount_point = data[:len(data) - 1]
-
-        chars = [chr(x) for x in mount_point]
-        mount_point_str = "".join(chars)
+        return decode_path(data)
 
-        return Path(mount_point_str)
-
-    def disk_signal(self, path: str, data: Dict[str, Dict[str, str]]) -> None:
+    def disk_signal(self, path: str, data: ObjectInterfaces) -> None:
         """Handle a disk signal event from UDisks2."""
         LOGGER.debug(f"Received event from {path}")
+        self.mirror.interfaces_added(path, data)
 
         if path.startswith("/org/freedesktop/UDisks2/jobs/"):
             for job in data.keys():
                 event_data = data[job]
                 if "Operation" in event_data.keys():
-                    if event_data["Operation"] == "filesystem-mount":
-                        LOGGER.debug(f"Mount Event detected at {path}")
-                        sleep(0.3)
-                        self._handle_mount_event(event_data)
-
-                    if event_data["Operation"] == "cleanup":
-                        LOGGER.debug(f"Removal Event detected at {path}")
-                        sleep(0.3)
-                        self._handle_cleanup_event(event_data)
-
-    def _handle_mount_event(self, event_data: Dict[str, str]) -> None:
-        """Handle a mount event."""
-        if 'Objects' in event_data.keys() \
-                and len(event_data["Objects"]) > 0:
-            disk_bus_path = event_data["Objects"][0]
-            block_device = self.bus.get(".UDisks2", disk_bus_path)
-            mount_points = block_device.MountPoints
-            if len(mount_points) > 0:
-                # We are only interested in the first mountpoint.
-                mount_point = mount_points[0]
-                mount_path = UDisksManager.bytes_to_path(mount_point)
-
-                self._register_drive(block_device.IdUUID, mount_path)
-            else:
-                LOGGER.warning(
-                    f"No mountpoints available for {disk_bus_path}",
-                )
+                    try:
+                        kind = EventKind(event_data["Operation"])
+                    except ValueError:
+                        continue
+
+                    LOGGER.debug(f"{kind.name} event detected at {path}")
+                    self.events.put(UDisksEvent(
+                        kind=kind,
+                        job_path=path,
+                        objects=cast(List[str], event_data.get("Objects", [])),
+                    ))
+
+    def disk_removed_signal(self, path: str, interfaces: List[str]) -> None:
+        """Handle an interfaces removed event from UDisks2."""
+        self.mirror.interfaces_removed(path, interfaces)
+        if BLOCK_INTERFACE in interfaces or FILESYSTEM_INTERFACE in interfaces:
+            LOGGER.debug(f"Block device removed at {path}")
+            self._drive_object_removed(path)
+
+    def properties_signal(
+            self,
+            _: str,
+            path: str,
+            __: str,
+            ___: str,
+            params: PropertiesChangedParams,
+    ) -> None:
+        """Handle a change to the properties of an object in UDisks2."""
+        self.mirror.properties_changed(path, params)
+
+        interface, changed, _invalidated = params
+        if interface != FILESYSTEM_INTERFACE or "MountPoints" not in changed:
+            return
+
+        device = self.mirror.block_device(path)
+        if device is None or len(device.mount_points) == 0:
+            LOGGER.debug(f"Filesystem unmounted at {path}")
+            self._drive_object_removed(path)
         else:
+            # Handle any mount that we are waiting for straight away.
+            job = self._pending_jobs.get((EventKind.MOUNT, path))
+            if job is not None:
+                LOGGER.debug(f"Filesystem mounted at {path}")
+                job.attempt()
+
+    def _handle_event(self, event: UDisksEvent) -> None:
+        """Handle an event from the queue."""
+        if event.kind is EventKind.MOUNT:
+            self._add_pending_job(
+                event,
+                lambda final: self._handle_mount_event(event.objects, final=final),
+            )
+
+        if event.kind is EventKind.CLEANUP:
+            # Drives are removed as soon as UDisks reports that they have
+            # gone, so only the devices named by the cleanup need checking.
+            for object_path in event.objects:
+                job = self._pending_jobs.get((EventKind.MOUNT, object_path))
+                if job is not None:
+                    job.cancel()
+                self._drive_object_removed(object_path)
+
+    def _add_pending_job(self, event: UDisksEvent, handler: JobHandler) -> None:
+        """Handle a job once it has taken effect."""
+        # A newer job replaces any that is waiting for the same thing.
+        job = self._pending_jobs.get(event.key)
+        if job is not None:
+            job.cancel()
+
+        self._pending_jobs[event.key] = PendingJob(
+            self.bus,
+            event.key,
+            event.job_path,
+            handler,
+            self._pending_job_finished,
+        )
+
+    def _pending_job_finished(self, job: PendingJob) -> None:
+        if self._pending_jobs.get(job.key) is job:
+            del self._pending_jobs[job.key]
+
+    async def stop(self) -> None:
+        """
+        Stop handling jobs and cancel any work on drives.
+
+        Drive actions that have been queued are still run.
+        """
+        self.events.clear()
+        for job in list(self._pending_jobs.values()):
+            job.cancel()
+        self.worker.shutdown()
+        await self.worker.wait_for_actions()
+
+    def _handle_mount_event(self, objects: List[str], *, final: bool) -> bool:
+        """
+        Handle a mount event.
+
+        :returns: whether the event has been handled.
+        """
+        if len(objects) == 0:
             LOGGER.warning("No information on drive available. Aborting.")
+            return True
+
+        disk_bus_path = objects[0]
+        device = self.mirror.block_device(disk_bus_path)
+        if device is None or device.uuid is None:
+            if final:
+                LOGGER.warning(f"Unable to get drive at {disk_bus_path}")
+            return False
+
+        if len(device.mount_points) > 0:
+            # We are only interested in the first mountpoint.
+            mount_path = device.mount_points[0]
+
+            # Wait for the mount to appear, unless this is the last try.
+            if mount_path.exists() or final:
+                self._register_drive(device.uuid, disk_bus_path, mount_path)
+                return True
+        elif final:
+            LOGGER.warning(
+                f"No mountpoints available for {disk_bus_path}",
+            )
+        return False
+
+    def _drive_object_removed(self, object_path: str) -> None:
+        """Remove the drive on a block device that has gone."""
+        uuid = self._drive_uuids.get(object_path)
+        if uuid is None:
+            return
+        self._unindex_drive(uuid)
+
+        if uuid in self._probing:
+            LOGGER.info(f"Drive {uuid} removed whilst being probed.")
+            self.worker.cancel(uuid)
+            self._probe_ended(uuid)
+            return
+
+        if self._initial_scan is not None:
+            self._initial_scan.found = [
+                drive for drive in self._initial_scan.found if drive.uuid != uuid
+            ]
+
+        self._remove_drive(uuid)
+
+    def _remove_drive(self, uuid: str) -> None:
+        """Remove a drive from the controller and call its unmount action."""
+        drive = self.controller.drive_group.pop(uuid, None)
+        if drive is None:
+            return
+
+        LOGGER.info(
+            f"Drive {drive.uuid} removed "
+            f"({drive.drive_type.name}): {drive.mount_path}",
+        )
+        LOGGER.debug(f"Calling unmount action for Drive {drive.uuid}")
+        self.worker.run_action(
+            partial(drive.drive_type.unmount_action, drive, self.controller),
+        )
+
+    def _index_drive(self, uuid: str, object_path: str) -> None:
+        """Record the block device of a drive."""
+        self._unindex_drive(uuid)
+        self._drive_uuids[object_path] = uuid
+        self._drive_objects[uuid] = object_path
+
+    def _unindex_drive(self, uuid: str) -> None:
+        """Forget the block device of a drive."""
+        object_path = self._drive_objects.pop(uuid, None)
+        if object_path is not None:
+            self._drive_uuids.pop(object_path, None)
+
+    def detect_initial_drives(
+            self,
+            on_complete: Callable[[], None],
+            *,
+            snapshot: Optional[Snapshot] = None,
+            adoption: Optional[Adoption] = None,
+    ) -> None:
+        """
+        Detect and register drives as startup.
+
+        The drives are probed concurrently, and then registered in order
+        of priority so that the same drive always wins, for example if
+        there are two usercode drives. ``on_complete`` is called once the
+        start actions of the drives have run.
+
+        If pepperd has been restarted, drives that have not changed since
+        the snapshot keep their drive type, and the usercode is adopted if
+        its drive is still present.
+        """
+        self._snapshot = snapshot
+        self._adoption = adoption
 
-    def _handle_cleanup_event(self, _: Dict[str, str]) -> None:
-        """Handle a cleanup event."""
-        with self.controller.data_lock:
-            # We have no information to tell which drive left.
-            # Thus we need to check.
-            removed_drives = []
-            for drive in self.controller.drive_group.values():
-                if not drive.mount_path.exists():
-                    LOGGER.info(
-                        f"Drive {drive.uuid} removed "
-                        f"({drive.drive_type.name}): {drive.mount_path}",
-                    )
-                    removed_drives.append(drive)
-            for drive in removed_drives:
-                self.controller.drive_group.pop(drive.uuid)
-
-        # Call unmount hooks for removed drives
-        for drive in removed_drives:
-            LOGGER.debug(f"Calling unmount action for Drive {drive.uuid}")
-            drive.drive_type.unmount_action(drive, self.controller)
-
-    def detect_initial_drives(self) -> None:
-        """Detect and register drives as startup."""
         logging.info("Checking for initial drives at startup.")
-        udisks = self.bus.get(".UDisks2")
-        managed_objects = udisks.GetManagedObjects()
-        block_devices = {
-            x: managed_objects[x]
-            for x in managed_objects.keys()
-            if x.startswith("/org/freedesktop/UDisks2/block_devices/")
-        }
-        for path, data in block_devices.items():
-            logging.debug(f"Checking drive at {path}")
-            if 'org.freedesktop.UDisks2.Filesystem' in data.keys():
-                filesystem = data['org.freedesktop.UDisks2.Filesystem']
-                if 'MountPoints' in filesystem.keys():
-                    mountpoints = filesystem['MountPoints']
-                    if len(mountpoints) > 0:
-                        mount_point = UDisksManager.bytes_to_path(
-                            mountpoints[0],
-                        )
-                        if 'org.freedesktop.UDisks2.Block' in data.keys():
-                            block = data['org.freedesktop.UDisks2.Block']
-                            if 'IdUUID' in block.keys():
-                                self._register_drive(
-                                    block["IdUUID"],
-                                    mount_point,
-                                    startup=True,
-                                )
+        self.mirror.load()
+        found: Dict[str, Tuple[str, Path]] = {}
+        for device in self.mirror.block_devices():
+            logging.debug(f"Checking drive at {device.object_path}")
+            if device.uuid is not None and len(device.mount_points) > 0:
+                found[device.uuid] = (device.object_path, device.mount_points[0])
+
+        scan = InitialScan(set(found), on_complete)
+        if len(found) == 0:
+            self._finish_initial_scan(scan)
+            return
+
+        self._initial_scan = scan
+        for uuid, (object_path, mount_point) in found.items():
+            self._register_drive(uuid, object_path, mount_point, startup=True)
+
+    def _finish_initial_scan(self, scan: InitialScan) -> None:
+        """Register the drives found at startup, in order of priority."""
+        LOGGER.info(
+            f"Probed {len(scan.found)} initial drives in "
+            f"{monotonic() - scan.started:.3f} seconds.",
+        )
+        # Any usercode to adopt goes first, so that it is not replaced.
+        adopt_uuid = None if self._adoption is None else self._adoption.usercode.drive
+        for drive in sorted(
+            scan.found,
+            key=lambda drive: (drive.uuid != adopt_uuid, drive.priority()),
+        ):
+            self._add_drive(drive, startup=True)
+
+        if self._adoption is not None:
+            self.worker.run_action(partial(abandon_usercode, self._adoption))
+        self._snapshot = None
+        self._adoption = None
+
+        # Run after the start actions, which may have started usercode.
+        self.worker.run_action(scan.on_complete)
 
     def _register_drive(
             self,
             uuid: str,
+            object_path: str,
             mount_path: Path,
             *,
             startup: bool = False,  # Was the drive inserted before we started
     ) -> None:
-        """Register a drive with the controller."""
-        if mount_path.exists():
-            drive = Drive(
-                uuid=uuid,
-                mount_path=mount_path,
-                drive_type=self._get_drive_type(mount_path),
+        """
+        Register a drive with the controller.
+
+        The drive is probed on a worker thread, and registered once its
+        type is known.
+        """
+        if uuid in self._probing:
+            # The new probe will replace the one in progress.
+            self._probe_ended(uuid)
+
+        known = None
+        if startup and self._snapshot is not None:
+            known = self._snapshot.drive(uuid)
+
+        self._probing[uuid] = mount_path
+        self._index_drive(uuid, object_path)
+        self.worker.probe(
+            uuid,
+            lambda: self._probe_drive(uuid, mount_path, known),
+            lambda classification: self._drive_probed(
+                uuid,
+                object_path,
+                mount_path,
+                classification,
+                startup=startup,
+            ),
+            lambda reason: self._drive_probe_failed(uuid, mount_path, reason),
+        )
+
+    def _probe_ended(self, uuid: str) -> None:
+        """Record that a drive is no longer being probed."""
+        self._probing.pop(uuid, None)
+
+        scan = self._initial_scan
+        if scan is not None:
+            scan.remaining.discard(uuid)
+            if len(scan.remaining) == 0:
+                self._initial_scan = None
+                self._finish_initial_scan(scan)
+
+    def _probe_drive(
+            self,
+            uuid: str,
+            mount_path: Path,
+            known: Optional[DriveSnapshot],
+    ) -> Optional[Classification]:
+        """
+        Determine the type of a drive.
+
+        Called on a worker thread.
+
+        :param known: the drive before pepperd was restarted, if known.
+        :returns: the classification, or None if the drive is unreadable.
+        """
+        # Take the status first, so that a change whilst the drive is
+        # being listed invalidates the fingerprint.
+        try:
+            stat = os.stat(mount_path)
+        except FileNotFoundError:
+            return None
+
+        # The drive is only listed once, for both the fingerprint and the
+        # drive type, and only as far as they need.
+        with DirectoryListing.scan(mount_path) as listing:
+            fingerprint = fingerprint_drive(
+                mount_path,
+                listing,
+                stat=stat,
+                filenames=self.classifier.filenames,
             )
-            with self.controller.data_lock:
-                LOGGER.info(
-                    f"Drive {drive.uuid} mounted "
-                    f"({drive.drive_type.name}): {drive.mount_path}",
-                )
-                self.controller.drive_group[drive.uuid] = drive
+            files = self.classifier.present_files(listing)
+            # Drive types that check beyond the fingerprint are always matched.
+            if not self.classifier.cacheable:
+                return self.classifier.classify(listing), fingerprint, files
+
+            if known is not None \
+                    and known.mount_path == mount_path \
+                    and known.fingerprint == fingerprint:
+                for drive_type in DRIVE_TYPES:
+                    if drive_type.name == known.drive_type:
+                        LOGGER.debug(f"Drive at {mount_path} has not changed.")
+                        return drive_type, fingerprint, files
+
+            cached = self.classification_cache.get(uuid, fingerprint)
+            LOGGER.debug(f"Classification cache: {self.classification_cache.stats}")
+            if cached is not None:
+                LOGGER.debug(f"Drive {uuid} has not changed since it was last inserted.")
+                return cached, fingerprint, files
 
-            # Call the appropriate hook
-            if startup:
-                LOGGER.debug(f"Calling start action for Drive {drive.uuid}")
-                drive.drive_type.start_action(drive, self.controller)
+            drive_type = self.classifier.classify(listing)
+            self.classification_cache.put(uuid, fingerprint, drive_type)
+            return drive_type, fingerprint, files
+
+    def _drive_probed(
+            self,
+            uuid: str,
+            object_path: str,
+            mount_path: Path,
+            classification: Optional[Classification],
+            *,
+            startup: bool,
+    ) -> None:
+        """Register a drive once its type is known."""
+        try:
+            if classification is None:
+                LOGGER.warning(f"Unreadable drive mounted: {mount_path}")
+                self._unindex_drive(uuid)
             else:
-                LOGGER.debug(f"Calling mount action for Drive {drive.uuid}")
-                drive.drive_type.mount_action(drive, self.controller)
+                probed = ProbedDrive(uuid, object_path, mount_path, *classification)
+                if startup and self._initial_scan is not None:
+                    self._initial_scan.found.append(probed)
+                else:
+                    self._add_drive(probed, startup=startup)
+        finally:
+            self._probe_ended(uuid)
+
+    def _drive_probe_failed(self, uuid: str, mount_path: Path, reason: str) -> None:
+        """Give up on a drive that could not be probed."""
+        LOGGER.warning(f"Unable to probe drive {uuid} at {mount_path}: {reason}")
+        self._unindex_drive(uuid)
+        self._probe_ended(uuid)
+
+    def _add_drive(self, probed: ProbedDrive, *, startup: bool) -> None:
+        """
+        Add a probed drive to the controller and call its action.
+
+        A drive may already be registered, if it was mounted again whilst
+        it was being probed. It is kept if it is still at the same mount
+        path, and replaced otherwise.
+        """
+        registered = self.controller.drive_group.get(probed.uuid)
+        if registered is not None:
+            if registered.mount_path == probed.mount_path:
+                LOGGER.debug(
+                    f"Drive {probed.uuid} is already registered: {probed.mount_path}",
+                )
+                return
+            self._remove_drive(probed.uuid)
+
+        drive = Drive(
+            uuid=probed.uuid,
+            mount_path=probed.mount_path,
+            drive_type=probed.drive_type,
+            fingerprint=probed.fingerprint,
+            files=probed.files,
+        )
+        LOGGER.info(
+            f"Drive {drive.uuid} mounted "
+            f"({drive.drive_type.name}): {drive.mount_path}",
+        )
+        try:
+            self.controller.drive_group[drive.uuid] = drive
+        except ValueError as e:
+            LOGGER.error(f"Unable to register drive {drive.uuid}: {e}")
+            return
+
+        # Call the appropriate hook
+        adoption = self._adoption
+        if startup and adoption is not None \
+                and adoption.usercode.drive == drive.uuid \
+                and drive.drive_type is UserCodeDriveType:
+            LOGGER.debug(f"Adopting usercode for Drive {drive.uuid}")
+            self._adoption = None
+            self.worker.run_action(partial(self._adopt_usercode, drive, adoption))
+        elif startup:
+            LOGGER.debug(f"Calling start action for Drive {drive.uuid}")
+            self.worker.run_action(
+                partial(drive.drive_type.start_action, drive, self.controller),
+            )
         else:
-            LOGGER.warning(f"Unreadable drive mounted: {mount_path}")
+            LOGGER.debug(f"Calling mount action for Drive {drive.uuid}")
+            self.worker.run_action(
+                partial(drive.drive_type.mount_action, drive, self.controller),
+            )
 
-    @staticmethod
-    def _get_drive_type(mount_path: Path) -> Type[DriveType]:
-        """Given a path, determine the drive type."""
-        for candidate in DRIVE_TYPES:
-            constraint: Constraint = candidate.constraint_matcher()
-            if constraint.matches(mount_path):
-                return candidate
-        raise RuntimeError("Unable to match drive.")
+    def _adopt_usercode(self, drive: Drive, adoption: Adoption) -> None:
+        """
+        Adopt the usercode of a drive, or start it if it cannot be adopted.
+
+        Called on the action thread.
+        """
+        if not UserCodeDriveType.adopt_action(drive, self.controller, adoption):
+            abandon_usercode(adoption)
+            UserCodeDriveType.start_action(drive, self.controller)
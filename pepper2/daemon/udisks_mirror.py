@@ -0,0 +1,135 @@
+"""
+UDisks Mirror.
+
+Keep a copy of the state of UDisks in memory.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pydbus.bus import Bus
+
+LOGGER = logging.getLogger(__name__)
+
+BLOCK_DEVICES_PATH = "/org/freedesktop/UDisks2/block_devices/"
+BLOCK_INTERFACE = "org.freedesktop.UDisks2.Block"
+FILESYSTEM_INTERFACE = "org.freedesktop.UDisks2.Filesystem"
+
+# The properties of each interface of an object, by interface name.
+ObjectInterfaces = Dict[str, Dict[str, object]]
+
+# (interface, changed properties, invalidated properties)
+PropertiesChangedParams = Tuple[str, Dict[str, object], List[str]]
+
+
+def decode_path(data: Sequence[int]) -> Path:
+    """
+    Convert a byte array from UDisks to a path.
+
+    UDisks paths are null terminated and are not necessarily valid
+    UTF-8, so they are decoded in the same way as paths from the OS.
+    """
+    raw = bytes(data).split(b"\0", 1)[0]
+    return Path(os.fsdecode(raw))
+
+
+class BlockDevice(NamedTuple):
+    """A block device known to UDisks."""
+
+    object_path: str
+    uuid: Optional[str]
+    mount_points: List[Path]  # Empty if the device is not mounted.
+
+
+class UDisksMirror:
+    """
+    A copy of the block devices known to UDisks, kept in memory.
+
+    The mirror is loaded once with GetManagedObjects, and then kept up
+    to date from the signals of UDisks, so that looking up a device does
+    not need a round trip to UDisks.
+
+    All methods run on the main loop.
+    """
+
+    def __init__(self, bus: Bus) -> None:
+        self.bus = bus
+        self._objects: Dict[str, ObjectInterfaces] = {}
+
+    def load(self) -> None:
+        """Load the current state of UDisks."""
+        udisks = self.bus.get(".UDisks2")
+        managed_objects = udisks.GetManagedObjects()
+        self._objects = {
+            path: interfaces
+            for path, interfaces in managed_objects.items()
+            if path.startswith(BLOCK_DEVICES_PATH)
+        }
+        LOGGER.debug(f"Loaded {len(self._objects)} block devices from UDisks.")
+
+    def interfaces_added(self, path: str, interfaces: ObjectInterfaces) -> None:
+        """Update the mirror from an InterfacesAdded signal."""
+        if path.startswith(BLOCK_DEVICES_PATH):
+            self._objects.setdefault(path, {}).update(interfaces)
+
+    def interfaces_removed(self, path: str, interfaces: List[str]) -> None:
+        """Update the mirror from an InterfacesRemoved signal."""
+        if path not in self._objects:
+            return
+
+        for interface in interfaces:
+            self._objects[path].pop(interface, None)
+        if len(self._objects[path]) == 0:
+            del self._objects[path]
+
+    def properties_changed(
+            self,
+            path: str,
+            params: PropertiesChangedParams,
+    ) -> None:
+        """Update the mirror from a PropertiesChanged signal."""
+        interface, changed, invalidated = params
+        properties = self._objects.get(path, {}).get(interface)
+        if properties is None:
+            return
+
+        properties.update(changed)
+        for name in invalidated:
+            properties.pop(name, None)
+
+    def block_device(self, path: str) -> Optional[BlockDevice]:
+        """
+        Get a block device.
+
+        :returns: the device, or None if it is not known to UDisks.
+        """
+        interfaces = self._objects.get(path)
+        if interfaces is None or BLOCK_INTERFACE not in interfaces:
+            return None
+
+        uuid = interfaces[BLOCK_INTERFACE].get("IdUUID")
+        filesystem = interfaces.get(FILESYSTEM_INTERFACE, {})
+        mount_points = filesystem.get("MountPoints", [])
+
+        return BlockDevice(
+            object_path=path,
+            uuid=uuid if isinstance(uuid, str) and uuid != "" else None,
+            mount_points=[
+                decode_path(mount_point)
+                for mount_point in _as_list(mount_points)
+            ],
+        )
+
+    def block_devices(self) -> List[BlockDevice]:
+        """Get all of the block devices."""
+        devices = [self.block_device(path) for path in sorted(self._objects)]
+        return [device for device in devices if device is not None]
+
+
+def _as_list(value: object) -> List[Sequence[int]]:
+    """Decode an array of byte arrays."""
+    if not isinstance(value, list):
+        return []
+    return [item for item in value if isinstance(item, (list, bytes))]
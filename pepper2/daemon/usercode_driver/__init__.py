@@ -2,9 +2,16 @@
 
 from .python import PythonUnixProcessDriver
 from .unix_process import UnixProcessDriver
-from .usercode_driver import CodeStatus, UserCodeDriver
+from .usercode_driver import (
+    KILL_TIMEOUT,
+    STOP_TIMEOUT,
+    CodeStatus,
+    UserCodeDriver,
+)
 
 __all__ = [
+    'KILL_TIMEOUT',
+    'STOP_TIMEOUT',
     'CodeStatus',
     'PythonUnixProcessDriver',
     'UnixProcessDriver',
@@ -1,79 +1,218 @@
 """Python Usercode Driver."""
 
+import asyncio
 import logging
+import os
 from abc import abstractmethod
-from signal import SIGCHLD, SIGKILL, SIGTERM, Signals, getsignal, signal
-from subprocess import DEVNULL, PIPE, STDOUT, Popen, TimeoutExpired
+from concurrent.futures import Future
+from queue import Empty, Full, Queue
+from signal import SIGKILL, SIGTERM, Signals
+from subprocess import DEVNULL, PIPE, STDOUT, Popen
 from threading import Thread
-from types import FrameType
-from typing import TYPE_CHECKING, List, Optional
+from time import monotonic
+from typing import IO, TYPE_CHECKING, List, Optional, Set
 
+from gi.repository import GLib
 from systemd import journal
 
+from pepper2.daemon.fd_store import remove_fd, store_fd
+from pepper2.daemon.snapshot import (
+    USERCODE_OUTPUT_FD_NAME,
+    Adoption,
+    UsercodeSnapshot,
+    is_same_process,
+    process_start_time,
+)
+
 from .usercode_driver import CodeStatus, UserCodeDriver
 
 if TYPE_CHECKING:
-    # _HANDLER is only available in typeshed.
-    from signal import _HANDLER
-
     from pepper2.daemon.dbus.controller import Controller
     from pepper2.daemon.dbus.drive import Drive
 
 
 LOGGER = logging.getLogger(__name__)
 
+# The longest line of output that is logged at once, in bytes.
+MAX_LINE_LENGTH = 64 * 1024
+
+# The number of lines of output that can be waiting to be written.
+MAX_PENDING_LINES = 1024
+
+# How often to check whether adopted usercode is running, in milliseconds.
+ADOPTED_POLL_INTERVAL = 500
+
+# The event loop only keeps weak references to tasks, so the loggers that
+# are running are kept here until they finish.
+_running_loggers: Set['asyncio.Task[None]'] = set()
+
+# How often to check whether any process in the group of stopped usercode
+# is running, after the code itself has exited, in seconds.
+GROUP_POLL_INTERVAL = 0.05
+
+
+def _group_exists(group: int) -> bool:
+    """Check if a process group has any processes."""
+    try:
+        os.killpg(group, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def abandon_usercode(adoption: Adoption) -> None:
+    """
+    Stop usercode from a previous instance of pepperd that was not adopted.
+
+    For example, its drive may have been removed whilst pepperd was not
+    running.
+    """
+    usercode = adoption.usercode
+    if is_same_process(usercode.pid, usercode.start_time):
+        LOGGER.info(f"Killing usercode process group {usercode.pid}.")
+        try:
+            # The usercode was started in its own process group.
+            os.killpg(usercode.pid, SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    if adoption.output_fd is not None:
+        os.close(adoption.output_fd)
+    remove_fd(USERCODE_OUTPUT_FD_NAME)
 
-class LoggerThread(Thread):
+
+class OutputLogger:
     """
-    A thread that will log the output of the process.
+    Log the output of the process.
+
+    The output is read by a task on the event loop rather than a thread,
+    and logged to the drive and the journal by a writer thread, so that
+    a slow drive does not hold up the event loop. This is used as a more
+    flexible, pure-python alternative to solutions such as ``script``.
 
-    This thread does not modify any data in the program, it simply
-    logs the output of the child process to the appropriate
-    destinations. This is used as a more flexible, pure-python
-    alternative to solutions such as ``script``.
+    The logger closes the output once the process has closed it.
     """
 
-    def __init__(self, process: Popen, drive: 'Drive'):
-        super().__init__(daemon=True)
-        self._process = process
+    def __init__(self, output: IO[bytes], drive: 'Drive', *, resume: bool = False):
+        self._output = output
         self._log_file = open(
             drive.mount_path.joinpath("log.txt"),
-            "w",
+            "a" if resume else "w",
         )
-        self.log = True
-
-    def run(self) -> None:
-        """Log the process."""
-        LOGGER.info("Logger Thread Started.")
-        self._log("=== LOG STARTED ===\n")
-        while self.log:
-            try:
-                output = self._process.stdout.readline()
-                if output == '' and self._process.poll() is not None:
+        self._resume = resume
+
+        # Lines that have been read, but not written. None marks the end.
+        self._lines: 'Queue[Optional[str]]' = Queue(MAX_PENDING_LINES)
+        self._writer = Thread(target=self._write, daemon=True)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start logging, from any thread."""
+        loop.call_soon_threadsafe(self._start_task)
+
+    def _start_task(self) -> None:
+        """Start logging in a task, which is kept until it finishes."""
+        task = asyncio.ensure_future(self.run())
+        _running_loggers.add(task)
+        task.add_done_callback(_logger_finished)
+
+    async def run(self) -> None:
+        """Log the process until it closes its output."""
+        LOGGER.info("Logger started.")
+        loop = asyncio.get_event_loop()
+        reader = asyncio.StreamReader(limit=MAX_LINE_LENGTH)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader),
+            self._output,
+        )
+        self._writer.start()
+        try:
+            await self._log(
+                "=== LOG RESUMED ===\n" if self._resume else "=== LOG STARTED ===\n",
+            )
+            while True:
+                try:
+                    output = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    # The output has ended, perhaps without a newline.
+                    output = e.partial
+                except asyncio.LimitOverrunError as e:
+                    # Log a long line in parts, rather than buffering it.
+                    output = await reader.readexactly(e.consumed)
+                if output == b'':
+                    # The process has closed its output.
                     break
-                self._log(output.decode('utf-8'))
-            except ValueError:
-                # We have tried to read from stdout, when it is closed.
-                # See: https://hg.python.org/cpython/rev/7d722c9049ff
-                break
-        self._log("=== LOG FINISHED ===\n")
-        self._log_file.close()
-        LOGGER.info("Logger Thread Exiting.")
-
-    def stop(self) -> None:
-        """Stop logging."""
-        self.log = False
-
-    def _log(self, line: str) -> None:
+                await self._log(output.decode('utf-8', errors='replace'))
+            await self._log("=== LOG FINISHED ===\n")
+        finally:
+            transport.close()
+            await self._put(None)
+            await loop.run_in_executor(None, self._writer.join)
+            LOGGER.info("Logger exiting.")
+
+    async def _log(self, line: str) -> None:
         """Log to all locations."""
         if line != "":
-            self._log_line_to_file(line)
-            self._log_line_to_systemd(line)
+            await self._put(line)
+
+    async def _put(self, line: Optional[str]) -> None:
+        """
+        Pass a line to the writer thread.
+
+        If the writer has fallen behind, wait for it, so that the output
+        of the process is no longer read until it catches up.
+        """
+        try:
+            self._lines.put_nowait(line)
+        except Full:
+            await asyncio.get_event_loop().run_in_executor(None, self._lines.put, line)
+
+    def _write(self) -> None:
+        """Write lines to all locations, until the output has ended."""
+        finished = False
+        while not finished:
+            # Write all of the lines that are waiting, then flush them once.
+            lines = [self._lines.get()]
+            while lines[-1] is not None:
+                try:
+                    lines.append(self._lines.get_nowait())
+                except Empty:
+                    break
+            finished = lines[-1] is None
+
+            for line in lines:
+                if line is not None:
+                    self._log_line_to_file(line)
+                    self._log_line_to_systemd(line)
+            self._flush_file()
+        self._close_file()
 
     def _log_line_to_file(self, line: str) -> None:
         """Log a line to the logfile."""
-        self._log_file.write(line)
-        self._log_file.flush()
+        if not self._log_file.closed:
+            try:
+                self._log_file.write(line)
+            except OSError as e:
+                # The drive may have been removed, but the journal still works.
+                LOGGER.error(f"Unable to write to the usercode log file: {e}")
+                self._close_file()
+
+    def _flush_file(self) -> None:
+        """Flush the lines written to the logfile to the drive."""
+        if not self._log_file.closed:
+            try:
+                self._log_file.flush()
+            except OSError as e:
+                LOGGER.error(f"Unable to write to the usercode log file: {e}")
+                self._close_file()
+
+    def _close_file(self) -> None:
+        """Close the logfile, even if it can no longer be written to."""
+        try:
+            self._log_file.close()
+        except OSError:
+            pass
 
     def _log_line_to_systemd(
             self,
@@ -84,30 +223,60 @@ class LoggerThread(Thread):
         journal.send(line, SYSLOG_IDENTIFIER=identifier)
 
 
+def _logger_finished(task: 'asyncio.Task[None]') -> None:
+    """Stop keeping a logger that has finished, and report any error."""
+    _running_loggers.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        LOGGER.error("Unable to log usercode output.", exc_info=task.exception())
+
+
 class UnixProcessDriver(UserCodeDriver):
     """
     Usercode driver to execute commands.
 
     Executes as the current user in a separate unix process group.
+
+    The process is supervised by a GLib child watch, which reaps it and
+    reports its exit on the event loop without a SIGCHLD handler.
+
+    The read end of the output of the process is kept in the systemd file
+    descriptor store, so that the process can be adopted if pepperd is
+    restarted. An adopted process is not a child of pepperd, so it is
+    watched with a pidfd where possible, or polled to find out when it
+    exits.
+
+    Stopping the code does not block: the code is given a grace period
+    to exit after SIGTERM, on a timer on the event loop. Any process left
+    in its process group at the end of the grace period is killed, even
+    if the code itself has exited.
     """
 
     _process: Optional[Popen]
-    _logger: Optional[LoggerThread]
+    _adopted: Optional[UsercodeSnapshot]
+    _logger: Optional[OutputLogger]
     _return_code: Optional[int]
 
     def __init__(self, drive: 'Drive', daemon_controller: 'Controller'):
         super().__init__(drive, daemon_controller)
 
         self._process = None
+        self._adopted = None
+        self._start_time: Optional[int] = None
+
+        # The GLib source that reports when the code exits, and any pidfd.
+        self._watch_source_id: Optional[int] = None
+        self._pidfd: Optional[int] = None
         self._logger = None
         self._return_code = None
 
-        self._original_sigchld: _HANDLER = getsignal(SIGCHLD)
+        # Whilst the code is being stopped, the stop in progress, and a
+        # future that is done when the code exits.
+        self._stopping: Optional['asyncio.Future[None]'] = None
+        self._exited: Optional['asyncio.Future[None]'] = None
 
     def start_execution(self) -> None:
         """Start the execution of the code."""
-        if self._process is None:
-            signal(SIGCHLD, self.sigchld_handler)
+        if self._process is None and self._adopted is None:
             self._process = Popen(
                 self.get_command(),
                 stdin=DEVNULL,
@@ -116,64 +285,289 @@ class UnixProcessDriver(UserCodeDriver):
                 cwd=self.drive.mount_path,
                 start_new_session=True,  # Put the process in a new process group
             )
-            self._logger = LoggerThread(self._process, self.drive)
-            self._logger.start()
+            self._start_time = process_start_time(self._process.pid)
+            if self._process.stdout is not None:
+                store_fd(USERCODE_OUTPUT_FD_NAME, self._process.stdout.fileno())
+                self._logger = OutputLogger(self._process.stdout, self.drive)
+                self._logger.start(self.daemon_controller.loop)
             self.status = CodeStatus.RUNNING
 
+            # The process cannot be reaped before it is watched, so an exit
+            # that has already happened will still be reported.
+            self._watch_source_id = GLib.child_watch_add(
+                GLib.PRIORITY_DEFAULT,
+                self._process.pid,
+                self._child_exited,
+            )
             LOGGER.info(f"Usercode process started with pid {self._process.pid}")
         else:
             LOGGER.warning("Unable to start usercode, process already running.")
 
-    def stop_execution(self) -> None:
-        """Stop the execution of the code."""
-        self._reset_sigchld()
+    def adopt(self, adoption: Adoption) -> bool:
+        """
+        Take over code that was started by a previous instance of pepperd.
 
-        if self._process is not None:
-            LOGGER.info(f"Sent SIGTERM to pid {self._process.pid}")
-            self._process.send_signal(SIGTERM)
-            try:
-                self._process.communicate(timeout=5)
-            except TimeoutExpired:
-                pass
-            LOGGER.info(f"Sent SIGKILL to pid {self._process.pid}")
-            self._process.send_signal(SIGKILL)
-            self.status = CodeStatus.KILLED
-            self._cleanup()
+        The output file descriptor is only used if the code is adopted.
+
+        :returns: whether the code was adopted.
+        """
+        usercode = adoption.usercode
+        if self._process is not None or self._adopted is not None \
+                or not is_same_process(usercode.pid, usercode.start_time):
+            return False
+
+        self._adopted = usercode
+        self._start_time = usercode.start_time
+        if adoption.output_fd is not None:
+            output = os.fdopen(adoption.output_fd, "rb")
+            self._logger = OutputLogger(output, self.drive, resume=True)
+            self._logger.start(self.daemon_controller.loop)
         else:
-            LOGGER.info("No usercode process to stop.")
+            LOGGER.warning("The output of the adopted usercode has been lost.")
 
-    def sigchld_handler(self, _: Signals, __: FrameType) -> None:
+        self.status = CodeStatus.RUNNING
+        self._watch_adopted(usercode)
+        LOGGER.info(f"Adopted usercode process with pid {usercode.pid}")
+        return True
+
+    def _watch_adopted(self, adopted: UsercodeSnapshot) -> None:
+        """Watch adopted code, to find out when it exits."""
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(adopted.pid)
+            except OSError as e:
+                # The process has exited, or Linux is older than 5.3.
+                LOGGER.debug(f"Unable to open pidfd, polling instead: {e}")
+            else:
+                # The process may have been replaced before it was opened.
+                if is_same_process(adopted.pid, adopted.start_time):
+                    # The pidfd becomes readable when the process exits.
+                    self._pidfd = pidfd
+                    self._watch_source_id = GLib.unix_fd_add_full(
+                        GLib.PRIORITY_DEFAULT,
+                        pidfd,
+                        GLib.IOCondition.IN,
+                        lambda _, __: self._poll_adopted(),
+                    )
+                    return
+                os.close(pidfd)
+
+        self._watch_source_id = GLib.timeout_add(
+            ADOPTED_POLL_INTERVAL,
+            self._poll_adopted,
+        )
+
+    def snapshot(self) -> Optional[UsercodeSnapshot]:
         """
-        Handler for SIGCHLD.
+        Get the information needed to adopt the code after a restart.
 
-        This is called when the child process of this process dies.
+        :returns: the snapshot, or None if no code is running.
         """
-        self._reset_sigchld()
+        if self._adopted is not None:
+            return self._adopted
+
+        if self._process is not None and self._start_time is not None:
+            return UsercodeSnapshot(
+                drive=self.drive.uuid,
+                driver=self.__class__.__name__,
+                pid=self._process.pid,
+                start_time=self._start_time,
+            )
+        return None
 
-        if self._process is not None:
-            return_code = self._process.poll()
+    def stop_execution(self) -> 'Future[None]':
+        """
+        Stop the execution of the code, without waiting for it to stop.
 
-            if return_code == 0:
-                self.status = CodeStatus.FINISHED
-                LOGGER.info("Usercode finished successfully.")
-            else:
-                self.status = CodeStatus.CRASHED
-                LOGGER.info(
-                    f"Usercode finished unsuccessfully (return code: {return_code}).",
+        :returns: a future that is done once the code has stopped.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.stop(),
+            self.daemon_controller.loop,
+        )
+
+    async def stop(self) -> None:
+        """
+        Stop the code, and wait for it to stop.
+
+        SIGTERM is sent to the process group of the code, and then SIGKILL
+        if any process in the group is still running at the end of the
+        grace period. The code may not exit if it is stuck in the kernel,
+        for example reading a drive that has been removed, so the wait
+        after SIGKILL is bounded. Must be called on the event loop.
+        """
+        if self._stopping is None:
+            group = self._process_group()
+            if group is None:
+                LOGGER.info("No usercode process to stop.")
+                return
+            # The code is being stopped from now on, even if it exits before
+            # the task to stop it runs.
+            exited = asyncio.get_event_loop().create_future()
+            self._exited = exited
+            self._stopping = asyncio.ensure_future(self._stop(group, exited))
+
+        # The code may already be being stopped.
+        stopping = self._stopping
+        try:
+            await asyncio.shield(stopping)
+        finally:
+            if self._stopping is stopping and stopping.done():
+                self._stopping = None
+
+    async def _stop(self, group: int, exited: 'asyncio.Future[None]') -> None:
+        """
+        Signal the process group of the code until it has stopped.
+
+        :param exited: a future that is done once the code has exited.
+        """
+        if self._process is None and self._adopted is None:
+            # The code exited before it was signalled, and the group may
+            # have been reused since.
+            LOGGER.info("Usercode exited before it was stopped.")
+            return
+
+        stop_timeout = self.daemon_controller.stop_timeout
+        kill_timeout = self.daemon_controller.kill_timeout
+        started = monotonic()
+        signal = SIGTERM
+        self._signal_group(group, signal)
+        try:
+            await asyncio.wait_for(asyncio.shield(exited), stop_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        # Other processes in the group may ignore SIGTERM, and outlive the code.
+        while _group_exists(group) and monotonic() - started < stop_timeout:
+            await asyncio.sleep(GROUP_POLL_INTERVAL)
+
+        if not exited.done() or _group_exists(group):
+            signal = SIGKILL
+            self._signal_group(group, signal)
+            try:
+                await asyncio.wait_for(asyncio.shield(exited), kill_timeout)
+            except asyncio.TimeoutError:
+                LOGGER.warning(
+                    f"Usercode did not exit {kill_timeout} seconds after SIGKILL.",
                 )
-            self._return_code = return_code
-            self._cleanup()
+                return
+
+        LOGGER.info(
+            f"Usercode stopped by {signal.name} "
+            f"in {monotonic() - started:.3f} seconds.",
+        )
+
+    def _child_exited(self, pid: int, wait_status: int) -> None:
+        """Handle the exit of the process, which GLib has reaped."""
+        observed = monotonic()
+        process = self._process
+        if process is None or process.pid != pid:
+            return
+
+        self._watch_source_id = None
+        if os.WIFSIGNALED(wait_status):
+            process.returncode = -os.WTERMSIG(wait_status)
+        else:
+            process.returncode = os.WEXITSTATUS(wait_status)
+        self._code_exited(process.returncode, observed)
+
+    def _poll_adopted(self) -> bool:
+        """Check whether adopted code is still running."""
+        observed = monotonic()
+        adopted = self._adopted
+        if adopted is not None \
+                and not is_same_process(adopted.pid, adopted.start_time):
+            self._watch_source_id = None
+
+            # The process is not our child, so its return code is lost.
+            self._code_exited(None, observed)
 
-    def _reset_sigchld(self) -> None:
-        """Reset the SIGCHLD handler to the original."""
-        signal(SIGCHLD, self._original_sigchld)
+        return self._adopted is not None  # Repeat whilst running.
+
+    def _code_exited(self, return_code: Optional[int], observed: float) -> None:
+        """
+        Update the status of the code, now that it has exited.
+
+        :param observed: when the exit was observed, from time.monotonic().
+        """
+        # Stop saving the code in the snapshot before the status changes.
+        self._process = None
+        self._adopted = None
+        self._set_return_code(return_code)
+
+        if self._exited is not None:
+            self.status = CodeStatus.KILLED
+        elif return_code is None:
+            # We cannot tell whether the code succeeded.
+            self.status = CodeStatus.CRASHED
+            LOGGER.info("Usercode finished (return code unknown).")
+        elif return_code == 0:
+            self.status = CodeStatus.FINISHED
+            LOGGER.info("Usercode finished successfully.")
+        else:
+            self.status = CodeStatus.CRASHED
+            LOGGER.info(
+                f"Usercode finished unsuccessfully (return code: {return_code}).",
+            )
+        self._cleanup()
+
+        latency_ms = (monotonic() - observed) * 1000
+        self.daemon_controller.record_usercode_exit(latency_ms)
+        LOGGER.debug(
+            f"Usercode status updated {latency_ms:.3f} ms after its exit was observed.",
+        )
+
+    def _process_group(self) -> Optional[int]:
+        """
+        Get the process group of the code.
+
+        The code was started in its own process group, so the ID of the
+        group is the PID of the code.
+
+        :returns: the process group, or None if the code is not running.
+        """
+        if self._process is not None:
+            # The exit of the process has not been handled, so it has only
+            # just been reaped, if at all.
+            return self._process.pid
+        if self._adopted is not None \
+                and is_same_process(self._adopted.pid, self._adopted.start_time):
+            return self._adopted.pid
+        return None
+
+    @staticmethod
+    def _signal_group(group: int, signal: Signals) -> None:
+        """Send a signal to a process group, if it has any processes."""
+        LOGGER.info(f"Sent {signal.name} to process group {group}")
+        try:
+            os.killpg(group, signal)
+        except ProcessLookupError:
+            pass
+
+    def _set_return_code(self, return_code: Optional[int]) -> None:
+        """Store the return code of the process, if it is known."""
+        self._return_code = return_code
+        if return_code is not None:
+            self.daemon_controller.inform_return_code(return_code)
 
     def _cleanup(self) -> None:
         """Clean up from a running process."""
         self._process = None
+        self._adopted = None
+        self._start_time = None
+        remove_fd(USERCODE_OUTPUT_FD_NAME)
+
+        if self._watch_source_id is not None:
+            GLib.source_remove(self._watch_source_id)
+            self._watch_source_id = None
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+        self._logger = None
 
-        if self._logger is not None:
-            self._logger.stop()
+        if self._exited is not None:
+            self._exited.set_result(None)
+            self._exited = None
 
     @abstractmethod
     def get_command(self) -> List[str]:
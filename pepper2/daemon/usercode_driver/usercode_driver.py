@@ -2,11 +2,20 @@
 
 from abc import ABCMeta, abstractmethod
 from enum import Enum
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 if TYPE_CHECKING:
+    from concurrent.futures import Future
+
     from pepper2.daemon.dbus.controller import Controller
     from pepper2.daemon.dbus.drive import Drive
+    from pepper2.daemon.snapshot import Adoption, UsercodeSnapshot
+
+# How long code is given to exit before it is killed, in seconds.
+STOP_TIMEOUT = 5.0
+
+# How long to wait for code to exit after it is killed, in seconds.
+KILL_TIMEOUT = 2.0
 
 
 class CodeStatus(str, Enum):
@@ -39,16 +48,47 @@ class UserCodeDriver(metaclass=ABCMeta):
         self.daemon_controller = daemon_controller
         self.status = CodeStatus.STARTING
 
+        # Set if the drive of the code was removed, but the code did not
+        # stop. The code must not be started again.
+        self.detached = False
+
     @abstractmethod
     def start_execution(self) -> None:
         """Start the execution of the code."""
         raise NotImplementedError  # pragma: nocover
 
     @abstractmethod
-    def stop_execution(self) -> None:
-        """Stop the execution of the code."""
+    def stop_execution(self) -> 'Future[None]':
+        """
+        Stop the execution of the code, without waiting for it to stop.
+
+        :returns: a future that is done once the code has stopped.
+        """
         raise NotImplementedError  # pragma: nocover
 
+    def adopt(self, adoption: 'Adoption') -> bool:
+        """
+        Take over code that was started by a previous instance of pepperd.
+
+        Drivers that cannot adopt code do not override this.
+
+        :returns: whether the code was adopted.
+        """
+        return False
+
+    def snapshot(self) -> Optional['UsercodeSnapshot']:
+        """
+        Get the information needed to adopt the code after a restart.
+
+        :returns: the snapshot, or None if the code cannot be adopted.
+        """
+        return None
+
+    @property
+    def running(self) -> bool:
+        """Check if the code is running."""
+        return self.status is CodeStatus.RUNNING
+
     @property
     def status(self) -> CodeStatus:
         """Get the status of the executing code."""
@@ -1,5 +1,10 @@
 """Type stubs for gi.repository.GLib."""
 
+from enum import IntFlag
+from typing import Callable
+
+PRIORITY_DEFAULT: int
+
 
 class Error(Exception):
     """Horrific GLib Error God Object."""
@@ -8,8 +13,75 @@ class Error(Exception):
     def message(self) -> str: ...
 
 
+class IOCondition(IntFlag):
+    IN = 1
+    PRI = 2
+    OUT = 4
+    ERR = 8
+    HUP = 16
+    NVAL = 32
+
+
+class MainContext:
+
+    @staticmethod
+    def new() -> 'MainContext': ...
+
+    @staticmethod
+    def default() -> 'MainContext': ...
+
+    def pending(self) -> bool: ...
+
+    def iteration(self, may_block: bool) -> bool: ...
+
+    def push_thread_default(self) -> None: ...
+
+    def pop_thread_default(self) -> None: ...
+
+    def invoke_full(self, priority: int, function: Callable[[], bool]) -> None: ...
+
+
 class MainLoop:
 
+    @staticmethod
+    def new(context: MainContext, is_running: bool) -> 'MainLoop': ...
+
     def run(self) -> None: ...
 
-    def quit(self) -> None: ...
\ No newline at end of file
+    def quit(self) -> None: ...
+
+
+class Variant:
+
+    def __init__(self, format_string: str, value: object) -> None: ...
+
+    def unpack(self) -> object: ...
+
+
+class VariantType:
+
+    def __init__(self, type_string: str) -> None: ...
+
+
+def child_watch_add(
+        priority: int,
+        pid: int,
+        function: Callable[[int, int], None],
+) -> int: ...
+
+
+def idle_add(function: Callable[[], bool]) -> int: ...
+
+
+def timeout_add(interval: int, function: Callable[[], bool]) -> int: ...
+
+
+def source_remove(tag: int) -> bool: ...
+
+
+def unix_fd_add_full(
+        priority: int,
+        fd: int,
+        condition: IOCondition,
+        function: Callable[[int, IOCondition], bool],
+) -> int: ...
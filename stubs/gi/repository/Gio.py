@@ -0,0 +1,72 @@
+"""Type stubs for gi.repository.Gio."""
+
+from enum import IntEnum, IntFlag
+from typing import Callable, Optional
+
+from .GLib import Variant, VariantType
+
+
+class BusType(IntEnum):
+    SYSTEM = 1
+    SESSION = 2
+
+
+class DBusCallFlags(IntFlag):
+    NONE = 0
+
+
+class DBusSignalFlags(IntFlag):
+    NONE = 0
+
+
+class AsyncResult:
+    ...
+
+
+class Cancellable:
+
+    def cancel(self) -> None: ...
+
+
+class DBusConnection:
+
+    def call(
+            self,
+            bus_name: Optional[str],
+            object_path: str,
+            interface_name: str,
+            method_name: str,
+            parameters: Optional[Variant],
+            reply_type: Optional[VariantType],
+            flags: DBusCallFlags,
+            timeout_msec: int,
+            cancellable: Optional[Cancellable],
+            callback: Callable[[object, AsyncResult, None], None],
+            user_data: None,
+    ) -> None: ...
+
+    def call_finish(self, res: AsyncResult) -> Variant: ...
+
+    def signal_subscribe(
+            self,
+            sender: Optional[str],
+            interface_name: Optional[str],
+            member: Optional[str],
+            object_path: Optional[str],
+            arg0: Optional[str],
+            flags: DBusSignalFlags,
+            callback: Callable[[DBusConnection, str, str, str, str, Variant], None],
+    ) -> int: ...
+
+    def signal_unsubscribe(self, subscription_id: int) -> None: ...
+
+
+def bus_get(
+        bus_type: BusType,
+        cancellable: Optional[Cancellable],
+        callback: Callable[[object, AsyncResult, None], None],
+        user_data: None,
+) -> None: ...
+
+
+def bus_get_finish(res: AsyncResult) -> DBusConnection: ...
@@ -3,10 +3,11 @@ Stubs for pydbus.bus.
 
 The stubs in this file do not necessarily match the structure of pydbus.
 """
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from .publication import Publication
 from .registration import ObjectRegistration
+from .subscription import Subscription
 
 
 class Bus:
@@ -15,6 +16,16 @@ class Bus:
     def get(self, bus_name: str, object: Optional[str] = None) -> Any: ...
     def publish(self, bus_name: str, *objects: Any) -> Publication: ...
     def register_object(self, bus_path: str, object: Any, node_info: Optional[str]) -> ObjectRegistration: ...
+    def subscribe(
+            self,
+            sender: Optional[str] = None,
+            iface: Optional[str] = None,
+            signal: Optional[str] = None,
+            object: Optional[str] = None,
+            arg0: Optional[str] = None,
+            flags: int = 0,
+            signal_fired: Optional[Callable[[str, str, str, str, Any], None]] = None,
+    ) -> Subscription: ...
 
 
 def SystemBus() -> Bus:
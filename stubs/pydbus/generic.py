@@ -1,14 +1,9 @@
 """Stubs for pydbus.generic."""
 
-from typing import Any, Dict, List
+from typing import Any
 
 
 class signal:
     ...
 
-    def __call__(
-            self,
-            object: str,
-            properties: Dict[str, Any],
-            objects: List[Any],
-    ) -> None: ...
+    def __call__(self, *args: Any) -> None: ...
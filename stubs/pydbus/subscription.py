@@ -0,0 +1,8 @@
+"""Stubs for pydbus.subscription."""
+
+
+class Subscription:
+
+    def unsubscribe(self) -> None: ...
+
+    def disconnect(self) -> None: ...
@@ -0,0 +1 @@
+"""Tests for pepper2.api."""
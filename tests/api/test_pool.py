@@ -0,0 +1,63 @@
+"""Test the proxy pool."""
+from unittest import mock
+
+from pepper2.api.pool import ProxyPool
+
+BUS_NAME = "uk.org.j5.pepper2"
+OTHER_BUS_NAME = "org.freedesktop.UDisks2"
+
+
+def _pool(system_bus: mock.MagicMock) -> ProxyPool:
+    """Create a pool whose bus creates a new proxy every time."""
+    system_bus.return_value.get.side_effect = lambda *_: object()
+    return ProxyPool()
+
+
+@mock.patch("pepper2.api.pool.SystemBus")
+def test_proxies_are_reused(system_bus: mock.MagicMock) -> None:
+    """Test that the same proxy and bus are returned for the same object."""
+    pool = _pool(system_bus)
+
+    proxy = pool.get(BUS_NAME)
+    assert pool.get(BUS_NAME) is proxy
+    assert pool.get(BUS_NAME, "/uk/org/j5/pepper2/drive") is not proxy
+    assert pool.get(OTHER_BUS_NAME) is not proxy
+
+    system_bus.assert_called_once_with()
+    assert system_bus.return_value.get.call_count == 3
+    # Owner changes are only subscribed to once for each bus name.
+    assert system_bus.return_value.subscribe.call_count == 2
+
+
+@mock.patch("pepper2.api.pool.SystemBus")
+def test_proxies_are_dropped_when_owner_changes(system_bus: mock.MagicMock) -> None:
+    """Test that the proxies for a bus name are dropped when its owner changes."""
+    pool = _pool(system_bus)
+    proxy = pool.get(BUS_NAME)
+    other = pool.get(OTHER_BUS_NAME)
+
+    subscribe = system_bus.return_value.subscribe.call_args_list[0]
+    assert subscribe[1]["arg0"] == BUS_NAME
+    subscribe[1]["signal_fired"](
+        "org.freedesktop.DBus",
+        "/org/freedesktop/DBus",
+        "org.freedesktop.DBus",
+        "NameOwnerChanged",
+        (BUS_NAME, ":1.1", ":1.2"),
+    )
+
+    assert pool.get(BUS_NAME) is not proxy
+    assert pool.get(OTHER_BUS_NAME) is other
+
+
+@mock.patch("pepper2.api.pool.SystemBus")
+def test_close_discards_everything(system_bus: mock.MagicMock) -> None:
+    """Test that closing the pool unsubscribes and discards the proxies."""
+    pool = _pool(system_bus)
+    proxy = pool.get(BUS_NAME)
+
+    pool.close()
+    system_bus.return_value.subscribe.return_value.unsubscribe.assert_called_once_with()
+
+    assert pool.get(BUS_NAME) is not proxy
+    assert system_bus.call_count == 2
@@ -0,0 +1,61 @@
+"""Test the DaemonState class."""
+
+from pathlib import Path
+
+from pepper2.api.state import DaemonState
+from pepper2.common.daemon_status import DaemonStatus
+from pepper2.common.drive_types import DRIVE_TYPES, UserCodeDriveType
+
+USERCODE_INDEX = DRIVE_TYPES.index(UserCodeDriveType)
+
+
+def test_state_from_fields() -> None:
+    """Test that we can construct a state from a full set of fields."""
+    state = DaemonState.from_fields(
+        3,
+        {
+            "daemon_status": "code_running",
+            "version": "0.1.0",
+            "usercode_drive": "UUID",
+            "usercode_driver_name": "PythonUnixProcessDriver",
+            "drives": [("UUID", "/media/usb", USERCODE_INDEX)],
+        },
+    )
+
+    assert state.generation == 3
+    assert state.daemon_status is DaemonStatus.CODE_RUNNING
+    assert state.version == "0.1.0"
+    assert state.usercode_driver_name == "PythonUnixProcessDriver"
+    assert state.last_exit_code is None
+
+    drive = state.usercode_drive
+    assert drive is not None
+    assert drive.mount_path == Path("/media/usb")
+    assert drive.drive_type is UserCodeDriveType
+
+
+def test_state_with_changes() -> None:
+    """Test that changes are applied to the state."""
+    state = DaemonState.from_fields(
+        1,
+        {
+            "daemon_status": "ready",
+            "version": "0.1.0",
+            "usercode_drive": "",
+            "usercode_driver_name": "",
+            "drives": [],
+        },
+    )
+    assert state.usercode_drive is None
+    assert state.usercode_driver_name is None
+
+    assert state.with_changes(1, {}) is state
+
+    new_state = state.with_changes(
+        2,
+        {"daemon_status": "code_crashed", "last_exit_code": 1},
+    )
+    assert new_state.generation == 2
+    assert new_state.daemon_status is DaemonStatus.CODE_CRASHED
+    assert new_state.last_exit_code == 1
+    assert new_state.version == "0.1.0"
@@ -0,0 +1,45 @@
+"""Test that pepperctl only imports what it needs."""
+import subprocess
+import sys
+from typing import Set
+
+# Modules that are only needed by the daemon, or are slow to import.
+DAEMON_MODULES = {
+    "pkg_resources",
+    "systemd",
+    "pepper2.daemon.usercode_driver",
+    "pepper2.daemon.publishable_group",
+}
+
+DBUS_MODULES = {
+    "gi",
+    "pydbus",
+}
+
+
+def _imported_modules(statement: str) -> Set[str]:
+    """Get the modules imported by a statement in a new interpreter."""
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            f"import sys; {statement}; print(' '.join(sys.modules))",
+        ],
+        universal_newlines=True,
+    )
+    return set(output.split())
+
+
+def test_cli_imports() -> None:
+    """Test that starting pepperctl does not import the API."""
+    modules = _imported_modules("import pepper2.cli.app")
+
+    assert modules & (DAEMON_MODULES | DBUS_MODULES) == set()
+    assert "pepper2.api.api" not in modules
+
+
+def test_status_file_imports() -> None:
+    """Test that reading the status file does not import D-Bus."""
+    modules = _imported_modules("from pepper2.api import read_status_file")
+
+    assert modules & (DAEMON_MODULES | DBUS_MODULES) == set()
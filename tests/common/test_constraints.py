@@ -1,15 +1,21 @@
 """Test the constraints classes."""
 
+import random
 from pathlib import Path
 
 from pepper2.common.constraint import (
+    FINGERPRINT_MAX_ENTRIES,
     AndConstraint,
     Constraint,
+    DirectoryListing,
     FalseConstraint,
     FilePresentConstraint,
+    FileSizeConstraint,
+    GlobPresentConstraint,
     NotConstraint,
     NumberOfFilesConstraint,
     OrConstraint,
+    TotalSizeConstraint,
     TrueConstraint,
 )
 
@@ -111,3 +117,205 @@ def test_and_constraint() -> None:
     assert not AndConstraint(false, true).matches(NOT_EXIST_PATH)
     assert not AndConstraint(true, false).matches(NOT_EXIST_PATH)
     assert AndConstraint(true, true).matches(NOT_EXIST_PATH)
+
+
+def test_compiled_constraints() -> None:
+    """Test that compiled constraints match the same directories."""
+    constraints = [
+        FilePresentConstraint("test.txt"),
+        NumberOfFilesConstraint(3),
+        NotConstraint(FilePresentConstraint("test.txt")),
+        OrConstraint(FilePresentConstraint("other.txt"), NumberOfFilesConstraint(3)),
+        AndConstraint(TrueConstraint(), FilePresentConstraint("test.txt")),
+        FalseConstraint(),
+    ]
+    for path in (FILE_PRESENT_PATH, THREE_PRESENT_PATH, OTHER_PRESENT_PATH):
+        with DirectoryListing.scan(path) as listing:
+            for constraint in constraints:
+                assert constraint.compile()(listing) == constraint.matches(path)
+
+
+def test_nary_constraints() -> None:
+    """Test that And and Or accept any number of constraints."""
+    true = TrueConstraint()
+    false = FalseConstraint()
+    assert not OrConstraint().matches(NOT_EXIST_PATH)
+    assert OrConstraint(false, false, true).matches(NOT_EXIST_PATH)
+    assert AndConstraint().matches(NOT_EXIST_PATH)
+    assert not AndConstraint(true, true, false).matches(NOT_EXIST_PATH)
+
+
+def test_constraint_operators() -> None:
+    """Test that constraints can be combined with operators."""
+    a = FilePresentConstraint("test.txt")
+    b = NumberOfFilesConstraint(3)
+
+    assert a & b == AndConstraint(a, b)
+    assert a | b == OrConstraint(b, a)
+    assert ~a == NotConstraint(a)
+    assert (a | b).matches(THREE_PRESENT_PATH)
+    assert not (a & b).matches(FILE_PRESENT_PATH)
+
+
+def test_simplify_constraints() -> None:
+    """Test that constraints are simplified."""
+    a = FilePresentConstraint("test.txt")
+    b = NumberOfFilesConstraint(3)
+    c = FilePresentConstraint("other.txt")
+
+    assert (a & TrueConstraint()).simplify() == a
+    assert (a & FalseConstraint()).simplify() == FalseConstraint()
+    assert (a | TrueConstraint()).simplify() == TrueConstraint()
+    assert OrConstraint(FalseConstraint()).simplify() == FalseConstraint()
+    assert (~~a).simplify() == a
+    assert (~TrueConstraint()).simplify() == FalseConstraint()
+
+    # Nested constraints are flattened, and duplicates removed.
+    simplified = ((a | b) | (c | a)).simplify()
+    assert isinstance(simplified, OrConstraint)
+    assert len(simplified.constraints) == 3
+
+    # Cheap constraints are checked first.
+    simplified = (b & a).simplify()
+    assert isinstance(simplified, AndConstraint)
+    assert simplified.constraints == (a, b)
+
+
+def _random_constraint(rng: random.Random, depth: int) -> Constraint:
+    """Build a random tree of constraints."""
+    leaves = [
+        TrueConstraint(),
+        FalseConstraint(),
+        FilePresentConstraint("test.txt"),
+        FilePresentConstraint("other.txt"),
+        NumberOfFilesConstraint(1),
+        NumberOfFilesConstraint(3),
+        GlobPresentConstraint("*.txt"),
+        FileSizeConstraint("test.txt", max_size=0),
+        TotalSizeConstraint(0, max_entries=3),
+    ]
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(leaves)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return NotConstraint(_random_constraint(rng, depth - 1))
+    children = [_random_constraint(rng, depth - 1) for _ in range(rng.randint(0, 4))]
+    return AndConstraint(*children) if kind == 1 else OrConstraint(*children)
+
+
+def test_simplified_constraints_are_equivalent() -> None:
+    """Test that simplified constraints match the same paths as the originals."""
+    rng = random.Random(2020)
+    paths = [
+        DATA_PATH,
+        FILE_PATH,
+        NOT_EXIST_PATH,
+        FILE_PRESENT_PATH,
+        OTHER_PRESENT_PATH,
+        THREE_PRESENT_PATH,
+    ]
+    listings = [
+        DirectoryListing.scan(path) for path in paths if path.is_dir()
+    ]
+    for _ in range(500):
+        constraint = _random_constraint(rng, 4)
+        simplified = constraint.simplify()
+        assert simplified.estimated_cost() <= constraint.estimated_cost()
+        for path in paths:
+            assert simplified.matches(path) == constraint.matches(path), constraint
+        matcher = simplified.compile()
+        for listing in listings:
+            assert matcher(listing) == constraint.matches(listing.path), constraint
+
+    for listing in listings:
+        listing.close()
+
+
+def test_glob_present_constraint() -> None:
+    """Test that the GlobPresentConstraint works as expected."""
+    constraint = GlobPresentConstraint("t*.txt")
+
+    assert not constraint.matches(FILE_PATH)
+    assert not constraint.matches(OTHER_PRESENT_PATH)
+    assert not constraint.matches(NOT_EXIST_PATH)
+    assert constraint.matches(FILE_PRESENT_PATH)
+
+
+def test_file_size_constraint(tmp_path: Path) -> None:
+    """Test that the FileSizeConstraint works as expected."""
+    tmp_path.joinpath("data.bin").write_bytes(bytes(100))
+    tmp_path.joinpath("directory").mkdir()
+    listing = DirectoryListing.scan(tmp_path)
+
+    for constraint, expected in [
+        (FileSizeConstraint("data.bin"), True),
+        (FileSizeConstraint("data.bin", min_size=100, max_size=100), True),
+        (FileSizeConstraint("data.bin", max_size=99), False),
+        (FileSizeConstraint("data.bin", min_size=101), False),
+        (FileSizeConstraint("missing.bin"), False),
+        (FileSizeConstraint("directory"), False),
+    ]:
+        assert constraint.matches(tmp_path) == expected, constraint
+        assert constraint.compile()(listing) == expected, constraint
+    listing.close()
+
+
+def test_total_size_constraint(tmp_path: Path) -> None:
+    """Test that the TotalSizeConstraint works as expected."""
+    tmp_path.joinpath("data.bin").write_bytes(bytes(100))
+    tmp_path.joinpath("directory").mkdir()
+    tmp_path.joinpath("directory", "more.bin").write_bytes(bytes(50))
+    listing = DirectoryListing.scan(tmp_path)
+
+    for constraint, expected in [
+        (TotalSizeConstraint(150), True),
+        (TotalSizeConstraint(149), False),
+        (TotalSizeConstraint(150, max_entries=3), True),
+        (TotalSizeConstraint(150, max_entries=2), False),
+    ]:
+        assert constraint.matches(tmp_path) == expected, constraint
+        assert constraint.compile()(listing) == expected, constraint
+    listing.close()
+
+    assert not TotalSizeConstraint(150).matches(NOT_EXIST_PATH)
+    assert not TotalSizeConstraint(150).cacheable()
+    assert (FileSizeConstraint("data.bin") & NumberOfFilesConstraint(3)).cacheable()
+
+
+def test_constraints_beyond_fingerprint_are_not_cacheable() -> None:
+    """Test that constraints depending on unfingerprinted entries are not cacheable."""
+    assert NumberOfFilesConstraint(FINGERPRINT_MAX_ENTRIES).cacheable()
+    assert not NumberOfFilesConstraint(FINGERPRINT_MAX_ENTRIES + 1).cacheable()
+    assert not GlobPresentConstraint("*.py").cacheable()
+
+
+def test_directory_listing_is_read_on_demand(tmp_path: Path) -> None:
+    """Test that a listing only reads as many entries as are needed."""
+    for i in range(100):
+        tmp_path.joinpath(f"{i}.txt").touch()
+
+    with DirectoryListing.scan(tmp_path) as listing:
+        assert "50.txt" in listing
+        assert "missing.txt" not in listing
+        assert not NumberOfFilesConstraint(3).compile()(listing)
+        assert repr(listing) == f"DirectoryListing(path={tmp_path}, read=4)"
+
+        assert listing.count_up_to(200) == 100
+        assert len(list(listing)) == 100
+        assert NumberOfFilesConstraint(100).compile()(listing)
+
+
+def test_unreadable_entries_do_not_match(tmp_path: Path) -> None:
+    """Test that entries that cannot be read do not match, rather than raising."""
+    tmp_path.joinpath("loop.bin").symlink_to("loop.bin")
+    constraint = FileSizeConstraint("loop.bin")
+    assert not constraint.matches(tmp_path)
+    with DirectoryListing.scan(tmp_path) as listing:
+        assert not constraint.compile()(listing)
+
+    # A file that is removed after it has been listed.
+    tmp_path.joinpath("data.bin").write_bytes(bytes(100))
+    with DirectoryListing.scan(tmp_path) as listing:
+        assert listing.count_up_to(10) == 2
+        tmp_path.joinpath("data.bin").unlink()
+        assert not TotalSizeConstraint(150).compile()(listing)
@@ -1,7 +1,11 @@
 """Test the Drive class."""
 from pathlib import Path
 
-from pepper2.common.drive_types import NoActionDriveType
+from pepper2.common.drive_types import (
+    DriveClassifier,
+    MetadataDriveType,
+    NoActionDriveType,
+)
 from pepper2.daemon.dbus.drive import Drive
 
 
@@ -17,3 +21,34 @@ def test_drive_instantiation() -> None:
     assert drive.uuid == "UUID"
     assert drive.mount_path == Path()
     assert drive.drive_type is NoActionDriveType
+
+
+def test_drive_struct_round_trip() -> None:
+    """Test that a drive survives conversion to and from a DBus struct."""
+    drive = Drive(
+        uuid="UUID",
+        mount_path=Path("/media/usb"),
+        drive_type=NoActionDriveType,
+    )
+
+    uuid, mount_path_str, _ = drive.to_struct()
+    assert uuid == "UUID"
+    assert mount_path_str == "/media/usb"
+
+    new_drive = Drive.from_struct(drive.to_struct())
+    assert new_drive.uuid == drive.uuid
+    assert new_drive.mount_path == drive.mount_path
+    assert new_drive.drive_type is drive.drive_type
+
+
+def test_drive_classifier(tmp_path: Path) -> None:
+    """Test that drives are classified in priority order."""
+    classifier = DriveClassifier([MetadataDriveType, NoActionDriveType])
+    drive_type, files = classifier.classify_path(tmp_path)
+    assert drive_type is NoActionDriveType
+    assert files == frozenset()
+
+    tmp_path.joinpath("pepper2.json").touch()
+    drive_type, files = classifier.classify_path(tmp_path)
+    assert drive_type is MetadataDriveType
+    assert files == {"pepper2.json"}
@@ -0,0 +1,51 @@
+"""Test the status file."""
+from pathlib import Path
+
+from pepper2.common.state_fields import StateFields
+from pepper2.common.status_file import (
+    StatusFileReader,
+    StatusFileWriter,
+    decode_payload,
+    encode_payload,
+)
+
+
+def test_payload_round_trip() -> None:
+    """Test that the state survives encoding and decoding."""
+    fields: StateFields = {
+        "daemon_status": "code_running",
+        "version": "0.1.0",
+        "usercode_drive": "UUID",
+        "usercode_driver_name": "UnixProcessUsercodeDriver",
+        "drives": [("UUID", "/media/usb", 0)],
+        "last_exit_code": -9,
+    }
+
+    assert decode_payload(encode_payload(12, fields)) == (12, fields)
+
+
+def test_payload_without_exit_code() -> None:
+    """Test that a missing exit code is not decoded as zero."""
+    _, fields = decode_payload(encode_payload(1, {"daemon_status": "ready"}))
+
+    assert "last_exit_code" not in fields
+    assert fields["drives"] == []
+
+
+def test_write_and_read(tmp_path: Path) -> None:
+    """Test that a reader sees the state written by a writer."""
+    path = tmp_path / "status"
+    writer = StatusFileWriter(path)
+    reader = StatusFileReader(path)
+
+    writer.write(3, {"daemon_status": "ready", "drives": []})
+    generation, fields = reader.read()
+    assert generation == 3
+    assert fields["daemon_status"] == "ready"
+
+    writer.write(4, {"daemon_status": "code_running", "drives": []})
+    assert reader.read()[0] == 4
+
+    reader.close()
+    writer.close()
+    assert not path.exists()
@@ -0,0 +1,54 @@
+"""Test the classification cache."""
+from pathlib import Path
+
+from pepper2.common.drive_types import MetadataDriveType, NoActionDriveType
+from pepper2.daemon.classification_cache import ClassificationCache
+from pepper2.daemon.fingerprint import fingerprint_drive
+
+
+def test_cache_hits_and_misses(tmp_path: Path) -> None:
+    """Test that a drive is only found whilst its fingerprint is the same."""
+    cache = ClassificationCache()
+    fingerprint = fingerprint_drive(tmp_path)
+
+    assert cache.get("UUID", fingerprint) is None
+    cache.put("UUID", fingerprint, NoActionDriveType)
+    assert cache.get("UUID", fingerprint) is NoActionDriveType
+    assert cache.get("OTHER", fingerprint) is None
+
+    tmp_path.joinpath("pepper2.json").touch()
+    changed = fingerprint_drive(tmp_path)
+    assert cache.get("UUID", changed) is None
+
+    # The drive type for the old fingerprint is replaced.
+    cache.put("UUID", changed, MetadataDriveType)
+    assert cache.get("UUID", fingerprint) is None
+    assert cache.get("UUID", changed) is MetadataDriveType
+
+    stats = cache.stats
+    assert (stats.size, stats.hits, stats.misses) == (1, 2, 4)
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Test that the least recently used drive is forgotten when full."""
+    cache = ClassificationCache(max_size=2)
+    fingerprint = fingerprint_drive(tmp_path)
+
+    cache.put("A", fingerprint, NoActionDriveType)
+    cache.put("B", fingerprint, NoActionDriveType)
+    assert cache.get("A", fingerprint) is NoActionDriveType
+    cache.put("C", fingerprint, NoActionDriveType)
+
+    assert cache.get("A", fingerprint) is NoActionDriveType
+    assert cache.get("B", fingerprint) is None
+    assert cache.get("C", fingerprint) is NoActionDriveType
+
+
+def test_cache_ignores_device(tmp_path: Path) -> None:
+    """Test that a drive is found when it is inserted as a different device."""
+    cache = ClassificationCache()
+    fingerprint = fingerprint_drive(tmp_path)
+    cache.put("UUID", fingerprint, NoActionDriveType)
+
+    moved = fingerprint._replace(device=fingerprint.device + 1, inode=1)
+    assert cache.get("UUID", moved) is NoActionDriveType
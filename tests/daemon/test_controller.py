@@ -0,0 +1,82 @@
+"""Test the controller state."""
+from threading import Thread
+from unittest import mock
+
+from pepper2.common.daemon_status import DaemonStatus
+from pepper2.common.state_fields import STATE_FIELD_SIGNATURES
+from pepper2.daemon.dbus.controller import Controller
+
+
+def _controller() -> Controller:
+    """Create a controller that is not published on a bus."""
+    return Controller(mock.MagicMock(), mock.MagicMock())
+
+
+def test_state_changes_after_restart() -> None:
+    """Test that all fields are returned for a generation from before a restart."""
+    old = _controller()
+    for _ in range(5):
+        old.daemon_status = DaemonStatus.CODE_RUNNING
+    generation, _ = old.get_state()
+
+    # The restarted daemon makes fewer changes than the old one.
+    new = _controller()
+    new.daemon_status = DaemonStatus.READY
+    new_generation, fields = new.get_state_changes(generation)
+
+    assert new_generation > generation
+    assert set(fields) == set(STATE_FIELD_SIGNATURES) - {"last_exit_code"}
+    assert fields["daemon_status"].unpack() == DaemonStatus.READY.value
+
+
+def test_state_changes_only_include_changed_fields() -> None:
+    """Test that only the fields changed since a generation are returned."""
+    controller = _controller()
+    generation, _ = controller.get_state()
+
+    assert controller.get_state_changes(generation) == (generation, {})
+
+    controller.inform_return_code(3)
+    new_generation, fields = controller.get_state_changes(generation)
+    assert new_generation == generation + 1
+    assert set(fields) == {"last_exit_code"}
+    assert fields["last_exit_code"].unpack() == 3
+
+    controller.daemon_status = DaemonStatus.READY
+    _, fields = controller.get_state_changes(new_generation)
+    assert set(fields) == {"daemon_status"}
+
+
+def test_concurrent_state_changes() -> None:
+    """Test that changes from many threads each bump their own field."""
+    controller = _controller()
+    generation, _ = controller.get_state()
+    updates = 100
+
+    def set_status() -> None:
+        for _ in range(updates):
+            controller.daemon_status = DaemonStatus.CODE_RUNNING
+
+    def set_return_code() -> None:
+        for code in range(updates):
+            controller.inform_return_code(code)
+
+    threads = [Thread(target=set_status), Thread(target=set_return_code)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    state = controller._state
+    assert state.generation == generation + 2 * updates
+    assert state.last_exit_code == updates - 1
+    assert state.field_generations["version"] == generation
+    assert generation < state.field_generations["daemon_status"] <= state.generation
+    assert generation < state.field_generations["last_exit_code"] <= state.generation
+    assert state.generation in {
+        state.field_generations["daemon_status"],
+        state.field_generations["last_exit_code"],
+    }
+
+    _, fields = controller.get_state_changes(generation)
+    assert set(fields) == {"daemon_status", "last_exit_code"}
@@ -0,0 +1,81 @@
+"""Test the daemon snapshot."""
+import os
+from pathlib import Path
+
+from pepper2.daemon.fingerprint import fingerprint_drive
+from pepper2.daemon.snapshot import (
+    DriveSnapshot,
+    Snapshot,
+    SnapshotFile,
+    UsercodeSnapshot,
+    is_same_process,
+    process_start_time,
+)
+
+
+def test_write_and_read(tmp_path: Path) -> None:
+    """Test that a snapshot survives being saved and loaded."""
+    snapshot_file = SnapshotFile(tmp_path / "snapshot.json")
+    snapshot = Snapshot(
+        boot_id=snapshot_file.boot_id,
+        drives=[
+            DriveSnapshot(
+                uuid="UUID",
+                mount_path=tmp_path,
+                drive_type="USERCODE",
+                fingerprint=fingerprint_drive(tmp_path),
+            ),
+        ],
+        usercode=UsercodeSnapshot(
+            drive="UUID",
+            driver="PythonUnixProcessDriver",
+            pid=1234,
+            start_time=5678,
+        ),
+    )
+
+    snapshot_file.write(snapshot)
+
+    assert snapshot_file.read() == snapshot
+
+
+def test_read_invalid(tmp_path: Path) -> None:
+    """Test that a missing, corrupt or stale snapshot is ignored."""
+    snapshot_file = SnapshotFile(tmp_path / "snapshot.json")
+    assert snapshot_file.read() is None
+
+    snapshot_file.path.write_text('{"version": 1}')
+    assert snapshot_file.read() is None
+
+    snapshot_file.write(Snapshot(boot_id="another boot", drives=[], usercode=None))
+    assert snapshot_file.read() is None
+
+    snapshot_file.remove()
+    assert not snapshot_file.path.exists()
+
+
+def test_fingerprint_changes(tmp_path: Path) -> None:
+    """Test that the fingerprint changes when a file is added."""
+    before = fingerprint_drive(tmp_path)
+    tmp_path.joinpath("main.py").touch()
+
+    assert fingerprint_drive(tmp_path) != before
+
+
+def test_fingerprint_checked_files(tmp_path: Path) -> None:
+    """Test that the fingerprint changes when a file that is checked for changes."""
+    main = tmp_path.joinpath("main.py")
+    main.write_text("print('hello')\n")
+    before = fingerprint_drive(tmp_path, filenames={"main.py"})
+    main.write_text("print('hello, world')\n")
+
+    assert fingerprint_drive(tmp_path, filenames={"main.py"}) != before
+
+
+def test_process_start_time() -> None:
+    """Test that a running process is recognised."""
+    start_time = process_start_time(os.getpid())
+
+    assert start_time is not None
+    assert is_same_process(os.getpid(), start_time)
+    assert not is_same_process(os.getpid(), start_time + 1)
@@ -0,0 +1,97 @@
+"""Test the UDisks event queue."""
+from typing import List
+from unittest import mock
+
+from pepper2.daemon.udisks_events import (
+    EventKind,
+    UDisksEvent,
+    UDisksEventQueue,
+)
+
+DEVICE = "/org/freedesktop/UDisks2/block_devices/sda1"
+OTHER_DEVICE = "/org/freedesktop/UDisks2/block_devices/sdb1"
+JOBS = "/org/freedesktop/UDisks2/jobs"
+
+
+def _mount(job: str, device: str = DEVICE) -> UDisksEvent:
+    return UDisksEvent(EventKind.MOUNT, f"{JOBS}/{job}", [device])
+
+
+def _cleanup(job: str, device: str = DEVICE) -> UDisksEvent:
+    return UDisksEvent(EventKind.CLEANUP, f"{JOBS}/{job}", [device])
+
+
+def _drain(glib: mock.MagicMock) -> None:
+    """Run the idle callback that the queue added."""
+    callback = glib.idle_add.call_args[0][0]
+    assert callback() is False
+
+
+@mock.patch("pepper2.daemon.udisks_events.GLib")
+def test_duplicate_events_are_coalesced(glib: mock.MagicMock) -> None:
+    """Test that a duplicate event replaces the queued event, keeping its place."""
+    handled: List[UDisksEvent] = []
+    queue = UDisksEventQueue(handled.append)
+
+    queue.put(_mount("1"))
+    queue.put(_mount("2", OTHER_DEVICE))
+    queue.put(_mount("3"))
+    assert glib.idle_add.call_count == 1
+
+    _drain(glib)
+    assert handled == [_mount("3"), _mount("2", OTHER_DEVICE)]
+
+    stats = queue.stats
+    assert (stats.depth, stats.max_depth) == (0, 2)
+    assert (stats.received, stats.processed, stats.coalesced) == (3, 2, 1)
+    assert stats.cancelled == 0
+
+
+@mock.patch("pepper2.daemon.udisks_events.GLib")
+def test_cleanup_cancels_queued_mount(glib: mock.MagicMock) -> None:
+    """Test that a cleanup of a device cancels a queued mount of it."""
+    handled: List[UDisksEvent] = []
+    queue = UDisksEventQueue(handled.append)
+
+    queue.put(_mount("1"))
+    queue.put(_mount("2", OTHER_DEVICE))
+    queue.put(_cleanup("3"))
+
+    _drain(glib)
+    assert handled == [_mount("2", OTHER_DEVICE), _cleanup("3")]
+
+    stats = queue.stats
+    assert (stats.received, stats.processed, stats.cancelled) == (3, 2, 1)
+    assert stats.coalesced == 0
+
+
+@mock.patch("pepper2.daemon.udisks_events.GLib")
+def test_handler_errors_do_not_stop_the_queue(glib: mock.MagicMock) -> None:
+    """Test that the events after one that fails are still handled."""
+    handled: List[UDisksEvent] = []
+
+    def handler(event: UDisksEvent) -> None:
+        handled.append(event)
+        if event == _mount("1"):
+            raise RuntimeError("Unable to mount.")
+
+    queue = UDisksEventQueue(handler)
+    queue.put(_mount("1"))
+    queue.put(_mount("2", OTHER_DEVICE))
+
+    _drain(glib)
+    assert handled == [_mount("1"), _mount("2", OTHER_DEVICE)]
+    assert queue.stats.processed == 2
+
+
+@mock.patch("pepper2.daemon.udisks_events.GLib")
+def test_clear_discards_events(glib: mock.MagicMock) -> None:
+    """Test that clearing the queue discards events and removes the idle source."""
+    handled: List[UDisksEvent] = []
+    queue = UDisksEventQueue(handled.append)
+
+    queue.put(_mount("1"))
+    queue.clear()
+
+    glib.source_remove.assert_called_once_with(glib.idle_add.return_value)
+    assert queue.stats.depth == 0
@@ -0,0 +1,103 @@
+"""Test the UDisks mirror."""
+import os
+from pathlib import Path
+from typing import List
+from unittest import mock
+
+from pepper2.daemon.udisks_mirror import (
+    BLOCK_DEVICES_PATH,
+    BLOCK_INTERFACE,
+    FILESYSTEM_INTERFACE,
+    BlockDevice,
+    UDisksMirror,
+    decode_path,
+)
+
+DEVICE = BLOCK_DEVICES_PATH + "sda1"
+OTHER_DEVICE = BLOCK_DEVICES_PATH + "sdb1"
+
+
+def _encode(path: bytes) -> List[int]:
+    """Encode a path as UDisks does, as a null terminated byte array."""
+    return list(path + b"\0")
+
+
+def test_decode_path() -> None:
+    """Test that paths are decoded up to the null terminator."""
+    assert decode_path(_encode(b"/media/usb")) == Path("/media/usb")
+    assert decode_path(b"/media/usb\0garbage") == Path("/media/usb")
+    assert decode_path(list(b"/media/usb")) == Path("/media/usb")
+    assert decode_path([]) == Path("")
+
+
+def test_decode_non_utf8_path() -> None:
+    """Test that paths that are not UTF-8 are decoded in the same way as the OS."""
+    path = decode_path(_encode(b"/media/\xff\xfe"))
+    assert os.fsencode(path) == b"/media/\xff\xfe"
+
+
+def _mirror() -> UDisksMirror:
+    """Create a mirror of a mounted drive, and a drive that is not mounted."""
+    bus = mock.MagicMock()
+    bus.get.return_value.GetManagedObjects.return_value = {
+        DEVICE: {
+            BLOCK_INTERFACE: {"IdUUID": "UUID"},
+            FILESYSTEM_INTERFACE: {"MountPoints": [_encode(b"/media/usb")]},
+        },
+        OTHER_DEVICE: {
+            BLOCK_INTERFACE: {"IdUUID": ""},
+        },
+        "/org/freedesktop/UDisks2/drives/usb": {
+            "org.freedesktop.UDisks2.Drive": {},
+        },
+    }
+    mirror = UDisksMirror(bus)
+    mirror.load()
+    return mirror
+
+
+def test_load() -> None:
+    """Test that only block devices are loaded."""
+    assert _mirror().block_devices() == [
+        BlockDevice(DEVICE, "UUID", [Path("/media/usb")]),
+        BlockDevice(OTHER_DEVICE, None, []),
+    ]
+
+
+def test_properties_changed() -> None:
+    """Test that the mirror is updated when a device is mounted and unmounted."""
+    mirror = _mirror()
+
+    mirror.properties_changed(
+        OTHER_DEVICE,
+        (BLOCK_INTERFACE, {"IdUUID": "OTHER"}, []),
+    )
+    mirror.interfaces_added(
+        OTHER_DEVICE,
+        {FILESYSTEM_INTERFACE: {"MountPoints": [_encode(b"/media/other")]}},
+    )
+    assert mirror.block_device(OTHER_DEVICE) == BlockDevice(
+        OTHER_DEVICE,
+        "OTHER",
+        [Path("/media/other")],
+    )
+
+    mirror.properties_changed(DEVICE, (FILESYSTEM_INTERFACE, {}, ["MountPoints"]))
+    assert mirror.block_device(DEVICE) == BlockDevice(DEVICE, "UUID", [])
+
+    # Changes to interfaces that are not known are ignored.
+    mirror.properties_changed(DEVICE, ("org.example.Unknown", {"Name": "x"}, []))
+    mirror.properties_changed(BLOCK_DEVICES_PATH + "sdc1", (BLOCK_INTERFACE, {}, []))
+    assert mirror.block_device(BLOCK_DEVICES_PATH + "sdc1") is None
+
+
+def test_interfaces_removed() -> None:
+    """Test that a device is forgotten when all of its interfaces are removed."""
+    mirror = _mirror()
+
+    mirror.interfaces_removed(DEVICE, [FILESYSTEM_INTERFACE])
+    assert mirror.block_device(DEVICE) == BlockDevice(DEVICE, "UUID", [])
+
+    mirror.interfaces_removed(DEVICE, [BLOCK_INTERFACE])
+    assert mirror.block_device(DEVICE) is None
+    assert [device.object_path for device in mirror.block_devices()] == [OTHER_DEVICE]